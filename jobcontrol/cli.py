@@ -27,6 +27,8 @@ def cli_main(jc_app):
 config = None
 jc = None
 output_fmt = None
+config_file_path = None
+config_cache_dir = None
 
 
 DATE_FMT = '%Y-%m-%d %H:%M'
@@ -52,21 +54,39 @@ def _fmt_progress(cur, tot):
 @click.group()
 @click.option('--config-file', metavar='FILE',
               help='Path to YAML configuration file')
+@click.option('--cache-dir', metavar='DIR', envvar='JOBCONTROL_CACHE_DIR',
+              default=None,
+              help='Directory used to cache the parsed configuration '
+              '(by default, it is not cached).')
 # @click.option('--storage', metavar='FILE', help='Storage URL')
 @click.option('--format', 'outfmt', default='human',
               help='Output format. "human" or "json" (default: "human").',
               type=click.Choice(('json', 'human')))
-def cli_main_grp(config_file, outfmt):
+def cli_main_grp(config_file, cache_dir, outfmt):
     # todo: use pass_context for passing context instead of global objects?
 
-    global jc, output_fmt
+    global jc, output_fmt, config_file_path, config_cache_dir
 
     output_fmt = outfmt
 
     if config_file is None:
         raise ValueError('Configuration file missing')
 
-    jc = JobControl.from_config_file(config_file)
+    config_file_path = config_file
+    config_cache_dir = cache_dir
+
+    jc = JobControl.from_config_file(config_file, cache_dir=cache_dir)
+
+
+def _start_config_reloader(signum=None):
+    from jobcontrol.reload import ConfigReloader
+
+    reloader = ConfigReloader(jc, config_file_path,
+                              cache_dir=config_cache_dir)
+    if signum is not None:
+        reloader.install_signal_handler(signum)
+    reloader.start()
+    return reloader
 
 
 @cli_main_grp.command()
@@ -79,6 +99,16 @@ def uninstall():
     jc.storage.uninstall()
 
 
+@cli_main_grp.command()
+def upgrade():
+    applied = jc.storage.upgrade()
+    for migration in applied:
+        click.echo('Applied migration {0}: {1}'.format(
+            migration.version, migration.description))
+    if not applied:
+        click.echo('Nothing to upgrade')
+
+
 @cli_main_grp.command()
 @click.argument('job_id')
 def show_job(job_id):
@@ -124,12 +154,14 @@ def list_jobs():
     jobs = list(jc.iter_jobs())
 
     if output_fmt == 'human':
-        table = PrettyTable(['Id', 'Title'])
+        statuses = jc.get_jobs_status()
+        table = PrettyTable(['Id', 'Title', 'Status'])
         table.align = 'l'
         for item in jobs:
             table.add_row([
                 item.config['id'],
                 item.config['title'],
+                statuses[item.id].status,
                 # item.config['function'],
             ])
         click.echo(table)
@@ -210,12 +242,33 @@ def delete_build(build_id):
 
 
 @cli_main_grp.command()
-@click.argument('job_id', type=click.INT)
-def build_job(job_id):
+@click.argument('job_id', type=click.STRING)
+@click.option('--deps/--no-deps', default=False,
+              help='Build dependencies first')
+@click.option('--revdeps/--no-revdeps', default=False,
+              help='Build reverse dependencies afterwards')
+@click.option('--workers', type=click.INT, default=4,
+              help='Number of builds to run in parallel (default: 4)')
+@click.option('--pool', type=click.Choice(('thread', 'process', 'gevent')),
+              default='thread', help='Kind of worker pool (default: thread)')
+def build_job(job_id, deps, revdeps, workers, pool):
     """Run a new build for a job"""
 
-    build_id = jc.build_job(job_id)
-    click.echo('Build id: {0}'.format(build_id))
+    if not (deps or revdeps):
+        build = jc.build_job(job_id)
+        click.echo('Build id: {0}'.format(build.id))
+        return
+
+    builds = jc.build_job_graph(job_id, build_deps=deps,
+                                build_revdeps=revdeps,
+                                workers=workers, pool=pool)
+
+    for build_job_id, build in builds.iteritems():
+        if build is None:
+            click.echo('{0}: not built'.format(build_job_id))
+        else:
+            click.echo('{0}: build {1} {2}'.format(
+                build_job_id, build.id, build.descriptive_status))
 
 
 @cli_main_grp.command()
@@ -225,7 +278,10 @@ def build_job(job_id):
 @click.option('--debug/--no-debug',
               help='Whether to enable debug mode (reloader, etc.)',
               default=False)
-def web(host, port, debug):
+@click.option('--reload-config/--no-reload-config', default=True,
+              help='Whether to reload the configuration when the file '
+              'changes, or on SIGHUP (default: enabled)')
+def web(host, port, debug, reload_config):
     """Run the web API service"""
 
     from jobcontrol.web.app import app
@@ -238,13 +294,22 @@ def web(host, port, debug):
     # we could use an "application" context -- the flask way..?
     app.config['JOBCONTROL'] = jc
 
+    jc.prewarm()
+
+    if reload_config:
+        import signal
+        _start_config_reloader(signal.SIGHUP)
+
     app.run(port=server_port, debug=debug, host=host)
 
 
 @cli_main_grp.command()
 @click.option('--broker', metavar='URL', help='Broker URL')
+@click.option('--reload-config/--no-reload-config', default=True,
+              help='Whether to reload the configuration when the file '
+              'changes (default: enabled)')
 @click.argument('celery_args', nargs=-1)
-def worker(broker, celery_args):
+def worker(broker, reload_config, celery_args):
     """
     Start the Celery worker.
 
@@ -269,6 +334,18 @@ def worker(broker, celery_args):
     if broker:
         celery_app.conf.BROKER_URL = broker
 
+    # Import job functions before worker processes are forked
+    jc.prewarm()
+
+    if reload_config:
+        # Threads do not survive fork(), so each worker process needs
+        # its own reloader. SIGHUP is already used by Celery.
+        from celery.signals import worker_process_init
+
+        worker_process_init.connect(
+            lambda **kw: _start_config_reloader(), weak=False)
+        _start_config_reloader()
+
     args = ['jobcontrol-celery-worker']
     args.extend(celery_args)
     celery_app.worker_main(argv=args)
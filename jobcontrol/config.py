@@ -8,15 +8,34 @@ must be a dict. Supported keys for the "main" dict are:
 - webapp: Configuration for the webapp, passed to Flask
 - celery: Configuration for celery
 - jobs: List of job configuration blocks
+- include: List of glob patterns of files containing more jobs
 - secret: Dictionary of "secrets", which can be referenced by the configuration
   but are never shown on administration pages, ...
+
+Jobs having a ``matrix`` key are templates, expanded to one job for
+each combination of parameters (see :py:class:`JobTemplate`).
 """
 
-from collections import Mapping, MutableMapping
+from collections import Mapping, MutableMapping, OrderedDict
+from functools import partial
+import cPickle as pickle
+import glob
+import hashlib
+import itertools
+import logging
+import os
+import tempfile
 
 import yaml
 
 from jobcontrol.utils import get_storage_from_url
+from jobcontrol.utils.depgraph import TransitiveClosure
+
+
+logger = logging.getLogger(__name__)
+
+# Bump when the format of configuration snapshots changes
+SNAPSHOT_VERSION = 2
 
 
 class JobControlConfig(object):
@@ -28,39 +47,175 @@ class JobControlConfig(object):
         self._jobs = []
         self._secret = {}
         self._yaml_config = None
+        self._include = None  # (<patterns>, <base directory>)
+
+        # Indexes on jobs, kept up to date by _update()
+        self._jobs_by_id = {}
+        self._job_deps = {}
+        self._job_revdeps = {}
+        self._closure = TransitiveClosure({})
 
         if initial is not None:
             self._update(initial)
 
     @classmethod
-    def from_file(cls, filename):
+    def from_file(cls, filename, cache_dir=None, lazy=False):
         """
         Initialize configuration from a file, or a file-like providing
         a ``read()`` method.
+
+        Included files (see :py:meth:`from_string`) are looked up
+        relative to the directory containing the configuration file.
+
+        :param cache_dir:
+            Directory in which to keep a snapshot of the parsed
+            configuration file, to skip parsing when loading it
+            again, unless the file contents changed.
+        :param lazy:
+            See :py:meth:`from_string`
         """
 
         if isinstance(filename, basestring):
             with open(filename, 'r') as fp:
-                return cls.from_string(fp.read())
+                s = fp.read()
+            filename = os.path.abspath(filename)
+            base_dir = os.path.dirname(filename)
+            if cache_dir:
+                return cls._from_string_cached(
+                    s, cache_dir, filename, base_dir, lazy=lazy)
+            return cls.from_string(s, base_dir=base_dir, lazy=lazy)
 
         if hasattr(filename, 'read'):
-            return cls.from_string(filename.read())
+            return cls.from_string(filename.read(), lazy=lazy)
 
         raise TypeError('filename must be a string or a file-like object')
 
     @classmethod
-    def from_string(cls, s):
+    def from_string(cls, s, base_dir=None, lazy=False):
         """
         Initialize configuration from a string.
 
         The string will first be pre-processed through jinja, then
         passed to the :py:meth:`from_object` constructor.
+
+        Only the id and dependencies of jobs are parsed at first; the
+        rest of each job is kept as text, and parsed when first
+        accessed (see :py:class:`LazyBuildConfig`).
+        All the jobs are checked for errors right away (see
+        :py:meth:`validate`), unless ``lazy`` is ``True``.
+
+        The ``include`` key may list glob patterns of other files
+        (relative to ``base_dir``, defaulting to the current directory)
+        from which to load more jobs. Included files are
+        pre-processed as well, and may only contain the ``jobs`` key.
         """
 
         conf = cls.preprocess_config(s)
-        conf_obj = _yaml_load(conf)
+        return cls._from_data(cls._load_string(conf, base_dir), conf,
+                              base_dir, lazy=lazy)
+
+    @classmethod
+    def _from_data(cls, conf_obj, conf, base_dir, lazy=False):
         obj = cls(conf_obj)
         obj._yaml_config = conf
+        if isinstance(conf_obj, dict) and conf_obj.get('include'):
+            obj._include = (conf_obj['include'], base_dir)
+        if not lazy:
+            obj.validate()
+        return obj
+
+    @classmethod
+    def _load_string(cls, conf, base_dir, include_hashes=None):
+        """
+        Load configuration data from a (pre-processed) string,
+        along with jobs from included files.
+
+        :param include_hashes:
+            If a dict is passed, it will be filled with hashes of
+            the contents of the included files, by name.
+        """
+
+        data = _yaml_load_lazy(conf)
+        if not isinstance(data, dict) or 'include' not in data:
+            return data
+
+        data = dict(data)
+        jobs = list(data.get('jobs') or [])
+
+        for filename in _glob_includes(data['include'], base_dir):
+            with open(filename, 'r') as fp:
+                s = fp.read()
+            if include_hashes is not None:
+                include_hashes[filename] = hashlib.sha1(s).hexdigest()
+
+            included = _yaml_load_lazy(cls.preprocess_config(s))
+            if included is None:
+                continue  # Empty file
+            if not isinstance(included, dict) or set(included) - {'jobs'}:
+                raise ValueError('Included files may only define jobs: {0}'
+                                 .format(filename))
+            jobs.extend(included.get('jobs') or [])
+
+        data['jobs'] = jobs
+        return data
+
+    @classmethod
+    def _from_string_cached(cls, s, cache_dir, source, base_dir=None,
+                            lazy=False):
+        """
+        Like :py:meth:`from_string`, but using a snapshot of the
+        parsed configuration stored in ``cache_dir`` (one for each
+        ``source`` file), if it matches the hash of the contents of
+        the file and included files.
+        """
+
+        if isinstance(source, unicode):
+            source = source.encode('utf-8')
+
+        content_hash = hashlib.sha1(s).hexdigest()
+        snapshot_file = os.path.join(cache_dir, 'config-{0}.snapshot'.format(
+            hashlib.sha1(source).hexdigest()))
+
+        try:
+            with open(snapshot_file, 'rb') as fp:
+                (version, snapshot_hash, include, include_hashes,
+                 conf, conf_obj) = pickle.load(fp)
+        except Exception:
+            pass  # Missing or invalid
+        else:
+            unchanged = (
+                (version, snapshot_hash) == (SNAPSHOT_VERSION, content_hash))
+            if unchanged:
+                unchanged = _includes_unchanged(
+                    include, include_hashes, base_dir)
+            if unchanged:
+                conf_obj['jobs'] = [
+                    x if _is_template(x) else
+                    LazyBuildConfig(x.get('id'), x.get('dependencies', []),
+                                    lambda x=x: x)
+                    for x in conf_obj.get('jobs', [])]
+                # Jobs were validated before saving the snapshot
+                return cls._from_data(conf_obj, conf, base_dir, lazy=True)
+
+        conf = cls.preprocess_config(s)
+        include_hashes = {}
+        conf_obj = cls._load_string(conf, base_dir, include_hashes)
+        obj = cls._from_data(conf_obj, conf, base_dir, lazy=lazy)
+
+        try:
+            # Jobs get validated before saving; templates are kept
+            # as they are, to be expanded on load.
+            conf_obj = dict(conf_obj)
+            conf_obj['jobs'] = [
+                x if _is_template(x) else dict(BuildConfig(x)._config)
+                for x in conf_obj.get('jobs') or []]
+            _save_snapshot(snapshot_file, (
+                SNAPSHOT_VERSION, content_hash, conf_obj.get('include'),
+                include_hashes, conf, conf_obj))
+        except Exception as e:
+            logger.warning('Unable to save configuration snapshot: {0!r}'
+                           .format(e))
+
         return obj
 
     @staticmethod
@@ -78,8 +233,10 @@ class JobControlConfig(object):
             self._storage = data['storage']
 
         if 'jobs' in data:
-            self._jobs.extend(BuildConfig(x) for x in data['jobs'])
-            self._validate_jobs(self._jobs)
+            jobs = self._jobs + list(_expand_jobs(data['jobs']))
+            self._validate_jobs(jobs)
+            self._jobs[:] = jobs
+            self._index_jobs()
 
         if 'webapp' in data:
             self._webapp.update(data['webapp'])
@@ -90,6 +247,19 @@ class JobControlConfig(object):
         if 'secret' in data:
             self._secret.update(data['secret'])
 
+    def validate(self):
+        """
+        Parse and validate all the jobs (which are otherwise only
+        parsed when first accessed). Jobs not accessed yet are
+        not kept in memory in their parsed form.
+
+        :raises: :py:exc:`TypeError` or :py:exc:`ValueError` on
+            invalid job configurations (or a :py:exc:`yaml.YAMLError`)
+        """
+        for job in self._jobs:
+            if isinstance(job, LazyBuildConfig):
+                job.validate()
+
     def _validate_jobs(self, jobs):
         used_ids = set()
         for job in jobs:
@@ -99,6 +269,37 @@ class JobControlConfig(object):
                 raise ValueError('Duplicate job id: {0}'.format(job['id']))
             used_ids.add(job['id'])
 
+    def _index_jobs(self):
+        """
+        Build the indexes used to look up jobs and dependencies.
+
+        .. note:: Jobs (and their dependencies) must not be changed
+            without updating the indexes.
+        """
+
+        self._jobs_by_id = {}
+        self._job_deps = {}
+        self._job_revdeps = {}
+
+        for job in self._jobs:
+            self._jobs_by_id[job['id']] = job
+            self._job_deps[job['id']] = job['dependencies']
+            self._job_revdeps.setdefault(job['id'], [])
+
+        for job in self._jobs:
+            # Job ids are unique, so it's enough to skip repeated deps
+            seen = set()
+            for dep_id in job['dependencies']:
+                if dep_id not in seen:
+                    seen.add(dep_id)
+                    self._job_revdeps.setdefault(dep_id, []).append(
+                        job['id'])
+
+        # Unknown dependencies are in the graph too, with no dependencies
+        graph = dict((job_id, []) for job_id in self._job_revdeps)
+        graph.update(self._job_deps)
+        self._closure = TransitiveClosure(graph)
+
     @property
     def storage(self):
         return self._storage
@@ -125,25 +326,33 @@ class JobControlConfig(object):
         return get_storage_from_url(self.storage)
 
     def get_job_config(self, job_id):
-        for job in self.jobs:
-            if job['id'] == job_id:
-                return job
+        return self._jobs_by_id.get(job_id)
 
     get_job = get_job_config
 
     def get_job_deps(self, job_id):
-        job = self.get_job_config(job_id)
-        if job is None:
-            # For coherence with get_job_revdeps()
-            return []
-        return job.get('dependencies', [])
+        # Unknown jobs have no dependencies,
+        # for coherence with get_job_revdeps()
+        return list(self._job_deps.get(job_id, []))
 
     def get_job_revdeps(self, job_id):
-        jobs = []
-        for job in self.jobs:
-            if job_id in job.get('dependencies', []):
-                jobs.append(job['id'])
-        return jobs
+        return list(self._job_revdeps.get(job_id, []))
+
+    def get_included_files(self):
+        """
+        :return: the list of files currently matching the ``include``
+            patterns the configuration was loaded with.
+        """
+        if self._include is None:
+            return []
+        return _glob_includes(*self._include)
+
+    def get_closure(self):
+        """
+        :return: the :py:class:`jobcontrol.utils.depgraph.TransitiveClosure`
+            of the job dependency graph, computed when jobs are loaded.
+        """
+        return self._closure
 
     def __eq__(self, other):
         """Comparison, used mostly for testing"""
@@ -176,6 +385,28 @@ class BuildConfig(MutableMapping):
     - ``title``, ``notes``: descriptive fields, shown on the interfaces
     - ``protected``: boolean flag indicating whether this job should be
       "protected", i.e. extra care should be taken before running it.
+    - ``isolated``: boolean flag indicating whether builds for this job
+      should be run in a separate child process.
+    - ``lazy_retvals``: boolean flag indicating whether return values
+      of dependencies (``!retval``) should be passed as lazy proxies,
+      only retrieved when first accessed by the job function.
+    - ``cache``: boolean flag indicating whether an existing successful
+      build with the same inputs (function, arguments and dependency
+      builds) should be reused, instead of running a new one.
+    - ``retval_chunk_size``: number of items per chunk, when storing
+      the return value of a function returning a generator.
+    - ``log_buffer_size``: if set, log messages are written to the
+      storage in batches of (up to) this size, from a background
+      thread (see :py:mod:`jobcontrol.logbuffer`).
+    - ``log_flush_interval``: maximum time (in seconds) buffered log
+      messages wait before being written.
+    - ``timeout``: maximum wall-clock time for builds, in seconds.
+    - ``max_memory``: maximum size of the address space of the
+      build process, in bytes.
+    - ``max_cpu_seconds``: maximum CPU time for builds, in seconds.
+
+      Resource limits are enforced by running builds in a separate
+      child process (see :py:mod:`jobcontrol.runner`).
     - ``cleanup_function``: a function to be called in order to delete
       the output result for this job. It will be passed the ``BuildInfo``
       object as only argument.
@@ -216,12 +447,13 @@ class BuildConfig(MutableMapping):
         if name in ('title', 'notes'):
             return self._config.get(name)
 
-        # The "protected" flag -> defaults to false
-        if name == 'protected':
+        # Boolean flags -> default to false
+        if name in ('protected', 'isolated', 'lazy_retvals', 'cache'):
             return self._config.get(name, False)
 
         # These are optional
-        if name in ('cleanup_function', 'repr_function'):
+        if name in ('cleanup_function', 'repr_function', 'timeout',
+                    'max_memory', 'max_cpu_seconds'):
             return self._config.get(name, None)
 
         return self._config[name]
@@ -261,11 +493,26 @@ class BuildConfig(MutableMapping):
             if isinstance(value, str):
                 value = unicode(value, encoding='utf-8')
 
-        if name == 'protected':
+        if name in ('protected', 'isolated', 'lazy_retvals', 'cache'):
             if not isinstance(value, bool):
                 raise TypeError('{0} must be a boolean, got {1} instead'
                                 .format(name, type(value).__name__))
 
+        if name in ('retval_chunk_size', 'log_buffer_size'):
+            if not isinstance(value, (int, long)) or value < 1:
+                raise TypeError('{0} must be a positive integer'
+                                .format(name))
+
+        if name in ('timeout', 'log_flush_interval'):
+            if not isinstance(value, (int, long, float)) or value <= 0:
+                raise TypeError('{0} must be a positive number'
+                                .format(name))
+
+        if name in ('max_memory', 'max_cpu_seconds'):
+            if not isinstance(value, (int, long)) or value < 1:
+                raise TypeError('{0} must be a positive integer'
+                                .format(name))
+
         if name in ('cleanup_function', 'repr_function'):
             if not isinstance(value, str):
                 raise TypeError('{0} must be a string, got {1} instead'
@@ -290,14 +537,71 @@ class BuildConfig(MutableMapping):
 
     def __eq__(self, other):
         """Comparison, used mostly for testing"""
-        if type(other) is not type(self):
+        if not isinstance(other, BuildConfig):
             return False
-        return self.__dict__ == other.__dict__
+        return self._config == other._config
 
     def __ne__(self, other):
         return not self.__eq__(other)
 
 
+class LazyBuildConfig(BuildConfig):
+    """
+    A :py:class:`BuildConfig` whose contents are only loaded (and
+    validated) when first accessed.
+
+    The job id and dependencies are known in advance, so that the
+    dependency graph can be built without loading all the jobs.
+
+    :param job_id: the job id
+    :param dependencies: list of dependency job ids
+    :param load: callable returning the job configuration (a dict)
+    """
+
+    def __init__(self, job_id, dependencies, load):
+        self._job_id = job_id
+        self._dependencies = BuildConfig(
+            {'dependencies': dependencies})['dependencies']
+        self._load = load
+        self._loaded_config = None
+
+    @property
+    def _config(self):
+        if self._loaded_config is None:
+            self._loaded_config = BuildConfig(self._load())._config
+            self._load = None
+        return self._loaded_config
+
+    @_config.setter
+    def _config(self, value):
+        self._loaded_config = value
+        self._load = None
+
+    @property
+    def loaded(self):
+        """Whether the configuration has been loaded"""
+        return self._loaded_config is not None
+
+    def validate(self):
+        """
+        Check the configuration for errors; unless already loaded,
+        it is parsed again when first accessed.
+        """
+        if self._loaded_config is None:
+            BuildConfig(self._load())
+
+    def __getitem__(self, name):
+        if self._loaded_config is None:
+            if name == 'id':
+                return self._job_id
+            if name == 'dependencies':
+                return list(self._dependencies)
+        return super(LazyBuildConfig, self).__getitem__(name)
+
+    def __reduce__(self):
+        return (BuildConfig, (dict(self._config),))
+
+
 class Retval(object):
     """Placeholder object for ``!retval <n>``"""
 
@@ -319,25 +623,443 @@ class Retval(object):
         return not self.__eq__(other)
 
 
-def _yaml_dump(data):
-    class CustomDumper(yaml.Dumper):
-        pass
+class Param(object):
+    """Placeholder object for ``!param <name>``, in job templates"""
+
+    def __init__(self, name):
+        if not isinstance(name, basestring):
+            raise TypeError("Parameter name must be a string")
+        self.name = name
+
+    def __repr__(self):
+        return 'Param({0!r})'.format(self.name)
+
+    def __eq__(self, other):
+        if type(self) != type(other):
+            return False
+
+        return self.name == other.name
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+
+class JobTemplate(object):
+    """
+    Template for a family of jobs, differing only in some parameters.
+
+    The ``matrix`` key of the template configuration maps parameter
+    names to lists of values; one job is generated for each
+    combination of values (parameters are sorted by name, with the
+    last one varying fastest). Parameters are replaced:
+
+    - in ``id``, ``dependencies``, ``title`` and ``notes``, using
+      ``str.format()`` syntax (eg. ``report-{region}``)
+    - in ``args`` and ``kwargs``, where ``Param`` objects
+      (``!param <name>`` in YAML) are replaced by values, and
+      ``Retval`` job ids are formatted as above.
+
+    Only ids and dependencies are computed when the template is
+    expanded; the job configuration is rendered on first access
+    (see :py:class:`LazyBuildConfig`).
+
+    :param config: the template configuration (a dict)
+    """
+
+    def __init__(self, config):
+        config = dict(config)
+        matrix = config.pop('matrix')
+
+        if not isinstance(matrix, dict) or not matrix:
+            raise TypeError('matrix must be a non-empty dict')
+
+        for name, values in matrix.iteritems():
+            if not isinstance(name, basestring):
+                raise TypeError('Parameter names must be strings')
+            if not isinstance(values, (list, tuple)) or not values:
+                raise TypeError('Values for parameter {0} must be a '
+                                'non-empty list'.format(name))
+
+        if not isinstance(config.get('id'), basestring):
+            raise TypeError('Template id must be a string')
+
+        self.config = config
+        self.matrix = OrderedDict(sorted(matrix.iteritems()))
+
+    def iter_params(self):
+        """
+        Iterate over combinations of parameters.
+
+        :yields: dicts mapping parameter names to values
+        """
+        names = list(self.matrix)
+        for values in itertools.product(*self.matrix.itervalues()):
+            yield dict(zip(names, values))
+
+    def expand(self):
+        """
+        Generate jobs from the template.
+
+        :yields: :py:class:`LazyBuildConfig` instances
+        """
+        dependencies = BuildConfig(
+            {'dependencies': self.config.get('dependencies') or []}
+        )['dependencies']
 
-    CustomDumper.add_representer(
-        Retval,
-        lambda dumper, data: dumper.represent_scalar(
-            u'!retval', value=unicode(data.job_id)))
+        for params in self.iter_params():
+            yield LazyBuildConfig(
+                self.config['id'].format(**params),
+                [x.format(**params) for x in dependencies],
+                lambda params=params: self.render(params))
 
-    return yaml.dump_all([data], Dumper=CustomDumper,
+    def render(self, params):
+        """
+        :return: the configuration of the job for a set of parameters
+        """
+        config = dict(self.config)
+
+        for key in ('id', 'title', 'notes'):
+            if isinstance(config.get(key), basestring):
+                config[key] = config[key].format(**params)
+
+        if config.get('dependencies'):
+            config['dependencies'] = [
+                x.format(**params) for x in config['dependencies']]
+
+        for key in ('args', 'kwargs'):
+            if key in config:
+                config[key] = _render_params(config[key], params)
+
+        return config
+
+
+def _render_params(value, params):
+    if isinstance(value, Param):
+        return params[value.name]
+
+    if isinstance(value, Retval):
+        return Retval(value.job_id.format(**params))
+
+    if isinstance(value, dict):
+        return dict((key, _render_params(val, params))
+                    for key, val in value.iteritems())
+
+    if isinstance(value, (list, tuple)):
+        return type(value)(_render_params(x, params) for x in value)
+
+    return value
+
+
+def _is_template(job):
+    return isinstance(job, Mapping) and 'matrix' in job
+
+
+def _expand_jobs(jobs):
+    for job in jobs:
+        if isinstance(job, LazyBuildConfig):
+            yield job
+        elif _is_template(job):
+            for expanded in JobTemplate(job).expand():
+                yield expanded
+        else:
+            yield BuildConfig(job)
+
+
+def diff_jobs(old, new):
+    """
+    Compare the jobs in two configurations.
+
+    :param old: the old :py:class:`JobControlConfig`
+    :param new: the new :py:class:`JobControlConfig`
+
+    :return: a dict with keys ``added``, ``removed`` and ``changed``,
+        each one mapping to a sorted list of job ids.
+    """
+
+    old_ids = set(x['id'] for x in old.jobs)
+    new_ids = set(x['id'] for x in new.jobs)
+
+    return {
+        'added': sorted(new_ids - old_ids),
+        'removed': sorted(old_ids - new_ids),
+        'changed': sorted(
+            x for x in old_ids & new_ids
+            if old.get_job(x) != new.get_job(x)),
+    }
+
+
+def _glob_includes(patterns, base_dir=None):
+    """
+    :return: the list of files matching the include patterns; files
+        matching each pattern are sorted by name.
+    """
+
+    if isinstance(patterns, basestring):
+        patterns = [patterns]
+    if not isinstance(patterns, list):
+        raise TypeError('include must be a list of glob patterns')
+
+    filenames = []
+    for pattern in patterns:
+        pattern = os.path.join(base_dir or '', os.path.expanduser(pattern))
+        for filename in sorted(glob.glob(pattern)):
+            filename = os.path.abspath(filename)
+            if filename not in filenames:
+                filenames.append(filename)
+    return filenames
+
+
+def _includes_unchanged(patterns, include_hashes, base_dir=None):
+    filenames = _glob_includes(patterns or [], base_dir)
+    if sorted(filenames) != sorted(include_hashes):
+        return False
+
+    for filename in filenames:
+        try:
+            with open(filename, 'r') as fp:
+                content_hash = hashlib.sha1(fp.read()).hexdigest()
+        except IOError:
+            return False
+        if content_hash != include_hashes[filename]:
+            return False
+
+    return True
+
+
+def _save_snapshot(filename, data):
+    """Atomically replace a snapshot file"""
+
+    dirname = os.path.dirname(filename)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname, 0o700)
+
+    fd, tmpname = tempfile.mkstemp(dir=dirname)
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            pickle.dump(data, fp, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmpname, filename)
+    except (IOError, OSError, TypeError, pickle.PicklingError):
+        os.unlink(tmpname)
+        raise
+
+
+# The pure-Python dumper is used, as its output must be the same
+# everywhere (it is used to compute build fingerprints)
+
+class _CustomDumper(yaml.Dumper):
+    pass
+
+
+_CustomDumper.add_representer(
+    Retval,
+    lambda dumper, data: dumper.represent_scalar(
+        u'!retval', value=unicode(data.job_id)))
+
+
+# Use the (much faster) libyaml-based loader, if available
+
+class _CustomLoader(getattr(yaml, 'CLoader', yaml.Loader)):
+    pass
+
+
+_CustomLoader.add_constructor(
+    u'!retval',
+    lambda loader, data: Retval(loader.construct_scalar(data)))
+
+_CustomLoader.add_constructor(
+    u'!param',
+    lambda loader, data: Param(loader.construct_scalar(data)))
+
+
+def _yaml_dump(data):
+    return yaml.dump_all([data], Dumper=_CustomDumper,
                          default_flow_style=False)
 
 
 def _yaml_load(stream):
-    class CustomLoader(yaml.Loader):
-        pass
+    return yaml.load(stream, Loader=_CustomLoader)
+
+
+class _NotSplittable(Exception):
+    """The document cannot be split into independently parsed parts"""
+
+
+def _yaml_load_lazy(stream):
+    """
+    Load a configuration document, like :py:func:`_yaml_load`, but
+    with jobs returned as :py:class:`LazyBuildConfig` objects.
+
+    The document is only scanned for parser events, to find the
+    source text of each job, along with its id and dependencies;
+    the text is only parsed when the job is first accessed.
+
+    Documents using anchors and aliases, whose parts cannot be
+    parsed separately, are loaded right away.
+    """
+
+    if isinstance(stream, str):
+        stream = stream.decode('utf-8')
+
+    try:
+        return _yaml_split(stream)
+    except _NotSplittable:
+        return _yaml_load(stream)
+
+
+def _yaml_split(stream):
+    loader = _CustomLoader(stream)
+    try:
+        loader.get_event()  # Stream start
+        if loader.check_event(yaml.StreamEndEvent):
+            return None
+
+        if loader.get_event().tags:
+            raise _NotSplittable()  # %TAG directives
+
+        if not loader.check_event(yaml.MappingStartEvent):
+            raise _NotSplittable()
+
+        _yaml_skip_node(loader, nested=False)
+        data = {}
+        while not loader.check_event(yaml.MappingEndEvent):
+            key = _yaml_string(loader.peek_event())
+            if key is None:
+                raise _NotSplittable()
+            _yaml_skip_node(loader)
+
+            if key == 'jobs' and loader.check_event(yaml.SequenceStartEvent):
+                _yaml_skip_node(loader, nested=False)
+                data[key] = []
+                while not loader.check_event(yaml.SequenceEndEvent):
+                    data[key].append(_yaml_split_job(loader, stream))
+                loader.get_event()
+
+            else:
+                data[key] = _yaml_load(_yaml_get_text(
+                    stream, *_yaml_skip_node(loader)))
+
+        loader.get_event()  # Mapping end
+        loader.get_event()  # Document end
+        if not loader.check_event(yaml.StreamEndEvent):
+            raise _NotSplittable()  # Let the loader complain
+        return data
+
+    finally:
+        loader.dispose()
+
+
+def _yaml_split_job(loader, stream):
+    if not loader.check_event(yaml.MappingStartEvent):
+        return _yaml_load(_yaml_get_text(stream, *_yaml_skip_node(loader)))
+
+    start = _yaml_skip_node(loader, nested=False)[0]
+    fields = {}
+    splittable = True
+
+    while not loader.check_event(yaml.MappingEndEvent):
+        key = _yaml_string(loader.peek_event())
+        _yaml_skip_node(loader)
+
+        if key in ('id', 'dependencies'):
+            fields[key] = _yaml_simple_value(loader)
+            if fields[key] is _NotSplittable:
+                splittable = False
+        else:
+            if key == 'matrix':
+                splittable = False  # Templates are expanded right away
+            _yaml_skip_node(loader)
+
+    end = loader.get_event().end_mark
+    text = _yaml_get_text(stream, start, end)
+
+    if not splittable:
+        return _yaml_load(text)
+
+    return LazyBuildConfig(fields.get('id'), fields.get('dependencies') or [],
+                           partial(_yaml_load, text))
+
+
+def _yaml_skip_node(loader, nested=True):
+    """
+    Skip the events of a node (or just the start event of a mapping
+    or sequence, if ``nested`` is ``False``).
+
+    :return: the start and end marks of the skipped events
+    """
+
+    depth = 0
+    start = None
+    while True:
+        event = loader.get_event()
+        if isinstance(event, yaml.AliasEvent) or getattr(
+                event, 'anchor', None) is not None:
+            raise _NotSplittable()
+
+        if start is None:
+            start = event.start_mark
+
+        if isinstance(event, (yaml.MappingStartEvent,
+                              yaml.SequenceStartEvent)):
+            depth += 1
+        elif isinstance(event, (yaml.MappingEndEvent,
+                                yaml.SequenceEndEvent)):
+            depth -= 1
+
+        if depth == 0 or not nested:
+            return start, event.end_mark
+
+
+def _yaml_simple_value(loader):
+    """
+    Read a string, or a list of strings, from the next events.
+
+    :return: the value, or ``_NotSplittable`` for other values
+    """
+
+    if loader.check_event(yaml.SequenceStartEvent):
+        if loader.peek_event().tag is not None:
+            _yaml_skip_node(loader)
+            return _NotSplittable
+        _yaml_skip_node(loader, nested=False)
+        items = []
+        while not loader.check_event(yaml.SequenceEndEvent):
+            items.append(_yaml_string(loader.peek_event()))
+            _yaml_skip_node(loader)
+        loader.get_event()
+        if None in items:
+            return _NotSplittable
+        return items
+
+    value = _yaml_string(loader.peek_event())
+    _yaml_skip_node(loader)
+    if value is None:
+        return _NotSplittable
+    return value
+
+
+def _yaml_string(event):
+    """
+    :return: the value of a scalar event, if it would be loaded as a
+        string, else ``None``.
+    """
+
+    if not isinstance(event, yaml.ScalarEvent) or event.tag is not None:
+        return None
+
+    plain, quoted = event.implicit
+    if plain:
+        tag = _CustomLoader.resolve.im_func(
+            _CustomLoader, yaml.ScalarNode, event.value, (True, False))
+        if tag != u'tag:yaml.org,2002:str':
+            return None
+
+    try:
+        return event.value.encode('ascii')  # As done by the loader
+    except UnicodeEncodeError:
+        return event.value
 
-    CustomLoader.add_constructor(
-        u'!retval',
-        lambda loader, data: Retval(loader.construct_scalar(data)))
 
-    return yaml.load(stream, Loader=CustomLoader)
+def _yaml_get_text(stream, start, end):
+    # Indented to the original column, so that the first line lines
+    # up with the following ones.
+    return u' ' * start.column + stream[start.index:end.index]
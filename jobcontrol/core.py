@@ -8,9 +8,13 @@ Objects responsible for JobControl core functionality.
     and have them in a more nicely accessible place.
 """
 
-from datetime import timedelta
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta
+from functools import partial
 import copy
+import hashlib
 import inspect
+import itertools
 import logging
 import warnings
 
@@ -19,8 +23,13 @@ from flask import escape
 from jobcontrol.exceptions import MissingDependencies, SkipBuild, NotFound
 from jobcontrol.globals import _execution_ctx_stack, execution_context
 from jobcontrol.config import JobControlConfig, BuildConfig, Retval
-from jobcontrol.utils import import_object, cached_property, TracebackInfo
+from jobcontrol.interfaces import BUILD_SUMMARY_FIELDS, BUILD_BLOB_FIELDS
+from jobcontrol.logbuffer import BufferedLogWriter, DEFAULT_FLUSH_INTERVAL
+from jobcontrol.utils import (
+    import_object, cached_property, TracebackInfo, ChunkedRetval,
+    ChunkedRetvalReader)
 from jobcontrol.utils.depgraph import resolve_deps
+from jobcontrol.utils.local import LocalProxy
 
 logger = logging.getLogger('jobcontrol')
 
@@ -39,6 +48,10 @@ DEFAULT_LOG_RETENTION_POLICY = {
     None: _secs(days=_year),  # Any level
 }
 
+# Number of items per chunk, when storing return values of
+# functions returning a generator.
+DEFAULT_RETVAL_CHUNK_SIZE = 1000
+
 
 class JobControl(object):
     """
@@ -61,8 +74,11 @@ class JobControl(object):
             config = JobControlConfig(config)
         self.config = config
 
+        # Job functions resolved so far, by "module:function" name
+        self._function_cache = {}
+
     @classmethod
-    def from_config_file(cls, config_file):
+    def from_config_file(cls, config_file, cache_dir=None, lazy=False):
         """
         Initialize JobControl by loading configuration from a file.
         Will also initialize storage taking values from the configuration.
@@ -70,12 +86,19 @@ class JobControl(object):
         :param config_file:
             Path to configuration file, or an open file descriptor
             (or file-like object).
+        :param cache_dir:
+            Directory used to cache the parsed configuration
+            (see :py:meth:`JobControlConfig.from_file`).
+        :param lazy:
+            If ``True``, skip checking all the jobs for errors
+            on load (see :py:meth:`JobControlConfig.from_string`).
 
         :return:
             a :py:class:`JobControl` instance
         """
 
-        config = JobControlConfig.from_file(config_file)
+        config = JobControlConfig.from_file(
+            config_file, cache_dir=cache_dir, lazy=lazy)
         obj = cls(storage=config.get_storage(), config=config)
         return obj
 
@@ -146,28 +169,41 @@ class JobControl(object):
         build.refresh()  # To get 404 early..
         return build
 
-    def create_build(self, job_id):
+    def create_build(self, job_id, dependency_builds=None, use_cache=None):
         """
         Create a build, from a job configuration.
 
-        .. note::
+        The new build is pinned to a build of each one of its dependencies,
+        to make sure it will use the same return values no matter which
+        builds are run in the meantime.
 
-            Currently, we require that all the dependencies have already
-            been built; in the future, it will be possible to build them
-            automatically.
+        Each build is marked with a fingerprint of its inputs (see
+        :py:meth:`_compute_build_fingerprint`). When caching is enabled,
+        if a successful build with the same fingerprint exists, that
+        build is returned instead of creating a new one: callers can
+        tell by checking whether the returned build is already finished.
 
         .. note::
 
-            Also, current implementation doesn't allow for customizations
-            to either the job configuration nor the build one (pinning,
-            dep/revdep building, ...).
+            Currently, we require that all the dependencies have already
+            been built; use :py:meth:`build_job_graph` to build them
+            along with the job.
 
         :param job_id:
             Id of the job for which to start a build
 
+        :param dependency_builds:
+            Optional dict mapping dependency job ids to the id of the
+            build to be used for them. Dependencies not listed here
+            will use their latest successful build.
+
+        :param use_cache:
+            Whether to reuse an up-to-date build, if any. Defaults to
+            the ``cache`` flag from the job configuration.
+
         :return:
             a :py:class:`BuildInfo` instance associated with the newly
-            created build.
+            created (or reused) build.
 
         :raises:
             - :py:exc:`jobcontrol.exceptions.NotFound` if the specified
@@ -176,12 +212,89 @@ class JobControl(object):
               required dependency has no successful build.
         """
 
+        build = self._prepare_build(job_id, dependency_builds, use_cache)
+        if isinstance(build, BuildInfo):
+            return build  # Reused from cache
+
+        build_id = self.storage.create_build(**build)
+        return self.get_build(build_id)
+
+    def create_builds(self, job_ids, dependency_builds=None, use_cache=None):
+        """
+        Create builds for multiple jobs at once, storing them with a
+        single call to
+        :py:meth:`jobcontrol.interfaces.StorageBase.create_builds`.
+
+        Arguments are the same as for :py:meth:`create_build`;
+        ``dependency_builds`` applies to all the jobs.
+
+        If any job cannot be built, an exception is raised before
+        creating any build.
+
+        :return:
+            an ordered dict mapping job ids to :py:class:`BuildInfo`
+            instances associated with the newly created (or reused)
+            builds.
+        """
+
+        job_ids = list(job_ids)
+        builds = OrderedDict()
+        new_builds = []
+
+        # Latest successful builds of all the dependencies, at once
+        dep_ids = set()
+        for job_id in job_ids:
+            dep_ids.update(self.config.get_job_deps(job_id))
+        dep_ids.difference_update(dependency_builds or ())
+        latest_builds = self.storage.get_latest_builds(
+            dep_ids, started=True, finished=True, success=True,
+            skipped=False, fields=BUILD_SUMMARY_FIELDS)
+
+        for job_id in job_ids:
+            if job_id in builds:
+                continue
+
+            build = self._prepare_build(job_id, dependency_builds, use_cache,
+                                        latest_builds=latest_builds)
+            if isinstance(build, BuildInfo):
+                builds[job_id] = build  # Reused from cache
+            else:
+                builds[job_id] = None
+                new_builds.append(build)
+
+        build_ids = self.storage.create_builds(new_builds)
+        for build, build_id in zip(new_builds, build_ids):
+            # No need to read back the state of new builds
+            builds[build['job_id']] = BuildInfo(self, build_id, info={
+                'id': build_id, 'job_id': build['job_id'],
+                'fingerprint': build['fingerprint'],
+                'start_time': None, 'end_time': None, 'started': False,
+                'finished': False, 'success': False, 'skipped': False})
+
+        return builds
+
+    def _prepare_build(self, job_id, dependency_builds, use_cache,
+                       latest_builds=None):
+        """
+        Prepare creation of a build (see :py:meth:`create_build`).
+
+        :param latest_builds:
+            Optional dict mapping dependency job ids to their latest
+            successful build (as returned by the storage
+            ``get_latest_builds()`` method), instead of looking them
+            up one at a time.
+
+        :return:
+            either the :py:class:`BuildInfo` of an up-to-date build to
+            be reused, or a dict of arguments for the storage
+            ``create_build()`` method.
+        """
+
         job = self.get_job(job_id)
-        build_config = {
-            'build_deps': False,
-            'build_revdeps': False,
-            'dependency_builds': {},
-        }
+
+        pinned_builds = dict(job.config['pinned_builds'])
+        if dependency_builds is not None:
+            pinned_builds.update(dependency_builds)
 
         # Make sure all dependencies have a successful build.
         # Otherwise, raise an exception to abort everything.
@@ -189,20 +302,37 @@ class JobControl(object):
         for dep in job.get_deps():
             assert isinstance(dep, JobInfo)
 
-            dep_build = dep.get_latest_successful_build()
+            if dep.id in pinned_builds:
+                continue
+
+            if latest_builds is not None:
+                dep_build = latest_builds.get(dep.id)
+            else:
+                dep_build = dep.get_latest_successful_build()
             if not dep_build:
                 raise MissingDependencies(
                     'Dependency job {0!r} has no successful builds!'
-                    .format(job_id))
+                    .format(dep.id))
 
-            build_config['dependency_builds'][dep.id] = dep_build.id
+            pinned_builds[dep.id] = dep_build['id']
 
-        # Actually create a record for this build
-        build_config = copy.deepcopy(job.config)
-        build_id = self.storage.create_build(
-            job_id=job_id, config=build_config)
+        fingerprint = self._compute_build_fingerprint(job, pinned_builds)
 
-        return self.get_build(build_id)
+        if use_cache is None:
+            use_cache = job.config['cache']
+
+        if use_cache:
+            cached = self.storage.get_latest_successful_build(
+                job_id, fields=BUILD_SUMMARY_FIELDS, fingerprint=fingerprint)
+            if cached is not None:
+                logger.info('Job {0} is up to date: reusing build {1}'
+                            .format(job_id, cached['id']))
+                return BuildInfo(self, cached['id'], info=cached)
+
+        build_config = copy.deepcopy(job.config)
+        build_config['pinned_builds'] = pinned_builds
+        return {'job_id': job_id, 'config': build_config,
+                'fingerprint': fingerprint}
 
     def build_job(self, job_id):
         """
@@ -213,12 +343,124 @@ class JobControl(object):
 
         :return:
             a :py:class:`BuildInfo` instance associated with the newly
-            created build.
+            created build (or the reused one, on cache hits).
         """
         build = self.create_build(job_id)
-        return self.run_build(build)
+        if not build['finished']:
+            self.run_build(build)
+            build.refresh(fields=BUILD_SUMMARY_FIELDS)
+        return build
+
+    def build_job_graph(self, job_id, build_deps=True, build_revdeps=False,
+                        workers=4, pool='thread'):
+        """
+        Build a job along with its dependencies and / or reverse
+        dependencies.
+
+        Builds are run in parallel, as soon as all the builds they
+        depend on have completed successfully. See
+        :py:class:`jobcontrol.executor.DepGraphExecutor` for details.
+
+        :param job_id:
+            Id of the job to be built
+        :param build_deps:
+            Whether to build (recursively) the job dependencies first
+        :param build_revdeps:
+            Whether to build (recursively) the jobs depending on
+            this one afterwards
+        :param workers:
+            Maximum number of builds to be run concurrently
+        :param pool:
+            Kind of worker pool: ``'thread'``, ``'process'`` or
+            ``'gevent'``
+
+        :return:
+            an ordered dict mapping job ids to :py:class:`BuildInfo`
+            instances (or ``None`` for jobs that were not built due
+            to failures upstream).
+        """
+        from jobcontrol.executor import DepGraphExecutor
+
+        executor = DepGraphExecutor(self, workers=workers, pool=pool)
+        return executor.run(job_id, build_deps=build_deps,
+                            build_revdeps=build_revdeps)
+
+    def get_depgraph_closure(self):
+        """
+        Get the transitive closure of the job dependency graph,
+        to quickly check whether a job is upstream of another.
+
+        :return: a :py:class:`jobcontrol.utils.depgraph.TransitiveClosure`
+        """
+        return self.config.get_closure()
 
-    def run_build(self, build_id):
+    def get_job_ancestors(self, job_id):
+        """
+        :return: the ids of the jobs the given one (directly or
+            indirectly) depends on, in build order.
+        """
+        return self._get_closure_for(job_id).get_ancestors(job_id)
+
+    def get_job_descendants(self, job_id):
+        """
+        :return: the ids of the jobs (directly or indirectly) depending
+            on the given one, in build order.
+        """
+        return self._get_closure_for(job_id).get_descendants(job_id)
+
+    def get_affected_jobs(self, job_ids):
+        """
+        Find the jobs affected by a change in a set of jobs, that is
+        the jobs themselves, plus all their reverse dependencies.
+
+        :return: list of job ids, in build order
+        """
+        job_ids = list(job_ids)
+        for job_id in job_ids:
+            self._get_closure_for(job_id)
+        return self.get_depgraph_closure().get_impact(job_ids)
+
+    def _get_closure_for(self, job_id):
+        closure = self.get_depgraph_closure()
+        if job_id not in closure:
+            raise NotFound('No such job: {0!r}'.format(job_id))
+        return closure
+
+    def get_jobs_status(self, job_ids=None):
+        """
+        Compute the status of jobs (along with all their dependencies)
+        with a fixed number of storage queries.
+
+        See :py:func:`jobcontrol.status.get_jobs_status`.
+
+        :return:
+            a dict mapping job ids to
+            :py:class:`jobcontrol.status.JobStatus` instances.
+        """
+        from jobcontrol.status import get_jobs_status
+        return get_jobs_status(self, job_ids)
+
+    def estimate_job_graph(self, job_id, build_deps=True,
+                           build_revdeps=False, workers=4):
+        """
+        Estimate the time needed by :py:meth:`build_job_graph`, based
+        on the duration of past builds (see :py:mod:`jobcontrol.planner`).
+
+        :return:
+            a dict with keys ``duration`` (in seconds),
+            ``estimated_end`` (a datetime, if starting now)
+            and ``critical_path`` (list of job ids).
+        """
+        from jobcontrol.executor import DepGraphExecutor
+
+        executor = DepGraphExecutor(self, workers=workers)
+        estimate = executor.estimate(job_id, build_deps=build_deps,
+                                     build_revdeps=build_revdeps)
+        estimate['estimated_end'] = (
+            datetime.now() + timedelta(seconds=estimate['duration']))
+        return estimate
+
+    def run_build(self, build_id, isolated=None):
         """
         Actually run a build.
 
@@ -230,6 +472,12 @@ class JobControl(object):
 
         :param build_id:
             either a :py:class:`BuildInfo` instance, or a build id
+        :param isolated:
+            whether to run the build in a child process (see
+            :py:mod:`jobcontrol.runner`). Defaults to the ``isolated``
+            flag from the build configuration; builds with resource
+            limits are always isolated, unless explicitly requested
+            otherwise (in which case limits are not enforced).
         """
 
         if isinstance(build_id, BuildInfo):
@@ -241,6 +489,17 @@ class JobControl(object):
 
         build.refresh()  # Make sure we have up-to-date information
 
+        from jobcontrol.runner import RESOURCE_LIMITS, SubprocessRunner
+
+        if isolated is None:
+            isolated = build.config.get('isolated', False)
+            if any(build.config.get(x) for x in RESOURCE_LIMITS):
+                isolated = True
+
+        if isolated:
+            SubprocessRunner(self).run(build)
+            return
+
         # Make sure the log handler is installed
         self._install_log_handler()
 
@@ -260,6 +519,14 @@ class JobControl(object):
         # Create and push the global context
         ctx = JobExecutionContext(
             app=self, job_id=build.job_id, build_id=build.id)
+
+        log_buffer_size = build.config.get('log_buffer_size')
+        if log_buffer_size:
+            ctx.log_writer = BufferedLogWriter(
+                self.storage, build.id, size=log_buffer_size,
+                interval=build.config.get(
+                    'log_flush_interval', DEFAULT_FLUSH_INTERVAL))
+
         ctx.push()
 
         # note: from now on, we must make sure the context is popped
@@ -270,34 +537,35 @@ class JobControl(object):
             function = self._get_runner_function(build.config['function'])
             logger.debug(log_prefix + 'Function is {0!r}'.format(function))
 
-            args = self._prepare_args(build.config['args'], build)
-            kwargs = self._prepare_args(build.config['kwargs'], build)
+            args, kwargs = self._prepare_args(
+                (build.config['args'], build.config['kwargs']), build)
 
             # Run!
             retval = function(*args, **kwargs)
 
-            # todo: what if the function is a generator? Should we iterate it
-            #       or just leave it alone?
+            if inspect.isgenerator(retval):
+                # Consume the generator lazily, storing items in chunks
+                retval = self._store_retval_chunks(build, retval)
 
         except SkipBuild:
             logger.info(log_prefix + 'Build SKIPPED')
 
             # Indicates no need to build this..
-            self.storage.finish_build(build.id, skipped=True)
+            self._finish_build(ctx, skipped=True)
 
         except Exception as exc:
             logger.exception(log_prefix + 'Build FAILED')
 
-            self.storage.finish_build(
-                build.id, success=False, exception=exc,
+            self._finish_build(
+                ctx, success=False, exception=exc,
                 exception_tb=TracebackInfo.from_current_exc())
 
         else:
             logger.info(log_prefix + 'Build SUCCESSFUL')
 
             try:
-                self.storage.finish_build(
-                    build.id, success=True, skipped=False, retval=retval,
+                self._finish_build(
+                    ctx, success=True, skipped=False, retval=retval,
                     exception=None)
 
             except Exception as exc:
@@ -306,87 +574,174 @@ class JobControl(object):
                     'an error storing the results. Maybe the return value '
                     'is not serializable?')
 
-                self.storage.finish_build(
-                    build.id, success=False, exception=exc,
+                self._finish_build(
+                    ctx, success=False, exception=exc,
                     exception_tb=TracebackInfo.from_current_exc())
 
         finally:
             # POP context from the stack
             ctx.pop()
 
+            if ctx.log_writer is not None:
+                ctx.log_writer.close()
+
+    def _finish_build(self, ctx, **kwargs):
+        """
+        Register the end of the build running in an execution context,
+        after making sure all its log messages were stored.
+        """
+        if ctx.log_writer is not None:
+            ctx.log_writer.flush()
+        self.storage.finish_build(ctx.build_id, **kwargs)
+
+    def _store_retval_chunks(self, build, generator):
+        """
+        Store items from a generator in chunks, as they are produced.
+
+        :return: a :py:class:`jobcontrol.utils.ChunkedRetval` instance,
+            to be stored as the build return value.
+        """
+        chunk_size = build.config.get('retval_chunk_size')
+        if not chunk_size:
+            chunk_size = DEFAULT_RETVAL_CHUNK_SIZE
+
+        count = chunks = 0
+        try:
+            while True:
+                items = list(itertools.islice(generator, chunk_size))
+                if not items:
+                    break
+                self.storage.store_retval_chunk(build.id, chunks, items)
+                count += len(items)
+                chunks += 1
+
+        except Exception:
+            # Don't leave a partial return value around
+            if chunks:
+                self.storage.delete_retval_chunks(build.id)
+            raise
+
+        return ChunkedRetval(count=count, chunks=chunks)
+
     def _prepare_args(self, args, build):
         """
         Prepare arguments for passing to a build execution function.
 
         Recursively replace ``Retval()`` objects with appropriate
         return values of job dependencies.
+
+        Return values are resolved once per build; with the
+        ``lazy_retvals`` option, only when first accessed. Each
+        occurrence gets its own copy, as jobs might modify their
+        arguments, except for the last one to be resolved, which
+        gets the value itself.
         """
 
+        remaining = defaultdict(int)
+        for job_id in _iter_retval_ids(args):
+            remaining[job_id] += 1
+
+        ctx = execution_context._get_current_object()
+
+        def get_value(job_id):
+            value = ctx.get_dependency_retval(job_id)
+            remaining[job_id] -= 1
+            if remaining[job_id] > 0:
+                return _copy_retval(value)
+            ctx._dependency_retvals.pop(job_id, None)  # No longer needed
+            return value
+
+        lazy = build.config.get('lazy_retvals', False)
+        return self._replace_retvals(args, get_value, lazy)
+
+    def _replace_retvals(self, args, get_value, lazy):
         if isinstance(args, list):
-            return [self._prepare_args(x, build) for x in args]
+            return [self._replace_retvals(x, get_value, lazy) for x in args]
 
         if isinstance(args, tuple):
-            return tuple(self._prepare_args(x, build) for x in args)
+            return tuple(self._replace_retvals(x, get_value, lazy)
+                         for x in args)
 
         if isinstance(args, dict):
-            return dict((k, self._prepare_args(v, build))
+            return dict((k, self._replace_retvals(v, get_value, lazy))
                         for k, v in args.iteritems())
 
         if isinstance(args, Retval):
             # Get return value for the *pinned* build of that
             # job for the currently running build.
-            current_build = execution_context.current_build
-            dep_build = current_build.get_dependency_build(args.job_id)
-            return dep_build['retval']
+            if lazy:
+                return LazyRetval(partial(get_value, args.job_id))
+            return get_value(args.job_id)
 
         return args
 
     def _create_job_depgraph(self, job_id, complete=False):
-        processed = set()
-        DEPGRAPH = {}
-
-        def _explore_deps(jid):
-            if jid in processed:
-                # Already processed
-                return
+        if not complete:
+            return self._create_closure_graph(
+                job_id, self.get_job_ancestors, self.config.get_job_deps)
 
-            # Early, to prevent infinite recursion
-            processed.add(jid)
-
-            DEPGRAPH[jid] = deps = list(self.config.get_job_deps(jid))
-
-            for dep in deps:
-                _explore_deps(dep)
-
-            if complete:
-                revdeps = list(self.config.get_job_revdeps(jid))
-
-                for rdid in revdeps:
-                    if rdid not in DEPGRAPH:
-                        DEPGRAPH[rdid] = []
-                    if jid not in DEPGRAPH[rdid]:
-                        DEPGRAPH[rdid].append(jid)
-                    _explore_deps(rdid)
+        # All the jobs connected to this one, following dependencies
+        # in both directions (iteratively, as chains can be long).
+        DEPGRAPH = {}
+        to_explore = [job_id]
 
         logger.debug('Building dependency graph for job {0}'.format(job_id))
-        _explore_deps(job_id)
+        while to_explore:
+            jid = to_explore.pop()
+            if jid in DEPGRAPH:
+                continue
+            DEPGRAPH[jid] = deps = self.config.get_job_deps(jid)
+            to_explore.extend(deps)
+            to_explore.extend(self.config.get_job_revdeps(jid))
 
         return DEPGRAPH
 
+    def _create_job_revdepgraph(self, job_id):
+        """
+        Create a graph of the jobs (recursively) depending on a job,
+        mapping each job to the jobs depending on it.
+        """
+        return self._create_closure_graph(
+            job_id, self.get_job_descendants, self.config.get_job_revdeps)
+
+    def _create_closure_graph(self, job_id, get_related, get_edges):
+        jids = [job_id]
+        if job_id in self.config.get_closure():
+            jids.extend(get_related(job_id))
+        return dict((jid, get_edges(jid)) for jid in jids)
+
     def _create_full_depgraph(self):
         DEPGRAPH = {}
-        for job in self.iter_jobs():
-            DEPGRAPH[job.id] = list(job['dependencies'])
+        for job in self.config.jobs:  # Without loading all the jobs
+            DEPGRAPH[job['id']] = list(job['dependencies'])
         return DEPGRAPH
 
     def _resolve_deps(self, depgraph, job_id):
         # Allow changing dependency resolution function
         return resolve_deps(depgraph, job_id)
 
+    def _compute_build_fingerprint(self, job, pinned_builds):
+        """
+        Compute a hash of the build inputs: the function to be called,
+        its arguments and the dependency builds it would use.
+        """
+        from jobcontrol.config import _yaml_dump
+
+        deps = job.config['dependencies']
+        data = {
+            'function': job.config['function'],
+            'args': list(job.config['args']),
+            'kwargs': job.config['kwargs'],
+            'dependency_builds': dict(
+                (key, val) for key, val in pinned_builds.iteritems()
+                if key in deps),
+        }
+        return hashlib.sha1(_yaml_dump(data)).hexdigest()
+
     def _latest_successful_build_date(self, job_id):
         builds = list(self.storage.get_job_builds(
             job_id, started=True, finished=True, success=True, skipped=False,
-            order='desc', limit=1))
+            order='desc', limit=1, fields=['end_time']))
         if len(builds) < 1:
             return None  # No build!
         return builds[0]['end_time']
@@ -396,7 +751,85 @@ class JobControl(object):
             raise TypeError('Function name must be a string')
         if not name:
             raise ValueError('Cannot get function for empty name!')
-        return import_object(name)
+
+        try:
+            return self._function_cache[name]
+        except KeyError:
+            pass
+
+        func = import_object(name)
+        self._function_cache[name] = func
+        return func
+
+    def reload_config(self, config):
+        """
+        Replace the configuration, and invalidate anything depending
+        on the old one.
+
+        The storage is not changed, even if the new configuration
+        points to a different one.
+
+        :param config:
+            the new :py:class:`jobcontrol.config.JobControlConfig`
+            (already validated)
+
+        :return: a dict describing the jobs that changed, as returned
+            by :py:func:`jobcontrol.config.diff_jobs`.
+        """
+        from jobcontrol.config import diff_jobs
+
+        if config.storage != self.config.storage:
+            logger.warning('Storage changed in configuration; '
+                           'a restart is needed to apply the change')
+
+        diff = diff_jobs(self.config, config)
+
+        # Indexes live in the configuration object, and are replaced
+        # along with it.
+        self.config = config
+        self.clear_function_cache()
+
+        return diff
+
+    def clear_function_cache(self):
+        """
+        Forget about the job functions resolved so far.
+
+        Called after the configuration has been reloaded, so that
+        functions are looked up again by name.
+        """
+        self._function_cache.clear()
+
+    def prewarm(self):
+        """
+        Import the functions (including cleanup functions) of all
+        the configured jobs, so that builds will not have to wait for
+        (possibly slow) module imports.
+
+        Meant to be called when starting long-running processes, such
+        as Celery workers or the web application.
+
+        :return:
+            a dict mapping names of functions that could not be
+            imported to the raised exception.
+        """
+
+        errors = {}
+
+        for job in self.config.jobs:
+            for key in ('function', 'cleanup_function', 'repr_function'):
+                name = job[key]
+                if not name or name in errors:
+                    continue
+
+                try:
+                    self._get_runner_function(name)
+                except Exception as e:
+                    logger.warning('Unable to import {0} for job {1}: {2!r}'
+                                   .format(name, job['id'], e))
+                    errors[name] = e
+
+        return errors
 
     def prune_logs(self, policy=None):
         if policy is None:
@@ -483,6 +916,10 @@ class JobExecutionContext(object):
         self.app = app
         self.job_id = job_id
         self.build_id = build_id
+        self._dependency_retvals = {}
+
+        # Set for builds buffering log messages
+        self.log_writer = None
 
     def push(self):
         """Push this context in the global stack"""
@@ -522,6 +959,82 @@ class JobExecutionContext(object):
         """
         return self.app.get_build(self.build_id)
 
+    def get_dependency_retval(self, job_id):
+        """
+        Return the return value of the build of a dependency job used
+        by the currently running build.
+
+        The dependency build is only retrieved once, then cached
+        (until the arguments of the build no longer need it): the
+        returned object is shared, and should not be modified.
+        """
+        if job_id not in self._dependency_retvals:
+            dep_build = self.current_build.get_dependency_build(job_id)
+            if dep_build is None:
+                raise MissingDependencies(
+                    'Dependency job {0!r} has no successful builds!'
+                    .format(job_id))
+            self._dependency_retvals[job_id] = dep_build.retval
+        return self._dependency_retvals[job_id]
+
+
+class LazyRetval(LocalProxy):
+    """
+    Proxy to the return value of a dependency, retrieved when first
+    accessed (see the ``lazy_retvals`` build option).
+
+    Pickling (or copying) the proxy, eg. when a job returns one of its
+    arguments, serializes the return value itself.
+
+    :param get_value: function returning the value (called once)
+    """
+
+    __slots__ = ()
+
+    def __init__(self, get_value):
+        resolved = []
+
+        def _get_value():
+            if not resolved:
+                resolved.append(get_value())
+            return resolved[0]
+
+        super(LazyRetval, self).__init__(_get_value)
+
+    def __reduce__(self):
+        return (_identity, (self._get_current_object(),))
+
+
+def _identity(value):
+    return value
+
+
+def _iter_retval_ids(args):
+    """Yield the job ids of ``Retval()`` objects found in arguments"""
+
+    if isinstance(args, (list, tuple)):
+        for item in args:
+            for job_id in _iter_retval_ids(item):
+                yield job_id
+
+    elif isinstance(args, dict):
+        for item in args.itervalues():
+            for job_id in _iter_retval_ids(item):
+                yield job_id
+
+    elif isinstance(args, Retval):
+        yield args.job_id
+
+
+def _copy_retval(value):
+    """
+    Copy a dependency return value. Lazy iterables over chunked
+    return values are read-only, and can be shared.
+    """
+    if isinstance(value, ChunkedRetvalReader):
+        return value
+    return copy.deepcopy(value)
+
 
 class JobControlLogHandler(logging.Handler):
     """
@@ -560,6 +1073,10 @@ class JobControlLogHandler(logging.Handler):
 
         # NOTE: This will be done by the storage!
 
+        if execution_context.log_writer is not None:
+            execution_context.log_writer.write(record)
+            return
+
         current_app.storage.log_message(
             build_id=execution_context.build_id,
             record=record)
@@ -616,25 +1133,17 @@ class JobInfo(object):
           - ``'success'`` the job has at least a successful build
           - ``'failed'`` the job only has failed builds
           - ``'outdated'`` the job has at least a successful build,
-            but older than one of the dependency builds
+            but older than one of the (direct or indirect) dependency
+            builds
+
+        To get the status of many jobs, use
+        :py:meth:`JobControl.get_jobs_status` instead.
         """
 
         # todo: "running" must be a separate state, as we are still interested
         #       on whether there is at least one successful build..
 
-        # if self.has_running_builds():
-        #     return 'running'
-
-        if not self.has_builds():
-            return 'not_built'
-
-        if self.is_outdated():
-            return 'outdated'
-
-        if self.has_successful_builds():
-            return 'success'
-
-        return 'failed'
+        return self.app.get_jobs_status([self.id])[self.id].status
 
     def get_deps(self):
         """
@@ -661,10 +1170,13 @@ class JobInfo(object):
         Iterate over builds for this job.
 
         Accepts the same arguments as
-        :py:meth:`jobcontrol.interfaces.StorageBase.get_job_builds`
+        :py:meth:`jobcontrol.interfaces.StorageBase.get_job_builds`;
+        unless ``fields`` is specified, only the build summary is
+        retrieved, and the other fields are loaded on first access.
 
         :yields: :py:class:`BuildInfo` instances
         """
+        kw.setdefault('fields', BUILD_SUMMARY_FIELDS)
         for build in self.app.storage.get_job_builds(self.id, *a, **kw):
             yield BuildInfo(self.app, build['id'], info=build)
 
@@ -695,11 +1207,21 @@ class JobInfo(object):
         Get latest successful build for this job, if any.
         Otherwise, returns ``None``.
         """
-        build = self.app.storage.get_latest_successful_build(self.id)
+        build = self.app.storage.get_latest_successful_build(
+            self.id, fields=BUILD_SUMMARY_FIELDS)
         if build is None:
             return None
         return BuildInfo(self.app, build['id'], info=build)
 
+    def get_build_estimate(self, build_deps=True):
+        """
+        Estimate the time needed to build this job (along with
+        its dependencies, unless ``build_deps`` is false).
+
+        See :py:meth:`JobControl.estimate_job_graph`.
+        """
+        return self.app.estimate_job_graph(self.id, build_deps=build_deps)
+
     def get_docs(self):
         """
         Get documentation for this job.
@@ -718,7 +1240,7 @@ class JobInfo(object):
         """
         Check whether this job has any build.
         """
-        builds = list(self.get_builds(
+        builds = list(self.iter_builds(
             started=True, finished=True, order='desc', limit=1))
         return len(builds) >= 1
 
@@ -726,7 +1248,7 @@ class JobInfo(object):
         """
         Check whether this job has any successful build.
         """
-        builds = list(self.get_builds(
+        builds = list(self.iter_builds(
             started=True, finished=True, success=True, skipped=False,
             order='desc', limit=1))
         return len(builds) >= 1
@@ -735,7 +1257,7 @@ class JobInfo(object):
         """
         Check whether this job has any running build.
         """
-        builds = list(self.get_builds(started=True, finished=False, limit=1))
+        builds = list(self.iter_builds(started=True, finished=False, limit=1))
         return len(builds) >= 1
 
     def is_outdated(self):
@@ -785,7 +1307,7 @@ class JobInfo(object):
         }
 
         try:
-            func = import_object(self.config['function'])
+            func = self.app._get_runner_function(self.config['function'])
 
         except Exception as e:
             docs['function_doc'] = escape(u"Error: {0!r}".format(e))
@@ -909,7 +1431,9 @@ class BuildInfo(object):
     :param info:
         Optionally, this can be used to pre-populate the build
         information (useful, eg. if we are retrieving a bunch
-        of builds from the database at once).
+        of builds from the database at once). It may contain just
+        some of the fields: the missing ones are loaded from the
+        storage on first access.
     """
 
     __slots__ = ['app', 'build_id', '_info']
@@ -946,7 +1470,7 @@ class BuildInfo(object):
     @property
     def job_id(self):
         """The job id"""
-        return self.info['job_id']
+        return self['job_id']
 
     @property
     def info(self):
@@ -970,31 +1494,42 @@ class BuildInfo(object):
         """
         if getattr(self, '_info') is None:
             self.refresh()
+        missing = [x for x in BUILD_BLOB_FIELDS if x not in self._info]
+        if missing:
+            self._load_fields(missing)
         return self._info
 
     @property
     def config(self):
-        return self.info['config']
+        return self['config']
 
     @property
     def retval(self):
-        return self.info['retval']
+        """
+        The build return value. For builds whose function returned a
+        generator, this is a lazy iterable over the generated items
+        (see :py:class:`jobcontrol.utils.ChunkedRetvalReader`).
+        """
+        retval = self['retval']
+        if isinstance(retval, ChunkedRetval):
+            return ChunkedRetvalReader(self.app.storage, self.build_id, retval)
+        return retval
 
     @property
     def started(self):
-        return self.info['started']
+        return self['started']
 
     @property
     def finished(self):
-        return self.info['finished']
+        return self['finished']
 
     @property
     def success(self):
-        return self.info['success']
+        return self['success']
 
     @property
     def skipped(self):
-        return self.info['skipped']
+        return self['skipped']
 
     @property
     def descriptive_status(self):
@@ -1018,12 +1553,26 @@ class BuildInfo(object):
             return 'SUCCESSFUL'
         return 'FAILED'
 
-    def refresh(self):
-        """Refresh the build status information from database"""
-        self._info = self.app.storage.get_build(self.build_id)
+    def refresh(self, fields=None):
+        """
+        Refresh the build status information from database.
+
+        :param fields:
+            If specified, only retrieve these fields; the other ones
+            will be loaded again on first access.
+        """
+        self._info = self.app.storage.get_build(self.build_id, fields=fields)
+
+    def _load_fields(self, fields):
+        self._info.update(
+            self.app.storage.get_build(self.build_id, fields=fields))
 
     def __getitem__(self, name):
-        return self.info[name]
+        if self._info is None:
+            self.refresh()
+        if name not in self._info and name in BUILD_BLOB_FIELDS:
+            self._load_fields([name])
+        return self._info[name]
 
     def get_progress_info(self):
         """Get information about the build progress"""
@@ -38,3 +38,26 @@ class SerializationError(JobControlException):
     failed.
     """
     pass
+
+
+class BuildProcessError(JobControlException):
+    """
+    Exception used to indicate that the process running a build
+    exited before the build could finish (eg. it crashed, or was
+    killed).
+    """
+
+    @property
+    def exitcode(self):
+        """Exit code of the build process (negative for signals)"""
+        if len(self.args) > 1:
+            return self.args[1]
+
+
+class BuildLimitExceeded(BuildProcessError):
+    """
+    Exception used to indicate that a build was stopped for exceeding
+    one of its resource limits (eg. it ran for longer than its
+    ``timeout``).
+    """
+    pass
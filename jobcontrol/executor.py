@@ -0,0 +1,387 @@
+"""
+Parallel execution of builds over the job dependency graph.
+
+The :py:class:`DepGraphExecutor` builds a job together with its
+dependencies and / or reverse dependencies, starting each build as soon
+as all the builds it depends on have completed successfully.
+
+Builds are run on a pool of workers (threads, processes or gevent
+greenlets); each downstream build is pinned to the exact upstream
+builds run by the executor. When more builds are ready to run than
+there are workers, the ones on the longest path to the end of the
+run go first (see :py:mod:`jobcontrol.planner`).
+
+.. note::
+
+    The process pool requires a storage that can be shared between
+    processes (eg. PostgreSQL); the in-memory storage only works
+    with the thread and gevent pools.
+
+.. note::
+
+    The gevent pool runs all the builds in the current thread, which
+    is well suited for I/O-bound jobs, as long as they perform I/O in
+    a cooperative way (eg. the process was monkey-patched, or the jobs
+    use gevent-aware libraries). It requires ``gevent`` to be installed.
+    As the execution context stack is greenlet-local, ``current_build``
+    and friends stay correct in each build.
+"""
+
+from collections import OrderedDict
+from multiprocessing.pool import Pool, ThreadPool
+import Queue
+import copy
+import logging
+import multiprocessing
+import threading
+import traceback
+
+from jobcontrol.exceptions import MissingDependencies
+from jobcontrol.interfaces import BUILD_SUMMARY_FIELDS
+from jobcontrol.planner import CriticalPathPlanner
+
+logger = logging.getLogger('jobcontrol')
+
+
+POOL_TYPES = ('thread', 'process', 'gevent')
+
+# Seconds between checks for tasks that failed in the pool itself
+# (whose callbacks are never called)
+RESULT_POLL_INTERVAL = 1.0
+
+
+# Each worker (thread or process) keeps its own JobControl instance,
+# holding its own copy of the storage.
+_worker_state = threading.local()
+
+
+def _create_worker_app(app):
+    from jobcontrol.core import JobControl
+
+    worker_app = JobControl(storage=copy.deepcopy(app.storage),
+                            config=app.config)
+
+    # No need to resolve functions again in each worker
+    worker_app._function_cache = app._function_cache
+    return worker_app
+
+
+def _init_worker(app):
+    _worker_state.app = _create_worker_app(app)
+
+
+def _run_build_task(build_id, app=None):
+    """
+    Run a build inside a worker.
+
+    Errors in the job function are recorded in the build itself;
+    anything else is returned to the executor as a formatted
+    traceback, to be logged.
+
+    :return: a ``(build_id, error)`` tuple
+    """
+    if app is None:
+        app = _worker_state.app
+
+    try:
+        app.run_build(build_id)
+    except BaseException:
+        # Not using TracebackInfo, as the representation of locals
+        # might need the storage, and fail again.
+        return build_id, traceback.format_exc()
+    return build_id, None
+
+
+class _NonDaemonicProcess(multiprocessing.Process):
+    """
+    Process which is never daemonic, so that it can start child
+    processes of its own.
+    """
+
+    @property
+    def daemon(self):
+        return False
+
+    @daemon.setter
+    def daemon(self, value):
+        pass
+
+
+class _ProcessPool(Pool):
+    """
+    Process pool whose workers can run isolated builds (see
+    :py:mod:`jobcontrol.runner`), which need a child process;
+    daemonic processes are not allowed to have children.
+
+    Workers are still stopped by :py:meth:`DepGraphExecutor.run`,
+    which always closes or terminates the pool, and joins it.
+    """
+
+    Process = _NonDaemonicProcess
+
+
+class _GeventPool(object):
+    """
+    Wrapper giving a gevent pool the same interface as the
+    multiprocessing ones.
+
+    Greenlets share thread-locals, so each task gets its own
+    JobControl instance instead.
+    """
+
+    def __init__(self, workers, app):
+        try:
+            import gevent.pool
+        except ImportError:
+            raise RuntimeError('gevent is required to use the gevent pool')
+
+        self._pool = gevent.pool.Pool(workers)
+        self._app = app
+
+    def apply_async(self, func, args, callback=None):
+        args = tuple(args) + (_create_worker_app(self._app),)
+        return self._pool.apply_async(func, args, callback=callback)
+
+    def close(self):
+        pass
+
+    def terminate(self):
+        self._pool.kill()
+
+    def join(self):
+        self._pool.join()
+
+
+class DepGraphExecutor(object):
+    """
+    Run builds for a set of jobs, in dependency order, in parallel.
+
+    :param app:
+        The :py:class:`jobcontrol.core.JobControl` instance
+    :param workers:
+        Maximum number of builds to be run concurrently
+    :param pool:
+        Kind of worker pool to use: ``'thread'``, ``'process'``
+        or ``'gevent'``
+    """
+
+    def __init__(self, app, workers=4, pool='thread'):
+        if pool not in POOL_TYPES:
+            raise ValueError('Unsupported pool type: {0!r}'.format(pool))
+        if workers < 1:
+            raise ValueError('At least one worker is required')
+
+        self.app = app
+        self.workers = workers
+        self.pool = pool
+
+    def plan(self, job_id, build_deps=True, build_revdeps=False):
+        """
+        Compute the jobs to be built.
+
+        :return:
+            an ordered dict mapping job ids to the list of their
+            dependencies that are part of the plan too. Jobs are
+            sorted in a valid build order, the ones farthest from
+            the requested job (upstream) first.
+        """
+
+        app = self.app
+        app.get_job(job_id)  # Raise NotFound early
+
+        order = [job_id]
+
+        if build_deps:
+            # Sorted by longest distance from job_id, which is last
+            depgraph = app._create_job_depgraph(job_id)
+            order = app._resolve_deps(depgraph, job_id)
+
+        if build_revdeps:
+            # Nearest reverse dependencies first
+            revdepgraph = app._create_job_revdepgraph(job_id)
+            revdeps = app._resolve_deps(revdepgraph, job_id)
+            order.extend(x for x in reversed(revdeps) if x != job_id)
+
+        members = set(order)
+        return OrderedDict(
+            (jid, [x for x in app.config.get_job_deps(jid) if x in members])
+            for jid in order)
+
+    def estimate(self, job_id, build_deps=True, build_revdeps=False):
+        """
+        Estimate how long :py:meth:`run` will take, based on the
+        duration of past builds.
+
+        :return: a dict with keys ``duration`` (in seconds) and
+            ``critical_path`` (list of job ids)
+        """
+
+        plan = self.plan(job_id, build_deps=build_deps,
+                         build_revdeps=build_revdeps)
+        planner = CriticalPathPlanner(self.app)
+
+        return {
+            'duration': planner.estimate(plan, workers=self.workers),
+            'critical_path': planner.get_critical_path(plan),
+        }
+
+    def run(self, job_id, build_deps=True, build_revdeps=False):
+        """
+        Build the jobs from :py:meth:`plan`.
+
+        If a build fails, all the jobs depending on it are left
+        unbuilt; skipped builds are replaced by the latest successful
+        build for that job, if any. Up-to-date builds found in the
+        cache (see :py:meth:`jobcontrol.core.JobControl.create_build`)
+        are not run again.
+
+        :return:
+            an ordered dict mapping job ids to
+            :py:class:`jobcontrol.core.BuildInfo` instances, or ``None``
+            for jobs that were not built.
+        """
+
+        plan = self.plan(job_id, build_deps=build_deps,
+                         build_revdeps=build_revdeps)
+
+        planner = CriticalPathPlanner(self.app)
+        ranks = planner.get_ranks(plan)
+        logger.info('Building {0} jobs, estimated time: {1:.0f} seconds'
+                    .format(len(plan), planner.estimate(plan, self.workers)))
+
+        builds = OrderedDict((jid, None) for jid in plan)
+        running = {}  # build id -> job id
+        tasks = {}  # build id -> pool task
+        produced = {}  # job id -> build id to pin, or None
+        failed = set()
+        pending = list(plan)
+        pool, results = self._create_pool()
+        completed = False
+
+        try:
+            while pending or running:
+                changed = False
+                ready = []
+
+                for jid in list(pending):
+                    deps = plan[jid]
+
+                    if any(x in failed for x in deps):
+                        logger.warning('Not building {0}: dependency failed'
+                                       .format(jid))
+                        pending.remove(jid)
+                        failed.add(jid)
+                        changed = True
+                        continue
+
+                    if all(x in produced for x in deps):
+                        ready.append(jid)
+
+                # Longest remaining path first
+                ready.sort(key=lambda x: -ranks[x])
+
+                for jid in ready:
+                    if len(running) >= self.workers:
+                        break
+
+                    pending.remove(jid)
+                    deps = plan[jid]
+
+                    try:
+                        build = self.app.create_build(
+                            jid, dependency_builds=dict(
+                                (x, produced[x]) for x in deps
+                                if produced[x] is not None))
+                    except MissingDependencies:
+                        logger.exception('Cannot create build for {0}'
+                                         .format(jid))
+                        failed.add(jid)
+                        changed = True
+                        continue
+
+                    builds[jid] = build
+
+                    if build['finished']:
+                        # Up-to-date build reused from cache
+                        produced[jid] = build.id
+                        changed = True
+                        continue
+
+                    running[build.id] = jid
+                    tasks[build.id] = pool.apply_async(
+                        _run_build_task, (build.id,), callback=results.put)
+
+                if changed:
+                    continue  # More jobs might be ready now
+
+                if not running:
+                    if pending:
+                        # Should never happen, as the plan is sorted
+                        raise RuntimeError('Unable to build jobs: {0!r}'
+                                           .format(pending))
+                    break
+
+                build_id, error = self._get_result(results, tasks)
+                jid = running.pop(build_id)
+                del tasks[build_id]
+
+                if error is not None:
+                    logger.error('Error running build {0} for job {1}:\n{2}'
+                                 .format(build_id, jid, error))
+
+                build = builds[jid]
+                build.refresh(fields=BUILD_SUMMARY_FIELDS)
+
+                if build['finished'] and build['success']:
+                    produced[jid] = None if build['skipped'] else build.id
+                else:
+                    failed.add(jid)
+
+            completed = True
+
+        finally:
+            # On errors (or interruption), don't wait for running builds
+            if completed:
+                pool.close()
+            else:
+                pool.terminate()
+            pool.join()
+
+        return builds
+
+    def _get_result(self, results, tasks):
+        """
+        Wait for a build in the pool to complete.
+
+        :return: a ``(build_id, error)`` tuple, as returned by
+            ``_run_build_task``
+        """
+
+        while True:
+            try:
+                return results.get(timeout=RESULT_POLL_INTERVAL)
+            except Queue.Empty:
+                pass
+
+            for build_id, task in tasks.iteritems():
+                if task.ready() and not task.successful():
+                    try:
+                        task.get()
+                    except BaseException:
+                        return build_id, traceback.format_exc()
+
+    def _create_pool(self):
+        """
+        :return: a ``(pool, queue)`` tuple, where the queue is suitable
+            for receiving results from the pool callbacks.
+        """
+
+        if self.pool == 'gevent':
+            pool = _GeventPool(self.workers, self.app)
+            import gevent.queue
+            return pool, gevent.queue.Queue()
+
+        pool_class = ThreadPool if self.pool == 'thread' else _ProcessPool
+        pool = pool_class(self.workers, initializer=_init_worker,
+                          initargs=(self.app,))
+        return pool, Queue.Queue()
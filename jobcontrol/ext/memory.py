@@ -26,10 +26,18 @@ class MemoryStorage(StorageBase):
         # No need for an URL -- it's just an in-memory storage!
         return cls()
 
+    def __deepcopy__(self, memo):
+        """
+        Data is only kept in memory, so copies used by other threads
+        must share the very same object.
+        """
+        return self
+
     def _init_vars(self):
         self._jobs = {}
         self._builds = {}
         self._log_messages = defaultdict(list)  # build: messages
+        self._retval_chunks = defaultdict(dict)  # build: {seq: items}
         # self._jobs_seq = count()
         self._builds_seq = count()
 
@@ -45,8 +53,10 @@ class MemoryStorage(StorageBase):
         self._init_vars()
 
     def get_job_builds(self, job_id, started=None, finished=None,
-                       success=None, skipped=None, order='asc', limit=100):
+                       success=None, skipped=None, order='asc', limit=100,
+                       fields=None, fingerprint=None):
 
+        fields = self._normalize_build_fields(fields)
         filters = [lambda x: x['job_id'] == job_id]
 
         if started is not None:
@@ -61,6 +71,9 @@ class MemoryStorage(StorageBase):
         if skipped is not None:
             filters.append(lambda x: x['skipped'] is skipped)
 
+        if fingerprint is not None:
+            filters.append(lambda x: x['fingerprint'] == fingerprint)
+
         if order == 'asc':
             order_func = lambda x: sorted(x, key=lambda y: y[1]['id'])
 
@@ -77,22 +90,45 @@ class MemoryStorage(StorageBase):
                 return
 
             if all(f(build) for f in filters):
-                yield copy.deepcopy(build)
+                yield self._project_build(build, fields)
 
                 if limit is not None:
                     limit -= 1
 
+    def get_latest_builds(self, job_ids, started=None, finished=None,
+                          success=None, skipped=None, fields=None):
+        fields = self._normalize_build_fields(fields)
+        job_ids = set(job_ids)
+        filters = dict((key, val) for key, val in (
+            ('started', started), ('finished', finished),
+            ('success', success), ('skipped', skipped))
+            if val is not None)
+
+        latest = {}
+        for build in self._builds.itervalues():
+            if build['job_id'] not in job_ids:
+                continue
+            if any(build[key] is not val for key, val in filters.iteritems()):
+                continue
+            other = latest.get(build['job_id'])
+            if other is None or build['id'] > other['id']:
+                latest[build['job_id']] = build
+
+        return dict((job_id, self._project_build(build, fields))
+                    for job_id, build in latest.iteritems())
+
     # ------------------------------------------------------------
     # Build CRUD methods
     # ------------------------------------------------------------
 
-    def create_build(self, job_id, config=None):
+    def create_build(self, job_id, config=None, fingerprint=None):
         build_id = self._builds_seq.next()
 
         build = self._normalize_build_info({
             'id': build_id,
             'job_id': job_id,
             'config': config or {},
+            'fingerprint': fingerprint,
 
             # Progress is stored in a dict; then we'll have to rebuild it
             # into a proper tree.
@@ -102,14 +138,22 @@ class MemoryStorage(StorageBase):
         self._builds[build_id] = build
         return build_id
 
-    def get_build(self, build_id):
+    def get_build(self, build_id, fields=None):
+        fields = self._normalize_build_fields(fields)
+
         if build_id not in self._builds:
             raise NotFound('No such build: {0}'.format(build_id))
 
-        return copy.deepcopy(self._builds[build_id])
+        return self._project_build(self._builds[build_id], fields)
+
+    def _project_build(self, build, fields):
+        if fields is None:
+            return copy.deepcopy(build)
+        return dict((key, copy.deepcopy(build[key])) for key in fields)
 
     def delete_build(self, build_id):
         self._log_messages.pop(build_id, None)
+        self._retval_chunks.pop(build_id, None)
         self._builds.pop(build_id, None)
 
     def start_build(self, build_id):
@@ -167,11 +211,27 @@ class MemoryStorage(StorageBase):
         items = []
         build = self.get_build(build_id)
         for group_name, item in build['progress_info'].iteritems():
-            _item = item.copy()
-            _item['group_name'] = group_name
-            items.append(_item)
+            items.append((group_name, item['current'], item['total'],
+                          item['status_line']))
         return items
 
+    def store_retval_chunk(self, build_id, seq, items):
+        if build_id not in self._builds:
+            raise NotFound('No such build: {0}'.format(build_id))
+
+        # So we can fail coherently if it is not serializable
+        self.pack(items)
+
+        self._retval_chunks[build_id][seq] = copy.deepcopy(list(items))
+
+    def iter_retval_chunks(self, build_id):
+        chunks = self._retval_chunks.get(build_id, {})
+        for seq in sorted(chunks):
+            yield copy.deepcopy(chunks[seq])
+
+    def delete_retval_chunks(self, build_id):
+        self._retval_chunks.pop(build_id, None)
+
     def log_message(self, build_id, record):
         record = self._prepare_log_record(record)
         record['build_id'] = build_id
@@ -22,6 +22,8 @@ def _get_ctx_object(name):
     return getattr(top, name)
 
 
+# The stack is local to the current thread (or greenlet, if greenlet is
+# installed), so builds running concurrently each see their own context.
 _execution_ctx_stack = LocalStack()
 execution_context = LocalProxy(_get_current_ctx)
 current_app = LocalProxy(partial(_get_ctx_object, 'app'))
@@ -19,6 +19,10 @@ Interfaces for NEW jobcontrol objects.
                 Pickled exception object (or None)
             exception_tb BINARY (pickled)
                 Pickled TracebackInfo object
+            fingerprint TEXT
+                Hash of the build inputs (function, arguments and
+                dependency builds), used to find up-to-date builds
+            INDEX on (job_id, fingerprint)
 
     Build progress
     --------------
@@ -33,6 +37,15 @@ Interfaces for NEW jobcontrol objects.
                 An optional line of text describing current state
             UNIQUE constraint on (build_id, group_name)
 
+    Build retval chunk
+    ------------------
+            build_id INTEGER (references Build.id)
+            seq INTEGER
+                Position of the chunk in the return value
+            data BINARY (pickled)
+                Pickled list of items
+            PRIMARY KEY on (build_id, seq)
+
     Log     id SERIAL
     ---     build_id INTEGER (references Build.id)
             created TIMESTAMP
@@ -87,6 +100,16 @@ from jobcontrol.exceptions import SerializationError
 from jobcontrol.utils import ExceptionPlaceholder, LogRecord
 
 
+# Build fields describing the build state; cheap to retrieve
+BUILD_SUMMARY_FIELDS = ('id', 'job_id', 'start_time', 'end_time', 'started',
+                        'finished', 'success', 'skipped', 'fingerprint')
+
+# Build fields holding (potentially large) serialized objects
+BUILD_BLOB_FIELDS = ('config', 'retval', 'exception', 'exception_tb')
+
+BUILD_FIELDS = BUILD_SUMMARY_FIELDS + BUILD_BLOB_FIELDS
+
+
 class StorageBase(object):
 
     __metaclass__ = abc.ABCMeta
@@ -109,13 +132,23 @@ class StorageBase(object):
     def uninstall(self):
         pass
 
+    def upgrade(self):
+        """
+        Upgrade resources created by a previous version (eg. apply
+        database schema migrations).
+
+        :return: a list of the applied changes
+        """
+        return []
+
     # ------------------------------------------------------------
     # Build CRUD methods
     # ------------------------------------------------------------
 
     @abc.abstractmethod
     def get_job_builds(self, job_id, started=None, finished=None,
-                       success=None, skipped=None, order='asc', limit=100):
+                       success=None, skipped=None, order='asc', limit=100,
+                       fields=None, fingerprint=None):
         """
         Iterate over all the builds for a job, sorted by date, according
         to the order specified by ``order``.
@@ -134,13 +167,19 @@ class StorageBase(object):
             'asc' (default) or 'desc'
         :param limit:
             only return the first ``limit`` builds
+        :param fields:
+            If specified, only retrieve these fields (see
+            :py:data:`BUILD_FIELDS`); ``id`` and ``job_id`` are always
+            included.
+        :param fingerprint:
+            If specified, only return builds with this fingerprint
 
         :yield: Dictionaries representing build information
         """
         pass
 
     @abc.abstractmethod
-    def create_build(self, job_id, config=None):
+    def create_build(self, job_id, config=None, fingerprint=None):
         """
         Create a build.
 
@@ -158,15 +197,24 @@ class StorageBase(object):
             - ``dependency_builds``: dict mapping job ids to build ids,
               or ``None`` to indicate "create a new build" for this job.
 
+        :param fingerprint:
+            Hash of the build inputs, used to find builds that
+            can be reused instead of running new ones.
+
         :return: the build id
         """
         pass
 
     @abc.abstractmethod
-    def get_build(self, build_id):
+    def get_build(self, build_id, fields=None):
         """
         Get information about a build.
 
+        :param fields:
+            If specified, only retrieve these fields (see
+            :py:data:`BUILD_FIELDS`); ``id`` and ``job_id`` are always
+            included.
+
         :return: the build information, as a dict
         """
         pass
@@ -193,6 +241,23 @@ class StorageBase(object):
         """
         pass
 
+    # Bulk operations. Default implementations just call the
+    # single-build methods; storages should override them with
+    # something more efficient, where possible.
+
+    def create_builds(self, builds):
+        """
+        Create multiple builds at once.
+
+        :param builds:
+            an iterable of dicts holding keyword arguments
+            for :py:meth:`create_build` (``job_id``, ``config``,
+            ``fingerprint``)
+
+        :return: a list of the new build ids, in the same order
+        """
+        return [self.create_build(**build) for build in builds]
+
     def finish_build_with_exception(self, build_id):
         # todo: build a tracebackinfo object
         # todo: return finish_build() with failure + exception trace
@@ -225,6 +290,19 @@ class StorageBase(object):
         """
         pass
 
+    def report_builds_progress(self, reports):
+        """
+        Report progress for multiple builds (or progress groups) at once.
+
+        :param reports:
+            an iterable of dicts holding keyword arguments for
+            :py:meth:`report_build_progress` (``build_id``, ``current``,
+            ``total``, ``group_name``, ``status_line``). When the same
+            group is reported more than once, the latest report wins.
+        """
+        for report in reports:
+            self.report_build_progress(**report)
+
     @abc.abstractmethod
     def get_build_progress_info(self, build_id):
         """
@@ -234,21 +312,77 @@ class StorageBase(object):
         """
         pass
 
-    def get_latest_successful_build(self, job_id):
+    def get_latest_successful_build(self, job_id, fields=None,
+                                    fingerprint=None):
         """
         Helper method to retrieve the latest successful build for a given
-        job. Calls ``get_job_builds()`` in the background.
+        job (optionally, with a given fingerprint).
+        Calls ``get_job_builds()`` in the background.
 
         :return: information about the build, as a dict
         """
         builds = list(self.get_job_builds(
             job_id, started=True, finished=True, success=True, skipped=False,
-            order='desc', limit=1))
+            order='desc', limit=1, fields=fields, fingerprint=fingerprint))
         if len(builds) < 1:
             return None  # No build!
         assert len(builds) == 1  # Or something is broken..
         return builds[0]
 
+    def get_latest_builds(self, job_ids, started=None, finished=None,
+                          success=None, skipped=None, fields=None):
+        """
+        Retrieve the latest build of each one of a set of jobs, among
+        the ones matching the filters (see :py:meth:`get_job_builds`).
+
+        The default implementation calls ``get_job_builds()`` once per
+        job; storages should override it with something more efficient.
+
+        :return: a dict mapping job ids to build information dicts;
+            jobs without matching builds are not included.
+        """
+        builds = {}
+        for job_id in job_ids:
+            for build in self.get_job_builds(
+                    job_id, started=started, finished=finished,
+                    success=success, skipped=skipped, order='desc',
+                    limit=1, fields=fields):
+                builds[job_id] = build
+        return builds
+
+    @abc.abstractmethod
+    def store_retval_chunk(self, build_id, seq, items):
+        """
+        Store a "chunk" of the return value of a build whose function
+        returned a generator.
+
+        :param build_id:
+            The build id
+        :param seq:
+            Position of this chunk (starting from 0)
+        :param items:
+            A list of items generated by the build function
+        """
+        pass
+
+    @abc.abstractmethod
+    def iter_retval_chunks(self, build_id):
+        """
+        Iterate over the chunks stored via :py:meth:`store_retval_chunk`
+        for a build, in order.
+
+        :yield: lists of items
+        """
+        pass
+
+    @abc.abstractmethod
+    def delete_retval_chunks(self, build_id):
+        """
+        Delete all the chunks stored via :py:meth:`store_retval_chunk`
+        for a build.
+        """
+        pass
+
     @abc.abstractmethod
     def log_message(self, build_id, record):
         """
@@ -260,6 +394,13 @@ class StorageBase(object):
         #       database.
         pass
 
+    def log_messages(self, build_id, records):
+        """
+        Store multiple log records associated with a build, in order.
+        """
+        for record in records:
+            self.log_message(build_id, record)
+
     @abc.abstractmethod
     def prune_log_messages(self, job_id=None, build_id=None, max_age=None,
                            level=None):
@@ -359,6 +500,28 @@ class StorageBase(object):
 
         return build_conf
 
+    def _normalize_build_fields(self, fields):
+        """
+        Validate a list of build fields to be retrieved.
+
+        :return: a list of field names, always including ``id``
+            and ``job_id``, or ``None`` for "all the fields".
+        """
+        if fields is None:
+            return None
+
+        if isinstance(fields, basestring):
+            raise TypeError('fields must be a list of field names')
+
+        fields = set(fields)
+        invalid = fields.difference(BUILD_FIELDS)
+        if invalid:
+            raise ValueError('Invalid build fields: {0}'
+                             .format(', '.join(sorted(invalid))))
+
+        fields.update(('id', 'job_id'))
+        return [x for x in BUILD_FIELDS if x in fields]
+
     def _normalize_build_info(self, build_info):  # NO NEED FOR THIS?
         if not isinstance(build_info, dict):
             raise TypeError('build_info must be a dict')
@@ -382,10 +545,12 @@ class StorageBase(object):
         for key in ('retval', 'exception', 'exception_tb'):
             build_info.setdefault(key, None)
 
-        for key in ('title', 'notes'):
+        for key in ('title', 'notes', 'fingerprint'):
             build_info.setdefault(key, None)
 
         return build_info
 
     def _prepare_log_record(self, record):
+        if isinstance(record, LogRecord):
+            return record  # Already prepared (eg. by a child process)
         return LogRecord.from_record(record)
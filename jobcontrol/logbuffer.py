@@ -0,0 +1,158 @@
+"""
+Buffered storage of build log messages.
+
+By default, each log record emitted during a build is written to the
+storage right away, from the thread running the job (in PostgreSQL,
+that is an INSERT and a COMMIT for each record).
+
+For builds with the ``log_buffer_size`` configuration option set, a
+:py:class:`BufferedLogWriter` collects records instead, and a
+background thread writes them to the storage in batches (see
+:py:meth:`jobcontrol.interfaces.StorageBase.log_messages`): as soon as
+``log_buffer_size`` records are waiting, or every
+``log_flush_interval`` seconds. The buffer is drained before the
+build is marked as finished, so no records are lost.
+"""
+
+import copy
+import logging
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds between flushes, for builds not specifying log_flush_interval
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+# When this many times the buffer size are waiting to be written
+# (ie. the storage cannot keep up), records are written from the
+# thread logging them, slowing it down.
+MAX_PENDING_FACTOR = 10
+
+
+class BufferedLogWriter(object):
+    """
+    Write log records for a build in batches, from a background thread.
+
+    :param storage:
+        The storage to write records to. A copy is used by the
+        background thread (see :py:func:`copy.deepcopy`), and closed
+        along with the writer.
+    :param build_id:
+        Id of the build records belong to
+    :param size:
+        Number of buffered records triggering a flush
+    :param interval:
+        Maximum time (in seconds) records are kept in the buffer
+    """
+
+    def __init__(self, storage, build_id, size,
+                 interval=DEFAULT_FLUSH_INTERVAL):
+        if size < 1:
+            raise ValueError('Buffer size must be at least 1')
+        if interval <= 0:
+            raise ValueError('Flush interval must be positive')
+
+        self._origin_storage = storage
+        self.storage = copy.deepcopy(storage)
+        self.build_id = build_id
+        self.size = size
+        self.interval = interval
+
+        self._records = []
+        self._cond = threading.Condition()
+        self._write_lock = threading.RLock()
+        self._closed = False
+
+        self._thread = threading.Thread(
+            target=self._run,
+            name='jobcontrol-log-writer-{0}'.format(build_id))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def write(self, record):
+        """
+        Add a record to the buffer.
+
+        :param record: a :py:class:`logging.LogRecord`
+        """
+
+        # Convert right away, as arguments might change later on
+        record = self.storage._prepare_log_record(record)
+
+        with self._cond:
+            self._records.append(record)
+            pending = len(self._records)
+            if pending >= self.size:
+                self._cond.notify()
+            closed = self._closed
+
+        if closed or pending >= self.size * MAX_PENDING_FACTOR:
+            self.flush()
+
+    def flush(self):
+        """
+        Write all the buffered records to the storage, blocking
+        until done.
+        """
+
+        # Records must be written in order, by a thread at a time
+        with self._write_lock:
+            with self._cond:
+                records, self._records = self._records, []
+
+            if not records:
+                return
+
+            try:
+                self.storage.log_messages(
+                    build_id=self.build_id, records=records)
+            except Exception:
+                logger.exception('Error storing {0} log messages for build {1}'
+                                 .format(len(records), self.build_id))
+
+    def close(self):
+        """
+        Stop the background thread, write any remaining record, and
+        close the storage copy.
+
+        Records written afterwards go straight to the original storage.
+        """
+
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+        self._thread.join()
+
+        with self._write_lock:
+            try:
+                self.flush()
+            finally:
+                self._close_storage()
+
+    def _close_storage(self):
+        storage, self.storage = self.storage, self._origin_storage
+
+        # Copies might share the original storage (eg. when pooling
+        # connections), which is still in use
+        if storage is self._origin_storage:
+            return
+
+        close = getattr(storage, 'close', None)
+        if close is not None:
+            try:
+                close()
+            except Exception:
+                logger.exception('Error closing log storage for build {0}'
+                                 .format(self.build_id))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._records) < self.size:
+                    self._cond.wait(self.interval)
+                if self._closed:
+                    break
+
+            self.flush()
@@ -0,0 +1,163 @@
+"""
+Critical path planning for builds over the job dependency graph.
+
+The duration of each job is estimated from the history of its
+successful builds. From those, the :py:class:`CriticalPathPlanner`
+computes, for each job in a build plan (see
+:py:meth:`jobcontrol.executor.DepGraphExecutor.plan`), the length of
+the longest path from the start of that job to the end of the whole
+run (its "rank").
+
+Running the jobs with the highest rank first, when there are more
+jobs ready to be built than available workers, keeps the jobs on the
+critical path from waiting, which shortens the total run time.
+"""
+
+from collections import defaultdict
+import heapq
+
+
+# Number of past builds used to estimate the duration of jobs
+DEFAULT_HISTORY = 10
+
+# Duration (in seconds) assumed for jobs that were never built
+DEFAULT_DURATION = 60.0
+
+
+class CriticalPathPlanner(object):
+    """
+    Estimate durations and compute the critical path of build plans.
+
+    :param app:
+        The :py:class:`jobcontrol.core.JobControl` instance
+    :param history:
+        Number of past successful builds used to estimate the
+        duration of each job (the median is used)
+    :param default_duration:
+        Duration (in seconds) assumed for jobs without successful
+        builds
+    """
+
+    def __init__(self, app, history=DEFAULT_HISTORY,
+                 default_duration=DEFAULT_DURATION):
+        if history < 1:
+            raise ValueError('history must be at least 1')
+
+        self.app = app
+        self.history = history
+        self.default_duration = default_duration
+        self._durations = {}
+
+    def get_duration(self, job_id):
+        """
+        Estimate the duration of a build for a job.
+
+        :return: the duration, in seconds
+        """
+
+        if job_id not in self._durations:
+            builds = self.app.storage.get_job_builds(
+                job_id, started=True, finished=True, success=True,
+                skipped=False, order='desc', limit=self.history,
+                fields=['start_time', 'end_time'])
+
+            durations = [
+                (x['end_time'] - x['start_time']).total_seconds()
+                for x in builds
+                if x['start_time'] is not None and x['end_time'] is not None]
+
+            if durations:
+                self._durations[job_id] = _median(durations)
+            else:
+                self._durations[job_id] = self.default_duration
+
+        return self._durations[job_id]
+
+    def get_ranks(self, plan):
+        """
+        Compute the rank of each job in a plan: its own duration,
+        plus the longest rank among the jobs depending on it.
+
+        :param plan:
+            an ordered dict mapping job ids to their dependencies,
+            in build order (as returned by
+            :py:meth:`jobcontrol.executor.DepGraphExecutor.plan`)
+
+        :return: a dict mapping job ids to ranks (in seconds)
+        """
+
+        revdeps = _get_revdeps(plan)
+        ranks = {}
+
+        for job_id in reversed(plan):
+            ranks[job_id] = self.get_duration(job_id) + max(
+                [ranks[x] for x in revdeps[job_id]] or [0])
+
+        return ranks
+
+    def get_critical_path(self, plan):
+        """
+        :return: the list of job ids on the longest path through
+            the plan, in build order.
+        """
+
+        if not plan:
+            return []
+
+        ranks = self.get_ranks(plan)
+        revdeps = _get_revdeps(plan)
+
+        path = [max((x for x in plan if not plan[x]),
+                    key=lambda x: ranks[x])]
+        while revdeps[path[-1]]:
+            path.append(max(revdeps[path[-1]], key=lambda x: ranks[x]))
+
+        return path
+
+    def estimate(self, plan, workers=1):
+        """
+        Estimate the time needed to build all the jobs in a plan, by
+        simulating the run on ``workers`` workers, with jobs scheduled
+        by descending rank.
+
+        :return: the estimated duration of the run, in seconds
+        """
+
+        if workers < 1:
+            raise ValueError('At least one worker is required')
+
+        ranks = self.get_ranks(plan)
+        done = set()
+        pending = list(plan)
+        running = []  # heap of (end time, job id)
+        now = 0.0
+
+        while pending or running:
+            ready = [x for x in pending if all(y in done for y in plan[x])]
+            ready.sort(key=lambda x: -ranks[x])
+
+            for job_id in ready[:workers - len(running)]:
+                pending.remove(job_id)
+                heapq.heappush(
+                    running, (now + self.get_duration(job_id), job_id))
+
+            now, job_id = heapq.heappop(running)
+            done.add(job_id)
+
+        return now
+
+
+def _get_revdeps(plan):
+    revdeps = defaultdict(list)
+    for job_id, deps in plan.iteritems():
+        for dep in deps:
+            revdeps[dep].append(job_id)
+    return revdeps
+
+
+def _median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
@@ -0,0 +1,169 @@
+"""
+Live reload of the configuration, for long-running processes
+(the web application and Celery workers).
+
+The :py:class:`ConfigReloader` watches the configuration file from
+a background thread; when it changes (or when a reload is explicitly
+requested, eg. by sending ``SIGHUP`` to the process) the file is
+parsed and validated, then swapped in place of the current
+configuration by :py:meth:`jobcontrol.core.JobControl.reload_config`.
+Invalid configurations are logged and ignored.
+"""
+
+import logging
+import os
+import signal
+import threading
+
+from jobcontrol.config import JobControlConfig
+
+
+logger = logging.getLogger(__name__)
+
+# Interval (in seconds) between checks for configuration file changes
+DEFAULT_INTERVAL = 5
+
+
+class ConfigReloader(object):
+    """
+    Reload the configuration of a JobControl instance as the
+    configuration file (or any included file) changes.
+
+    :param app:
+        The :py:class:`jobcontrol.core.JobControl` instance
+    :param config_file:
+        Path to the configuration file
+    :param interval:
+        Seconds between checks for changes; if ``None``, the
+        file is not watched, and reloads only happen on request.
+    :param cache_dir:
+        Passed to :py:meth:`JobControlConfig.from_file`
+    """
+
+    def __init__(self, app, config_file, interval=DEFAULT_INTERVAL,
+                 cache_dir=None):
+        self.app = app
+        self.config_file = config_file
+        self.interval = interval
+        self.cache_dir = cache_dir
+
+        self._file_state = self._get_file_state()
+        self._reload_requested = False
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def _get_file_state(self):
+        state = []
+        filenames = [self.config_file]
+        filenames.extend(self.app.config.get_included_files())
+
+        for filename in filenames:
+            try:
+                st = os.stat(filename)
+            except OSError:
+                if filename == self.config_file:
+                    return None
+                continue  # Removed since the last check
+            state.append((filename, st.st_ino, st.st_size, st.st_mtime))
+
+        return state
+
+    def check(self):
+        """
+        Reload the configuration if the file changed since it was
+        last loaded.
+
+        :return: the jobs diff (see :py:meth:`reload`), or ``None``
+            if the configuration was not reloaded.
+        """
+
+        state = self._get_file_state()
+        if state is None or state == self._file_state:
+            return None
+        return self.reload()
+
+    def reload(self):
+        """
+        Load the configuration file and replace the current
+        configuration, if valid.
+
+        :return: a dict describing the jobs that changed, as returned
+            by :py:func:`jobcontrol.config.diff_jobs`, or ``None``
+            if the new configuration could not be loaded.
+        """
+
+        state = self._get_file_state()
+
+        try:
+            config = JobControlConfig.from_file(
+                self.config_file, cache_dir=self.cache_dir)
+
+        except Exception:
+            logger.exception('Invalid configuration in {0}; not reloading'
+                             .format(self.config_file))
+            self._file_state = state  # Do not try again until changed
+            return None
+
+        diff = self.app.reload_config(config)
+        self._file_state = state
+
+        logger.info(
+            'Configuration reloaded from {0}: {1} jobs added, {2} removed, '
+            '{3} changed'.format(self.config_file, len(diff['added']),
+                                 len(diff['removed']), len(diff['changed'])))
+        return diff
+
+    def request_reload(self):
+        """
+        Ask the background thread to reload the configuration, even if
+        the file did not change. Safe to call from signal handlers.
+        """
+        self._reload_requested = True
+        self._wakeup.set()
+
+    def install_signal_handler(self, signum=signal.SIGHUP):
+        """
+        Request a reload when the process receives a signal.
+        """
+        signal.signal(signum, lambda signum, frame: self.request_reload())
+
+    def start(self):
+        """
+        Start the background thread.
+        """
+        if self._thread is not None:
+            raise RuntimeError('Reloader already started')
+
+        self._thread = threading.Thread(
+            target=self._run, name='jobcontrol-config-reloader')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread, waiting for it to exit.
+        """
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+            if self._stopped:
+                break
+
+            try:
+                if self._reload_requested:
+                    self._reload_requested = False
+                    self.reload()
+                elif self.interval is not None:
+                    self.check()
+
+            except Exception:
+                logger.exception('Error reloading configuration')
@@ -0,0 +1,289 @@
+"""
+Run builds in an isolated child process.
+
+The job function is executed in a forked process, so that memory leaks,
+crashes or CPU-bound work in a build cannot affect the process that
+started it (eg. a Celery worker).
+
+The child reads from its own copy of the storage (obtained via
+``copy.deepcopy()``, which gives PostgreSQL storages a fresh
+connection), while everything it would write (build start / finish,
+progress reports, return value chunks and log messages) is streamed
+back to the parent through a pipe, and written to the storage by the
+parent.
+
+Resource limits from the build configuration are enforced here:
+
+- ``max_memory`` and ``max_cpu_seconds`` via ``setrlimit()`` in the
+  child process. Exhausting memory raises a ``MemoryError`` in the job;
+  exceeding the CPU time raises a
+  :py:exc:`jobcontrol.exceptions.BuildLimitExceeded`.
+- ``timeout`` by the parent, which terminates the child once the
+  build has been running for too long; this raises a
+  :py:exc:`jobcontrol.exceptions.BuildLimitExceeded` in the job.
+
+Either way, the build fails with a traceback showing what the job was
+doing when it was stopped. Children not stopping within
+:py:data:`KILL_GRACE_PERIOD` seconds are killed.
+"""
+
+import copy
+import logging
+import multiprocessing
+import os
+import resource
+import signal
+import threading
+import time
+
+from jobcontrol.exceptions import (
+    BuildProcessError, BuildLimitExceeded, SerializationError)
+from jobcontrol.utils import ExceptionPlaceholder
+
+logger = logging.getLogger('jobcontrol')
+
+
+# Build configuration keys holding resource limits
+RESOURCE_LIMITS = ('timeout', 'max_memory', 'max_cpu_seconds')
+
+# Seconds given to a build process to terminate cleanly, after
+# exceeding one of its limits, before it gets killed.
+KILL_GRACE_PERIOD = 10
+
+
+class PipeStorageProxy(object):
+    """
+    Storage used in the child process.
+
+    Reads are forwarded to a storage copy; calls to the methods listed
+    in :py:attr:`forwarded_methods` are sent to the parent process
+    instead.
+    """
+
+    forwarded_methods = (
+        'start_build',
+        'finish_build',
+        'report_build_progress',
+        'report_builds_progress',
+        'store_retval_chunk',
+        'delete_retval_chunks',
+        'log_message',
+        'log_messages',
+    )
+
+    def __init__(self, storage, conn, lock=None):
+        self._storage = storage
+        self._conn = conn
+
+        # Log messages may be sent from a background thread
+        # (see :py:mod:`jobcontrol.logbuffer`)
+        if lock is None:
+            lock = threading.Lock()
+        self._lock = lock
+
+    def __deepcopy__(self, memo):
+        """
+        Copies share the pipe (and the lock guarding it), but not
+        the storage used for reads.
+        """
+        return PipeStorageProxy(copy.deepcopy(self._storage, memo),
+                                self._conn, self._lock)
+
+    def __getattr__(self, name):
+        if name in self.forwarded_methods:
+            return lambda *a, **kw: self._send(name, a, kw)
+        return getattr(self._storage, name)
+
+    def _send(self, name, args, kwargs):
+        if name == 'log_message':
+            kwargs['record'] = self._storage._prepare_log_record(
+                kwargs['record'])
+
+        if name == 'log_messages':
+            kwargs['records'] = [self._storage._prepare_log_record(x)
+                                 for x in kwargs['records']]
+
+        if name == 'finish_build' and 'exception' in kwargs:
+            # Exceptions are allowed not to be serializable,
+            # while serialization errors on return values must be
+            # raised right away (in the child).
+            try:
+                self._storage.pack(kwargs['exception'])
+            except Exception:
+                kwargs['exception'] = ExceptionPlaceholder(
+                    kwargs['exception'])
+
+        try:
+            data = self._storage.pack((name, args, kwargs))
+
+        except SerializationError:
+            if name == 'log_message':
+                records = [kwargs['record']]
+            elif name == 'log_messages':
+                records = kwargs['records']
+            else:
+                raise
+
+            # Messages were already formatted; arguments can go.
+            for record in records:
+                record['args'] = repr(record['args'])
+            data = self._storage.pack((name, args, kwargs))
+
+        with self._lock:
+            self._conn.send_bytes(data)
+
+
+def _raise_limit_exceeded(message):
+    def handler(signum, frame):
+        raise BuildLimitExceeded(message)
+    return handler
+
+
+def _set_rlimit(which, soft, hard):
+    # The hard limit cannot be raised by unprivileged processes
+    cur_hard = resource.getrlimit(which)[1]
+    if cur_hard != resource.RLIM_INFINITY:
+        soft, hard = min(soft, cur_hard), min(hard, cur_hard)
+    resource.setrlimit(which, (soft, hard))
+
+
+def _apply_limits(limits):
+    """Apply resource limits to the current (child) process"""
+
+    if limits.get('max_memory'):
+        _set_rlimit(resource.RLIMIT_AS,
+                    limits['max_memory'], limits['max_memory'])
+
+    if limits.get('max_cpu_seconds'):
+        # SIGXCPU is sent on the soft limit, SIGKILL on the hard one
+        _set_rlimit(resource.RLIMIT_CPU, limits['max_cpu_seconds'],
+                    limits['max_cpu_seconds'] + KILL_GRACE_PERIOD)
+        signal.signal(signal.SIGXCPU, _raise_limit_exceeded(
+            'CPU time limit of {0} seconds exceeded'
+            .format(limits['max_cpu_seconds'])))
+
+    if limits.get('timeout'):
+        # The parent sends SIGTERM once the timeout expires
+        signal.signal(signal.SIGTERM, _raise_limit_exceeded(
+            'Build timed out after {0} seconds'.format(limits['timeout'])))
+
+
+def _child_main(app, build_id, conn, limits):
+    from jobcontrol.core import JobControl
+
+    _apply_limits(limits)
+
+    storage = PipeStorageProxy(copy.deepcopy(app.storage), conn)
+    child_app = JobControl(storage=storage, config=app.config)
+
+    try:
+        child_app.run_build(build_id, isolated=False)
+    finally:
+        conn.close()
+
+
+class SubprocessRunner(object):
+    """
+    Run a build in a child process, recording its outcome in the
+    parent's storage.
+
+    If the child process dies before reporting the end of the build,
+    the build is marked as failed with a
+    :py:exc:`jobcontrol.exceptions.BuildProcessError` holding its
+    exit code (a :py:exc:`jobcontrol.exceptions.BuildLimitExceeded`
+    if the child was killed after timing out).
+
+    :param app: the :py:class:`jobcontrol.core.JobControl` instance
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def run(self, build):
+        """
+        Run a build, blocking until the child process exits.
+
+        :param build: a :py:class:`jobcontrol.core.BuildInfo` instance
+        """
+
+        storage = self.app.storage
+        recv_conn, send_conn = multiprocessing.Pipe(duplex=False)
+
+        limits = dict((key, build.config.get(key)) for key in RESOURCE_LIMITS)
+
+        proc = multiprocessing.Process(
+            target=_child_main, args=(self.app, build.id, send_conn, limits),
+            name='jobcontrol-build-{0}'.format(build.id))
+        proc.start()
+
+        # Otherwise, we'd never get an EOF on our end
+        send_conn.close()
+
+        logger.debug('Build {0} running in process {1}'
+                     .format(build.id, proc.pid))
+
+        started = finished = timed_out = False
+
+        deadline = None
+        if limits['timeout']:
+            deadline = time.time() + limits['timeout']
+
+        while True:
+            if not self._poll(recv_conn, deadline):
+                if not timed_out:
+                    logger.warning('Build {0} timed out after {1} seconds'
+                                   .format(build.id, limits['timeout']))
+                    timed_out = True
+                    proc.terminate()
+                    deadline = time.time() + KILL_GRACE_PERIOD
+                    continue
+
+                logger.warning('Killing process {0} for build {1}'
+                               .format(proc.pid, build.id))
+                os.kill(proc.pid, signal.SIGKILL)
+                break
+
+            try:
+                name, args, kwargs = storage.unpack(recv_conn.recv_bytes())
+            except EOFError:
+                break
+
+            getattr(storage, name)(*args, **kwargs)
+
+            if name == 'start_build':
+                started = True
+            elif name == 'finish_build':
+                finished = True
+
+        recv_conn.close()
+        proc.join()
+
+        logger.debug('Process {0} for build {1} exited with code {2}'
+                     .format(proc.pid, build.id, proc.exitcode))
+
+        if not finished:
+            if not started:
+                storage.start_build(build.id)
+
+            if timed_out:
+                exception = BuildLimitExceeded(
+                    'Build timed out after {0} seconds, and was killed'
+                    .format(limits['timeout']), proc.exitcode)
+            else:
+                exception = BuildProcessError(
+                    'Build process exited with code {0} before the build '
+                    'finished'.format(proc.exitcode), proc.exitcode)
+
+            storage.finish_build(build.id, success=False, exception=exception)
+
+        return proc.exitcode
+
+    def _poll(self, conn, deadline):
+        """
+        Wait for data (or EOF) on the connection, until the deadline.
+
+        :return: ``False`` if the deadline expired
+        """
+        if deadline is None:
+            return True
+        return conn.poll(max(0, deadline - time.time()))
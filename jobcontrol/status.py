@@ -0,0 +1,140 @@
+"""
+Status computation for the whole job graph.
+
+Instead of querying the storage for each job (and then again for
+each one of its dependencies), the latest builds of all the involved
+jobs are retrieved at once, and the "outdated" flag is propagated
+along the dependency graph, visiting jobs in topological order.
+"""
+
+import logging
+
+from jobcontrol.interfaces import BUILD_SUMMARY_FIELDS
+from jobcontrol.utils.depgraph import topological_sort, DepLoop
+
+
+logger = logging.getLogger(__name__)
+
+
+class JobStatus(object):
+    """
+    Status information for a job.
+
+    :ivar job_id:
+        Id of the job
+    :ivar latest_build:
+        :py:class:`jobcontrol.core.BuildInfo` of the latest completed
+        build, or ``None``
+    :ivar latest_successful_build:
+        :py:class:`jobcontrol.core.BuildInfo` of the latest
+        successful build, or ``None``
+    :ivar outdated:
+        ``True`` if any of the (direct or indirect) dependencies
+        has a successful build more recent than the one of this job,
+        ``False`` if not, ``None`` if unknown (this job or any of its
+        dependencies has no successful builds).
+    :ivar buildable:
+        whether all the dependencies have at least a successful build
+    """
+
+    def __init__(self, job_id, latest_build=None,
+                 latest_successful_build=None, outdated=None,
+                 buildable=True):
+        self.job_id = job_id
+        self.latest_build = latest_build
+        self.latest_successful_build = latest_successful_build
+        self.outdated = outdated
+        self.buildable = buildable
+
+    def __repr__(self):
+        return '<JobStatus {0!r}: {1}>'.format(self.job_id, self.status)
+
+    @property
+    def status(self):
+        """
+        Label describing the job status, as returned by
+        :py:meth:`jobcontrol.core.JobInfo.get_status`.
+        """
+
+        if self.latest_build is None:
+            return 'not_built'
+
+        if self.outdated:
+            return 'outdated'
+
+        if self.latest_successful_build is not None:
+            return 'success'
+
+        return 'failed'
+
+
+def get_jobs_status(app, job_ids=None):
+    """
+    Compute the status of a set of jobs.
+
+    :param app:
+        The :py:class:`jobcontrol.core.JobControl` instance
+    :param job_ids:
+        Ids of the jobs to compute status for. Defaults to all the
+        configured jobs.
+
+    :return:
+        a dict mapping job ids to :py:class:`JobStatus` instances.
+        All the (direct or indirect) dependencies of the requested
+        jobs are included as well.
+    """
+    from jobcontrol.core import BuildInfo
+
+    if job_ids is None:
+        job_ids = [job['id'] for job in app.config.jobs]
+
+    graph = {}
+    to_explore = list(job_ids)
+    while to_explore:
+        job_id = to_explore.pop()
+        if job_id not in graph:
+            graph[job_id] = deps = app.config.get_job_deps(job_id)
+            to_explore.extend(deps)
+
+    try:
+        order = topological_sort(graph)
+    except DepLoop as e:
+        # Outdated status is only computed from direct dependencies
+        # for jobs we cannot sort.
+        logger.warning(str(e))
+        order = sorted(graph)
+
+    def _get_builds(**kw):
+        builds = app.storage.get_latest_builds(
+            graph, started=True, finished=True,
+            fields=BUILD_SUMMARY_FIELDS, **kw)
+        return dict((job_id, BuildInfo(app, build['id'], info=build))
+                    for job_id, build in builds.iteritems())
+
+    latest_builds = _get_builds()
+    successful_builds = _get_builds(success=True, skipped=False)
+
+    statuses = {}
+    for job_id in order:
+        build = successful_builds.get(job_id)
+        dep_builds = [successful_builds.get(x) for x in graph[job_id]]
+        buildable = all(x is not None for x in dep_builds)
+
+        if build is None or not buildable:
+            outdated = None
+
+        else:
+            outdated = any(
+                x['end_time'] > build['end_time'] for x in dep_builds)
+            outdated = outdated or any(
+                statuses[x].outdated for x in graph[job_id]
+                if x in statuses)
+
+        statuses[job_id] = JobStatus(
+            job_id,
+            latest_build=latest_builds.get(job_id),
+            latest_successful_build=build,
+            outdated=outdated,
+            buildable=buildable)
+
+    return statuses
@@ -459,6 +459,49 @@ class ProgressReport(object):
         return obj
 
 
+class ChunkedRetval(object):
+    """
+    Placeholder stored as the return value of builds whose function
+    returned a generator; the generated items are stored separately,
+    in chunks (see ``StorageBase.store_retval_chunk()``).
+    """
+
+    def __init__(self, count, chunks):
+        self.count = count
+        self.chunks = chunks
+
+    def __repr__(self):
+        return 'ChunkedRetval(count={0!r}, chunks={1!r})'.format(
+            self.count, self.chunks)
+
+
+class ChunkedRetvalReader(object):
+    """
+    Lazy, re-iterable access to the items of a chunked return value.
+
+    Chunks are retrieved from the storage only while iterating, so the
+    whole return value never needs to fit in memory.
+    """
+
+    def __init__(self, storage, build_id, retval):
+        self._storage = storage
+        self.build_id = build_id
+        self.count = retval.count
+        self.chunks = retval.chunks
+
+    def __repr__(self):
+        return '<Chunked return value: {0} items in {1} chunks>'.format(
+            self.count, self.chunks)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for chunk in self._storage.iter_retval_chunks(self.build_id):
+            for item in chunk:
+                yield item
+
+
 class NotSerializableRepr(object):
     def __init__(self, obj, exception=None):
         self.obj = repr(obj)
@@ -3,35 +3,268 @@ Dependency graph exploration / resolution functions.
 
 The dependency graph is represented as a dictionary of
 ``{<vertex>: [<dependencies>]}``.
+
+All the functions here are iterative and run in linear time on the
+size of the (reachable part of the) graph, so they can deal with
+large and deep graphs.
 """
 
+from collections import deque
+
 
 class DepResolutionError(Exception):
     pass
 
 
 class DepLoop(DepResolutionError):
-    pass
+    """
+    Exception raised when the dependency graph contains loops.
+    """
 
+    @property
+    def loops(self):
+        """
+        List of the loops found; each loop is the list of vertices
+        in it, starting and ending with the same vertex.
+        """
+        if len(self.args) > 1:
+            return self.args[1]
+        return []
 
-def resolve_deps(graph, start, with_weights=False):
-    distances = {}
-    distances[start] = 0
 
-    def _dfs_explore(vertex, trail):
+def get_reachable(graph, start):
+    """
+    :return: the set of vertices reachable from ``start``
+        (including ``start`` itself).
+    """
+
+    reachable = set([start])
+    stack = [start]
+
+    while stack:
+        vertex = stack.pop()
         for dest in graph[vertex]:
-            if dest in trail:
-                raise DepLoop('Loop detected! {0!r} -> {1!r}'
-                              .format(trail, dest))
+            if dest not in reachable:
+                reachable.add(dest)
+                stack.append(dest)
+
+    return reachable
+
+
+def find_components(graph, vertices=None):
+    """
+    Find the strongly connected components of a graph, using (an
+    iterative version of) Tarjan's algorithm.
+
+    :param vertices:
+        Only look at these vertices (and the ones reachable from them).
+        Defaults to all the vertices in the graph.
+
+    :return: a list of sets of vertices, one for each component.
+        Components come after all the ones they depend on.
+    """
+
+    if vertices is None:
+        vertices = graph
+
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    work = []  # (vertex, iterator over its dependencies)
+    components = []
+
+    def _visit(vertex):
+        index[vertex] = lowlink[vertex] = len(index)
+        stack.append(vertex)
+        on_stack.add(vertex)
+        work.append((vertex, iter(graph[vertex])))
+
+    for root in sorted(vertices):
+        if root in index:
+            continue
+
+        _visit(root)
+
+        while work:
+            vertex, dests = work[-1]
+
+            for dest in dests:
+                if dest not in index:
+                    _visit(dest)
+                    break
+                if dest in on_stack:
+                    lowlink[vertex] = min(lowlink[vertex], index[dest])
 
-            if dest not in distances:
-                distances[dest] = len(trail)
             else:
-                distances[dest] = max(len(trail), distances[dest])
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[vertex])
+
+                if lowlink[vertex] == index[vertex]:
+                    component = set()
+                    while True:
+                        item = stack.pop()
+                        on_stack.discard(item)
+                        component.add(item)
+                        if item == vertex:
+                            break
+                    components.append(component)
+
+    return components
+
+
+def _is_loop(graph, component):
+    if len(component) > 1:
+        return True
+    vertex, = component
+    return vertex in graph[vertex]
+
+
+def find_loops(graph, vertices=None):
+    """
+    Find loops in a graph.
+
+    One loop is reported for each strongly connected component
+    containing any (see :py:func:`find_components`).
+
+    :param vertices:
+        Only look at these vertices (and the ones reachable from them).
+        Defaults to all the vertices in the graph.
+
+    :return: a list of loops, in the same format as :py:attr:`DepLoop.loops`
+    """
+
+    loops = [_find_loop_path(graph, component)
+             for component in find_components(graph, vertices)
+             if _is_loop(graph, component)]
+    loops.sort()
+    return loops
+
+
+def _find_loop_path(graph, component):
+    """
+    Find the shortest loop passing from the "smallest" vertex of a
+    strongly connected component (breadth-first search).
+    """
+
+    start = min(component)
+    parents = {}
+    queue = deque([start])
+
+    while queue:
+        vertex = queue.popleft()
+
+        for dest in graph[vertex]:
+            if dest == start:
+                path = [vertex]
+                while path[-1] != start:
+                    path.append(parents[path[-1]])
+                path.reverse()
+                path.append(start)
+                return path
+
+            if dest in component and dest not in parents:
+                parents[dest] = vertex
+                queue.append(dest)
+
+    raise AssertionError('No loop found in component {0!r}'
+                         .format(sorted(component)))
+
+
+def _dep_loop_error(loops):
+    return DepLoop('Dependency loops detected: {0}'.format(
+        '; '.join(' -> '.join(repr(x) for x in loop)
+                  for loop in loops)), loops)
+
+
+def topological_sort(graph, vertices=None):
+    """
+    Sort vertices so that each one comes after all its dependencies
+    (Kahn's algorithm). Ties are broken by sorting vertices.
+
+    :param vertices:
+        Only sort these vertices (and the ones reachable from them).
+        Defaults to all the vertices in the graph.
 
-            _dfs_explore(dest, trail + [dest])
+    :return: the sorted list of vertices, dependencies first
+    :raises: :py:exc:`DepLoop` listing the loops found in the graph
+    """
 
-    _dfs_explore(start, [start])
+    if vertices is None:
+        vertices = set(graph)
+    else:
+        reachable = set()
+        for vertex in vertices:
+            if vertex not in reachable:
+                reachable.update(get_reachable(graph, vertex))
+        vertices = reachable
+
+    revdeps = dict((vertex, []) for vertex in vertices)
+    missing = {}
+    for vertex in vertices:
+        missing[vertex] = len(graph[vertex])
+        for dest in graph[vertex]:
+            revdeps[dest].append(vertex)
+
+    ready = deque(sorted(x for x in vertices if not missing[x]))
+    result = []
+
+    while ready:
+        vertex = ready.popleft()
+        result.append(vertex)
+        for dest in sorted(revdeps[vertex]):
+            missing[dest] -= 1
+            if missing[dest] == 0:
+                ready.append(dest)
+
+    if len(result) < len(vertices):
+        raise _dep_loop_error(find_loops(graph, vertices))
+
+    return result
+
+
+def resolve_deps(graph, start, with_weights=False):
+    """
+    Resolve the dependencies of a vertex.
+
+    Vertices are weighted by the length of the longest path from
+    ``start`` (that is, the number of "levels" of dependencies
+    between them), computed by visiting the graph in topological
+    order (Kahn's algorithm).
+
+    :return:
+        the list of vertices reachable from ``start``, sorted
+        by descending weight (``start`` is last). If ``with_weights``
+        is true, ``(weight, vertex)`` tuples are returned instead.
+
+    :raises: :py:exc:`DepLoop` listing all the loops in the graph
+        reachable from ``start``
+    """
+
+    vertices = get_reachable(graph, start)
+
+    loops = find_loops(graph, vertices)
+    if loops:
+        raise _dep_loop_error(loops)
+
+    indegree = dict((vertex, 0) for vertex in vertices)
+    for vertex in vertices:
+        for dest in graph[vertex]:
+            indegree[dest] += 1
+
+    distances = {start: 0}
+    queue = deque([start])
+
+    while queue:
+        vertex = queue.popleft()
+        for dest in graph[vertex]:
+            distances[dest] = max(distances.get(dest, 0),
+                                  distances[vertex] + 1)
+            indegree[dest] -= 1
+            if indegree[dest] == 0:
+                queue.append(dest)
 
     items = [(y, x) for (x, y) in distances.iteritems()]
     items.sort()
@@ -41,3 +274,114 @@ def resolve_deps(graph, start, with_weights=False):
         return items
 
     return [x[1] for x in items]
+
+
+class TransitiveClosure(object):
+    """
+    Transitive closure of a dependency graph, answering ancestor
+    and descendant queries without walking the graph.
+
+    Vertices are numbered in topological order (dependencies first);
+    the ancestors and descendants of each vertex are stored as integer
+    bitsets over that numbering. Vertices in a loop are ancestors
+    (and descendants) of each other, and of themselves.
+
+    :param graph:
+        The dependency graph; all the vertices must be keys.
+    """
+
+    def __init__(self, graph):
+        self._vertices = []
+        self._index = {}
+        self._ancestors = {}
+        self._descendants = {}
+
+        components = find_components(graph)
+        for component in components:
+            for vertex in sorted(component):
+                self._index[vertex] = len(self._vertices)
+                self._vertices.append(vertex)
+
+        revgraph = dict((vertex, []) for vertex in graph)
+        for vertex, deps in graph.iteritems():
+            for dest in deps:
+                revgraph[dest].append(vertex)
+
+        self._fill(graph, components, self._ancestors)
+        self._fill(revgraph, reversed(components), self._descendants)
+
+    def _fill(self, graph, components, closure):
+        # Components must come after all the ones they point to
+        for component in components:
+            bits = 0
+            for vertex in component:
+                for dest in graph[vertex]:
+                    if dest not in component:
+                        bits |= closure[dest] | self._bit(dest)
+
+            if _is_loop(graph, component):
+                for vertex in component:
+                    bits |= self._bit(vertex)
+
+            for vertex in component:
+                closure[vertex] = bits
+
+    def __eq__(self, other):
+        if type(self) is not type(other):
+            return False
+        return self.__dict__ == other.__dict__
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __contains__(self, vertex):
+        return vertex in self._index
+
+    def __len__(self):
+        return len(self._vertices)
+
+    def _bit(self, vertex):
+        return 1 << self._index[vertex]
+
+    def _decode(self, bits):
+        vertices = []
+        while bits:
+            lowest = bits & -bits
+            vertices.append(self._vertices[lowest.bit_length() - 1])
+            bits ^= lowest
+        return vertices
+
+    def is_ancestor(self, vertex, other):
+        """Check whether ``vertex`` is a (direct or indirect)
+        dependency of ``other``"""
+        return bool(self._ancestors[other] & self._bit(vertex))
+
+    def is_descendant(self, vertex, other):
+        """Check whether ``vertex`` (directly or indirectly)
+        depends on ``other``"""
+        return bool(self._descendants[other] & self._bit(vertex))
+
+    def get_ancestors(self, vertex):
+        """
+        :return: list of all the (direct or indirect) dependencies
+            of a vertex, in topological order.
+        """
+        return self._decode(self._ancestors[vertex])
+
+    def get_descendants(self, vertex):
+        """
+        :return: list of all the vertices (directly or indirectly)
+            depending on a vertex, in topological order.
+        """
+        return self._decode(self._descendants[vertex])
+
+    def get_impact(self, vertices):
+        """
+        :return: list of the vertices affected by a change to any of
+            ``vertices``: the vertices themselves, plus all their
+            descendants, in topological order.
+        """
+        bits = 0
+        for vertex in vertices:
+            bits |= self._descendants[vertex] | self._bit(vertex)
+        return self._decode(bits)
@@ -256,3 +256,75 @@ def job_creating_temp_file():
 def cleanup_temp_file(build):
     import os
     os.unlink(build.retval)
+
+
+def job_crashing_hard(exitcode=1):
+    """
+    Job terminating the process it runs in, without any cleanup
+    (to be run in an isolated process!)
+    """
+    import os
+    os._exit(exitcode)
+
+
+def job_exiting(exitcode=1):
+    """Job raising SystemExit"""
+    import sys
+    sys.exit(exitcode)
+
+
+def job_switching_greenlets(seconds=0.01):
+    """
+    Job yielding control to other greenlets while running.
+
+    :return: the current build id, as seen before and after the switch
+    """
+    import gevent
+    from jobcontrol.globals import execution_context
+
+    build_id = execution_context.build_id
+    gevent.sleep(seconds)
+    return build_id, execution_context.build_id
+
+
+def job_yielding_items(count=10, fail_at=None):
+    """
+    Job returning a generator, yielding integers from 0 to ``count``.
+    """
+    for i in xrange(count):
+        if i == fail_at:
+            raise RuntimeError('Simulated failure at item {0}'.format(i))
+        yield i
+
+
+def job_summing_items(items):
+    return sum(items)
+
+
+def job_ignoring_args(*args, **kwargs):
+    return None
+
+
+def job_appending_to_list(items, other_items):
+    items.append('appended')
+    return (items, other_items)
+
+
+def job_sleeping(seconds=1):
+    import time
+    time.sleep(seconds)
+    return seconds
+
+
+def job_burning_cpu(seconds=1):
+    """Job keeping the CPU busy for (at most) the given time"""
+    import time
+    start = time.clock()
+    while time.clock() - start < seconds:
+        pass
+    return seconds
+
+
+def job_allocating_memory(size):
+    data = 'X' * size
+    return len(data)
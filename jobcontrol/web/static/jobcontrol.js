@@ -84,4 +84,44 @@ $(function(){
 
         $container.before(filter_bar);
     });
+
+    // Build time estimates are loaded separately, as they can take a
+    // while to compute (or fail, eg. on dependency loops).
+    $('.build-estimate').each(function() {
+        var $container = $(this);
+
+        var format_duration = function(seconds) {
+            var pad = function(n) { return (n < 10 ? '0' : '') + n; };
+            seconds = Math.floor(seconds);
+            return Math.floor(seconds / 3600) + ':' +
+                pad(Math.floor(seconds / 60) % 60) + ':' + pad(seconds % 60);
+        };
+
+        $.getJSON($container.data('estimate-url'))
+            .done(function(estimate) {
+                var end = new Date(estimate.estimated_end);
+                $container.empty();
+                $container.append(
+                    $('<div></div>')
+                        .append($('<strong></strong>').text(
+                            format_duration(estimate.duration)))
+                        .append(' (including dependencies), ending around ')
+                        .append($('<abbr></abbr>')
+                                .attr('title', estimate.estimated_end)
+                                .text(end.toString())));
+                $container.append(
+                    $('<div></div>')
+                        .append('<strong>Critical path:</strong> ')
+                        .append(document.createTextNode(
+                            estimate.critical_path.join(' \u2192 '))));
+            })
+            .fail(function(xhr) {
+                var message = (xhr.responseJSON || {}).message;
+                $container.html('<em>Unable to estimate build time</em>');
+                if (message) {
+                    $container.append(': ').append(
+                        document.createTextNode(message));
+                }
+            });
+    });
 });
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, url_for
 
+from jobcontrol.utils.depgraph import DepLoop
 from jobcontrol.utils.web import json_view
 
 
@@ -56,6 +57,48 @@ def job_info(job_id):
     return _job_to_json(job)
 
 
+@api_views.route('/job/<string:job_id>/estimate', methods=['GET'])
+@json_view
+def job_estimate(job_id):
+    jc = get_jc()
+
+    try:
+        workers = int(request.args.get('workers', 4))
+    except ValueError:
+        workers = 0
+    if workers < 1:
+        return {'message': 'workers must be a positive integer'}, 400
+
+    try:
+        estimate = jc.estimate_job_graph(
+            job_id,
+            build_deps=request.args.get('deps', 'true') == 'true',
+            build_revdeps=request.args.get('revdeps', 'false') == 'true',
+            workers=workers)
+    except DepLoop as e:
+        return {'message': str(e)}, 409
+
+    estimate['estimated_end'] = estimate['estimated_end'].isoformat()
+    return estimate
+
+
+@api_views.route('/job/<string:job_id>/closure', methods=['GET'])
+@json_view
+def job_closure(job_id):
+    jc = get_jc()
+    return {
+        'ancestors': jc.get_job_ancestors(job_id),
+        'descendants': jc.get_job_descendants(job_id),
+    }
+
+
+@api_views.route('/job/impact', methods=['GET'])
+@json_view
+def jobs_impact():
+    jc = get_jc()
+    return jc.get_affected_jobs(request.args.getlist('job_id'))
+
+
 @api_views.route('/job/<string:job_id>/run', methods=['POST'])
 @json_view
 def job_run_submit(job_id):
@@ -65,11 +108,35 @@ def job_run_submit(job_id):
     jc.get_celery_app()  # Make sure it's configured
 
     build = jc.create_build(job_id)
-    run_build.delay(build.id)
+
+    cached = build['finished']
+    if not cached:
+        run_build.delay(build.id)
 
     return {
-        'build_id': build.id
+        'build_id': build.id,
+        'cached': cached,
     }
 
 
+@api_views.route('/job/run', methods=['POST'])
+@json_view
+def jobs_run_submit():
+    from jobcontrol.async.tasks import run_build
+
+    jc = get_jc()
+    jc.get_celery_app()  # Make sure it's configured
+
+    builds = jc.create_builds(request.form.getlist('job_id'))
+
+    result = []
+    for job_id, build in builds.iteritems():
+        cached = build['finished']
+        if not cached:
+            run_build.delay(build.id)
+        result.append({'job_id': job_id, 'build_id': build.id,
+                       'cached': cached})
+    return result
+
+
 # todo: add catch-all view for 404 pages?
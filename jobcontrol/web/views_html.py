@@ -1,5 +1,8 @@
 from __future__ import division
 
+import hashlib
+import time
+
 from flask import (Blueprint, render_template, redirect, url_for,
                    flash, request)
 
@@ -9,6 +12,32 @@ html_views = Blueprint('webui', __name__)
 
 DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
 
+DEPGRAPH_COLORS = {
+    'not_built': '#777777',
+    'outdated': '#f0ad4e',
+    'success': '#5cb85c',
+    'failed': '#d9534f',
+}
+
+DEPGRAPH_CONTENT_TYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+    'dot': 'text/plain',
+}
+
+# Seconds a rendered dependency graph is served for, before
+# checking the jobs status again
+DEPGRAPH_RENDER_TTL = 10
+
+# Maximum number of entries in the layout / render caches
+DEPGRAPH_CACHE_SIZE = 200
+
+# {<structure hash>: <graph in DOT format, with positions>}
+_depgraph_layouts = {}
+
+# {(<structure hash>, <format>, <url root>): (<expiry>, <data>)}
+_depgraph_renders = {}
+
 
 def get_jc():
     from flask import current_app
@@ -26,15 +55,19 @@ def jobs_list():
     if 'tag' in request.args:
         filter_tags = request.args.getlist('tag')
 
-    jobs = get_jc().iter_jobs()
+    jc = get_jc()
+    jobs = jc.iter_jobs()
     if filter_tags:
         jobs = (x for x in jobs
                 if all(t in x.config.get('tags', [])
                        for t in filter_tags))
 
+    # Dependencies and reverse dependencies are listed too,
+    # so just get status of all the jobs at once.
     return render_template(
         'jobs-list.jinja',
         jobs=list(jobs),
+        statuses=jc.get_jobs_status(),
         filter_tags=filter_tags)
 
 
@@ -52,7 +85,6 @@ def job_info(job_id):
                   methods=['GET'])
 def job_depgraph(job_id, fmt):
     # todo: add reverse dependencies
-    # todo: add colors to indicate job status (has builds, outdated, ..)
     # todo: figure out a way to add image map, for links
 
     jc = get_jc()
@@ -62,14 +94,68 @@ def job_depgraph(job_id, fmt):
     except:
         return 'PyGraphviz is not installed', 500
 
+    if fmt not in DEPGRAPH_CONTENT_TYPES:
+        return 'Unsupported format', 404
+
     if job_id is not None:
         depgraph = jc._create_job_depgraph(job_id, complete=True)
+    else:
+        depgraph = jc._create_full_depgraph()
+
+    # Layout only depends on the graph structure, while status
+    # colors (and links) are applied on each render; rendered graphs
+    # are reused for a few seconds.
+    layout_key, layout = _get_depgraph_layout(depgraph, job_id)
+
+    render_key = (layout_key, fmt, request.url_root)
+    cached = _depgraph_renders.get(render_key)
+    if cached is not None and cached[0] > time.time():
+        data = cached[1]
+
+    else:
+        graph = pygraphviz.AGraph(string=layout)
+        statuses = jc.get_jobs_status(graph.nodes())
+
+        for node in graph.nodes():
+            job = jc.get_job(node)
+            node.attr['URL'] = url_for('.job_info', job_id=node,
+                                       _external=True)
+            node.attr['target'] = '_top'
+            node.attr['tooltip'] = job.title
+            node.attr['fillcolor'] = (
+                DEPGRAPH_COLORS[statuses[node].status])
+
+        # Use the node and edge positions from the layout
+        data = graph.draw(format=fmt, prog='neato', args='-n2')
+        _cache_put(_depgraph_renders, render_key,
+                   (time.time() + DEPGRAPH_RENDER_TTL, data))
+
+    return data, 200, {'content-type': DEPGRAPH_CONTENT_TYPES[fmt]}
+
+
+def _get_depgraph_layout(depgraph, job_id):
+    """
+    Get the layout of a dependency graph, from cache if possible.
+
+    :return: a ``(key, dot)`` tuple, where ``key`` is a hash of the
+        graph structure and ``dot`` the graph in DOT format, with
+        node and edge positions.
+    """
+    import pygraphviz
+
+    key = hashlib.sha1(repr((job_id, sorted(
+        (vertex, sorted(deps)) for vertex, deps in depgraph.iteritems()
+    )))).hexdigest()
+
+    if key in _depgraph_layouts:
+        return key, _depgraph_layouts[key]
+
+    if job_id is not None:
         graph = pygraphviz.AGraph(
             depgraph, directed=True,
             name="Job {0} Dependency graph".format(job_id))
 
     else:
-        depgraph = jc._create_full_depgraph()
         graph = pygraphviz.AGraph(
             depgraph, directed=True, name="Dependency graph")
 
@@ -84,18 +170,7 @@ def job_depgraph(job_id, fmt):
     graph.edge_attr['len'] = '1.5'  # Inches
     # graph.edge_attr['weight'] = '10'
 
-    # node = graph.get_node(job_id)
-    # node.attr['fontsize'] = '14'
-    # node.attr['penwidth'] = '3'
-    # node.attr['color'] = '#ff0000'
-    # node.attr['label'] = 'Job {0}'.format(job_id)
-
     for node in graph.nodes():
-        job = jc.get_job(node)
-        node.attr['URL'] = url_for('.job_info', job_id=node, _external=True)
-        node.attr['target'] = '_top'
-        node.attr['tooltip'] = job.title
-
         node.attr['fontcolor'] = '#ffffff'
         node.attr['style'] = 'filled'
         node.attr['shape'] = 'rectangle'
@@ -109,34 +184,19 @@ def job_depgraph(job_id, fmt):
         else:
             node.attr['penwidth'] = '0'
 
-        if job.has_successful_builds():
-            if job.is_outdated():
-                node.attr['fillcolor'] = '#f0ad4e'
-
-            else:
-                node.attr['fillcolor'] = '#5cb85c'
-
-        elif job.has_builds():
-            node.attr['fillcolor'] = '#d9534f'
-
-        else:
-            node.attr['fillcolor'] = '#777777'
-
     # todo: give different color to revdep edges
     # todo: detect loops, color edges in red
 
     graph.layout(prog='fdp')
 
-    if fmt == 'png':
-        return graph.draw(format='png'), 200, {'content-type': 'image/png'}
+    _cache_put(_depgraph_layouts, key, graph.string())
+    return key, _depgraph_layouts[key]
 
-    elif fmt == 'svg':
-        return graph.draw(format='svg'), 200, {'content-type': 'image/svg+xml'}
 
-    elif fmt == 'dot':
-        return graph.draw(format='dot'), 200, {'content-type': 'text/plain'}
-
-    return 'Unsupported format', 404
+def _cache_put(cache, key, value):
+    if len(cache) >= DEPGRAPH_CACHE_SIZE:
+        cache.clear()
+    cache[key] = value
 
 
 @html_views.route('/job/<string:job_id>/run', methods=['GET'])
@@ -166,11 +226,17 @@ def job_run_submit(job_id):
     # celery_app.conf.BROKER_URL = broker
 
     build = jc.create_build(job_id)
-    run_build.delay(build.id)
 
-    # todo: flash links? [can we?]
-    flash(u'New build created for job {0}. Build id is #{1}.'
-          .format(job_id, build.id), 'success')
+    if build['finished']:
+        flash(u'Job {0} is up to date: reusing build #{1}.'
+              .format(job_id, build.id), 'success')
+
+    else:
+        run_build.delay(build.id)
+
+        # todo: flash links? [can we?]
+        flash(u'New build created for job {0}. Build id is #{1}.'
+              .format(job_id, build.id), 'success')
 
     # build_job.delay(job_id)
     # flash('Job {0} build scheduled'.format(job_id), 'success')
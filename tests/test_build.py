@@ -10,7 +10,7 @@ import pickle
 import pytest
 
 from jobcontrol.core import JobControl
-from jobcontrol.exceptions import SerializationError
+from jobcontrol.exceptions import SerializationError, MissingDependencies
 from jobcontrol.config import JobControlConfig
 from jobcontrol.utils import TracebackInfo, ExceptionPlaceholder
 from jobcontrol.utils.testing import (
@@ -176,7 +176,6 @@ def test_build_configuration_pinning(storage):
     build_id = build.id  # Then stop using this object
 
 
-@pytest.mark.xfail(True, reason='Not supported yet')
 def test_dependency_pinning(storage):
     # Test for dependency pinning
     # ---------------------------
@@ -252,3 +251,340 @@ def test_dependency_pinning(storage):
     build_2_2.refresh()
     assert build_2_2['finished'] and build_2_2['success']
     assert build_2_2['retval'] == 'new-retval'
+
+
+def test_build_returning_generator(storage):
+    from jobcontrol.utils import ChunkedRetval
+
+    config = JobControlConfig.from_string(dedent("""\
+    jobs:
+        - id: job-1
+          function: jobcontrol.utils.testing:job_yielding_items
+          retval_chunk_size: 3
+          kwargs:
+              count: 10
+
+        - id: job-2
+          function: jobcontrol.utils.testing:job_summing_items
+          args:
+              - !retval 'job-1'
+          dependencies: ['job-1']
+
+        - id: job-3
+          function: jobcontrol.utils.testing:job_yielding_items
+          retval_chunk_size: 2
+          kwargs:
+              count: 10
+              fail_at: 5
+    """))
+    jc = JobControl(storage=storage, config=config)
+
+    build = jc.create_build('job-1')
+    build.run()
+    assert build['finished'] and build['success']
+
+    assert isinstance(build['retval'], ChunkedRetval)
+    assert build['retval'].count == 10
+    assert build['retval'].chunks == 4
+    assert len(build.retval) == 10
+    assert list(build.retval) == range(10)
+    assert list(build.retval) == range(10)  # Can be iterated again
+    assert list(storage.iter_retval_chunks(build.id)) == [
+        [0, 1, 2], [3, 4, 5], [6, 7, 8], [9]]
+
+    # Dependent jobs get a lazy iterable
+    build = jc.create_build('job-2')
+    build.run()
+    assert build['finished'] and build['success']
+    assert build.retval == 45
+
+    # Failing in the middle of the generator fails the build
+    build = jc.create_build('job-3')
+    build.run()
+    assert build['finished'] and not build['success']
+    assert isinstance(build['exception'], RuntimeError)
+    assert list(storage.iter_retval_chunks(build.id)) == []
+
+
+def test_dependency_retval_resolution(storage, monkeypatch):
+    from jobcontrol.core import BuildInfo
+
+    config = JobControlConfig.from_string(dedent("""\
+    jobs:
+        - id: job-1
+          function: jobcontrol.utils.testing:job_yielding_items
+          kwargs:
+              count: 5
+
+        - id: job-2
+          function: jobcontrol.utils.testing:job_summing_items
+          args:
+              - !retval 'job-1'
+          dependencies: ['job-1']
+
+        - id: job-3
+          function: jobcontrol.utils.testing:job_ignoring_args
+          lazy_retvals: true
+          args:
+              - !retval 'job-1'
+          dependencies: ['job-1']
+
+        - id: job-4
+          function: jobcontrol.utils.testing:job_summing_items
+          lazy_retvals: true
+          args:
+              - !retval 'job-1'
+          dependencies: ['job-1']
+
+        - id: job-5
+          function: jobcontrol.utils.testing:job_simple_echo
+          args:
+              - !retval 'job-2'
+              - !retval 'job-2'
+              - [!retval 'job-2']
+          kwargs:
+              foo: !retval 'job-2'
+          dependencies: ['job-2']
+    """))
+    jc = JobControl(storage=storage, config=config)
+
+    calls = []
+    _get_dependency_build = BuildInfo.get_dependency_build
+
+    def get_dependency_build(self, job_id):
+        calls.append(job_id)
+        return _get_dependency_build(self, job_id)
+
+    monkeypatch.setattr(BuildInfo, 'get_dependency_build',
+                        get_dependency_build)
+
+    jc.create_build('job-1').run()
+    jc.create_build('job-2').run()
+    del calls[:]
+
+    # Resolved only once per build
+    build = jc.create_build('job-5')
+    build.run()
+    assert build['success']
+    assert build.retval == ((10, 10, [10]), {'foo': 10})
+    assert calls == ['job-2']
+    del calls[:]
+
+    # Lazy return values are never retrieved, if not accessed
+    build = jc.create_build('job-3')
+    build.run()
+    assert build['success']
+    assert calls == []
+
+    build = jc.create_build('job-4')
+    build.run()
+    assert build['success']
+    assert build.retval == 10
+    assert calls == ['job-1']
+
+
+def test_dependency_retval_copies(storage, monkeypatch):
+    import jobcontrol.core
+
+    copies = []
+    _copy_retval = jobcontrol.core._copy_retval
+
+    def copy_retval(value):
+        copies.append(value)
+        return _copy_retval(value)
+
+    monkeypatch.setattr(jobcontrol.core, '_copy_retval', copy_retval)
+
+    config = JobControlConfig.from_string(dedent("""\
+    jobs:
+        - id: job-1
+          function: jobcontrol.utils.testing:testing_job
+          kwargs:
+              retval: ['a', 'b']
+
+        - id: job-2
+          function: jobcontrol.utils.testing:job_appending_to_list
+          args:
+              - !retval 'job-1'
+              - !retval 'job-1'
+          dependencies: ['job-1']
+
+        - id: job-3
+          function: jobcontrol.utils.testing:job_appending_to_list
+          lazy_retvals: true
+          args:
+              - !retval 'job-1'
+              - !retval 'job-1'
+          dependencies: ['job-1']
+
+        - id: job-4
+          function: jobcontrol.utils.testing:job_simple_echo
+          lazy_retvals: true
+          args:
+              - !retval 'job-1'
+          kwargs:
+              foo: [!retval 'job-1']
+          dependencies: ['job-1']
+    """))
+    jc = JobControl(storage=storage, config=config)
+    jc.create_build('job-1').run()
+
+    # Modifying an argument does not change the others
+    for job_id in ('job-2', 'job-3'):
+        del copies[:]
+        build = jc.create_build(job_id)
+        build.run()
+        assert build['success']
+        assert build.retval == (['a', 'b', 'appended'], ['a', 'b'])
+
+        # The last occurrence gets the value itself
+        assert len(copies) == 1
+
+    # Lazy return values can be returned (and stored) as they are
+    build = jc.create_build('job-4')
+    build.run()
+    assert build['success']
+    assert build.retval == ((['a', 'b'],), {'foo': [['a', 'b']]})
+
+
+def test_build_lazy_blob_loading(storage, monkeypatch):
+    config = JobControlConfig.from_string(dedent("""\
+    jobs:
+        - id: job-1
+          function: jobcontrol.utils.testing:testing_job
+          kwargs:
+              retval: "Hello"
+    """))
+    jc = JobControl(storage=storage, config=config)
+
+    build = jc.create_build('job-1')
+    build.run()
+
+    requested = []
+    _get_build = storage.get_build
+
+    def get_build(build_id, fields=None):
+        requested.append(fields)
+        return _get_build(build_id, fields=fields)
+
+    monkeypatch.setattr(storage, 'get_build', get_build)
+
+    # Builds are listed without their blob fields..
+    job = jc.get_job('job-1')
+    build, = list(job.iter_builds())
+    assert build.descriptive_status == 'SUCCESSFUL'
+    assert build['end_time'] is not None
+    assert requested == []
+
+    # ..which are loaded one at a time, on first access
+    assert build.retval == 'Hello'
+    assert build.retval == 'Hello'
+    assert requested == [['retval']]
+
+    assert build.info['config']['id'] == 'job-1'
+    assert requested == [['retval'], ['config', 'exception', 'exception_tb']]
+
+    build = job.get_latest_successful_build()
+    assert 'retval' not in build._info
+    assert build['retval'] == 'Hello'
+
+
+def test_build_cache(storage):
+    config = JobControlConfig.from_string(dedent("""\
+    jobs:
+        - id: job-1
+          function: jobcontrol.utils.testing:testing_job
+          kwargs:
+              retval: "Hello"
+          cache: true
+
+        - id: job-2
+          function: jobcontrol.utils.testing:job_simple_echo
+          args:
+              - !retval 'job-1'
+          dependencies: ['job-1']
+          cache: true
+    """))
+    jc = JobControl(storage=storage, config=config)
+
+    build_1 = jc.build_job('job-1')
+    assert build_1['success']
+
+    # Same inputs -> the build is reused
+    assert jc.build_job('job-1') == build_1
+    assert jc.create_build('job-1')['finished']
+    assert len(list(jc.get_job('job-1').iter_builds())) == 1
+
+    build_2 = jc.build_job('job-2')
+    assert build_2.retval == (('Hello',), {})
+    assert jc.build_job('job-2') == build_2
+
+    # Caching can be disabled on a per-build basis
+    build_1b = jc.create_build('job-1', use_cache=False)
+    assert build_1b != build_1
+    assert build_1b['fingerprint'] == build_1['fingerprint']
+    build_1b.run()
+
+    # A new dependency build changes the fingerprint
+    build_2b = jc.build_job('job-2')
+    assert build_2b != build_2
+    assert build_2b['fingerprint'] != build_2['fingerprint']
+
+    # Failed builds are never reused
+    config.get_job_config('job-1')['kwargs']['fail'] = True
+    failed = jc.build_job('job-1')
+    assert not failed['success']
+    assert jc.create_build('job-1') != failed
+
+    # The executor does not run cached builds again
+    config.get_job_config('job-1')['kwargs'].pop('fail')
+    builds = jc.build_job_graph('job-2')
+    assert builds['job-1'] == build_1b
+    assert builds['job-2'] == build_2b
+
+
+def test_create_multiple_builds(storage, monkeypatch):
+    config = JobControlConfig.from_string(dedent("""\
+    jobs:
+        - id: job-1
+          function: jobcontrol.utils.testing:testing_job
+          cache: true
+
+        - id: job-2
+          function: jobcontrol.utils.testing:testing_job
+
+        - id: job-3
+          function: jobcontrol.utils.testing:testing_job
+          dependencies: ['job-2']
+    """))
+    jc = JobControl(storage=storage, config=config)
+
+    cached = jc.build_job('job-1')
+
+    builds = jc.create_builds(['job-1', 'job-2', 'job-2'])
+    assert list(builds) == ['job-1', 'job-2']
+    assert builds['job-1'] == cached
+    assert builds['job-2'].descriptive_status == 'CREATED'
+    assert builds['job-2'].config['function'] == \
+        'jobcontrol.utils.testing:testing_job'
+
+    # Nothing is created if any job cannot be built
+    with pytest.raises(MissingDependencies):
+        jc.create_builds(['job-2', 'job-3'])
+    assert len(list(jc.get_job('job-2').iter_builds())) == 1
+
+    build_2 = builds['job-2']
+    build_2.run()
+    assert build_2['success']
+
+    builds = jc.create_builds(['job-3'])
+    assert builds['job-3'].config['pinned_builds'] == {'job-2': build_2.id}
+
+    # Dependency builds are looked up at once
+    def fail(*a, **kw):
+        raise AssertionError('Unexpected call')
+
+    monkeypatch.setattr(storage, 'get_latest_successful_build', fail)
+    monkeypatch.setattr(storage, 'get_job_builds', fail)
+    builds = jc.create_builds(['job-3', 'job-2'])
+    assert builds['job-3'].config['pinned_builds'] == {'job-2': build_2.id}
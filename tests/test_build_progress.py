@@ -19,3 +19,30 @@ def test_build_progress_reporting(storage):
     })
 
     build = jc.create_build(job_id='foo_job')
+
+
+def test_build_progress_batch_reporting(storage):
+    build_1 = storage.create_build('job-1')
+    build_2 = storage.create_build('job-2')
+
+    storage.report_build_progress(build_1, 1, 10)
+    storage.report_builds_progress([
+        {'build_id': build_1, 'current': 2, 'total': 10},
+        {'build_id': build_1, 'current': 1, 'total': 5,
+         'group_name': ('foo', 'bar'), 'status_line': 'Working'},
+        {'build_id': build_2, 'current': 3, 'total': 3},
+        {'build_id': build_1, 'current': 4, 'total': 10},
+    ])
+    storage.report_builds_progress([])
+
+    progress = sorted(
+        (tuple(name or ()), current, total, status_line)
+        for name, current, total, status_line
+        in storage.get_build_progress_info(build_1))
+    assert progress == [
+        ((), 4, 10, ''),
+        (('foo', 'bar'), 1, 5, 'Working'),
+    ]
+
+    assert [x[1:3] for x in storage.get_build_progress_info(build_2)] == [
+        (3, 3)]
@@ -1,7 +1,12 @@
+import pickle
+from textwrap import dedent
+import time
+
 import pytest
 
 from jobcontrol.core import BuildConfig
-from jobcontrol.config import JobControlConfig, Retval, _yaml_load
+from jobcontrol.config import (
+    JobControlConfig, LazyBuildConfig, Param, Retval, _yaml_load)
 
 
 def test_retval_object():
@@ -121,8 +126,13 @@ def test_job_config_default_values():
     assert job['title'] is None
     assert job['notes'] is None
     assert job['protected'] is False
+    assert job['isolated'] is False
+    assert job['cache'] is False
     assert job['cleanup_function'] is None
     assert job['repr_function'] is None
+    assert job['timeout'] is None
+    assert job['max_memory'] is None
+    assert job['max_cpu_seconds'] is None
 
     with pytest.raises(KeyError):
         job['does_not_exist']
@@ -249,6 +259,30 @@ def test_job_config_with_dependencies():
     assert config.get_job_deps('does-not-exist') == []
     assert config.get_job_revdeps('does-not-exist') == []
 
+    # Indexes are kept up to date when adding jobs
+    config._update({'jobs': [
+        {'id': 'qux', 'function': 'mymodule.qux',
+         'dependencies': ['foo', 'baz']},
+    ]})
+    assert config.get_job('qux')['function'] == 'mymodule.qux'
+    assert config.get_job_deps('qux') == ['foo', 'baz']
+    assert config.get_job_revdeps('foo') == ['bar', 'baz', 'qux']
+    assert config.get_job_revdeps('baz') == ['qux']
+
+    # ..but not on errors
+    with pytest.raises(ValueError):
+        config._update({'jobs': [
+            {'id': 'quux', 'function': 'mymodule.quux',
+             'dependencies': ['foo']},
+            {'id': 'foo', 'function': 'mymodule.foo'},
+        ]})
+    assert config.get_job('quux') is None
+    assert config.get_job_revdeps('foo') == ['bar', 'baz', 'qux']
+
+    # Returned lists can be safely changed
+    config.get_job_revdeps('foo').append('something')
+    assert config.get_job_revdeps('foo') == ['bar', 'baz', 'qux']
+
 
 def test_build_config_var_deletion():
     build_config = BuildConfig()
@@ -337,3 +371,268 @@ def test_build_config_pickle_unpickle():
     assert len(unpickled_config.jobs) == 2
     for job in unpickled_config.jobs:
         assert isinstance(job, BuildConfig)
+
+
+def test_config_lazy_jobs():
+    config = JobControlConfig.from_string("""
+    jobs:
+        - id: job-1
+          function: mymodule:myfunction
+          kwargs: {foo: !retval job-0}
+        - id: "job-2"
+          function: mymodule:myfunction
+          dependencies:
+              - job-1
+    """)
+
+    job_1, job_2 = config.jobs
+    assert isinstance(job_1, LazyBuildConfig)
+
+    # Dependency graph is available without loading jobs
+    assert config.get_job_deps('job-2') == ['job-1']
+    assert config.get_job_revdeps('job-1') == ['job-2']
+    assert not job_1.loaded
+    assert not job_2.loaded
+
+    # Validating does not keep the parsed jobs
+    config.validate()
+    assert not job_1.loaded
+
+    assert config.get_job('job-1')['kwargs'] == {'foo': Retval('job-0')}
+    assert job_1.loaded
+    assert not job_2.loaded
+
+    assert job_2 == BuildConfig({
+        'id': 'job-2', 'function': 'mymodule:myfunction',
+        'dependencies': ['job-1']})
+    assert pickle.loads(pickle.dumps(job_2)) == job_2
+
+    # Jobs using merge keys are loaded right away
+    config = JobControlConfig.from_string("""
+    defaults: &defaults
+        function: mymodule:myfunction
+        dependencies: ['job-1']
+    jobs:
+        - id: job-1
+          function: mymodule:myfunction
+        - <<: *defaults
+          id: job-2
+    """)
+    assert config.get_job_deps('job-2') == ['job-1']
+
+    # Errors in jobs are only found as they are loaded
+    config = JobControlConfig.from_string("""
+    jobs:
+        - id: job-1
+          title: ['not', 'a', 'string']
+    """, lazy=True)
+    assert config.get_job_deps('job-1') == []
+    with pytest.raises(TypeError):
+        config.get_job('job-1')['title']
+    with pytest.raises(TypeError):
+        config.validate()
+
+
+def test_config_include_files(tmpdir):
+    tmpdir.join('jobs.d').mkdir()
+    tmpdir.join('jobs.d', 'b.yaml').write(dedent("""\
+    jobs:
+        - id: job-b
+          function: mymodule:myfunction
+          dependencies: ['job-a']
+    """))
+    tmpdir.join('jobs.d', 'a.yaml').write(dedent("""\
+    jobs:
+        - id: job-a
+          function: mymodule:myfunction
+          dependencies: ['job-main']
+    """))
+    tmpdir.join('jobs.d', 'empty.yaml').write('')
+    tmpdir.join('config.yaml').write(dedent("""\
+    include: ['jobs.d/*.yaml']
+    jobs:
+        - id: job-main
+          function: mymodule:myfunction
+    """))
+
+    config = JobControlConfig.from_file(str(tmpdir.join('config.yaml')))
+    assert [x['id'] for x in config.jobs] == ['job-main', 'job-a', 'job-b']
+    assert config.get_closure().get_ancestors('job-b') == [
+        'job-main', 'job-a']
+
+    # The snapshot is invalidated when included files change
+    cache_dir = str(tmpdir.join('cache'))
+    config = JobControlConfig.from_file(
+        str(tmpdir.join('config.yaml')), cache_dir=cache_dir)
+    assert len(config.jobs) == 3
+
+    tmpdir.join('jobs.d', 'c.yaml').write(dedent("""\
+    jobs:
+        - id: job-c
+          function: mymodule:myfunction
+    """))
+    config = JobControlConfig.from_file(
+        str(tmpdir.join('config.yaml')), cache_dir=cache_dir)
+    assert len(config.jobs) == 4
+
+    tmpdir.join('jobs.d', 'c.yaml').write(dedent("""\
+    jobs:
+        - id: job-c
+          function: mymodule:myfunction
+          title: Job C
+    """))
+    config = JobControlConfig.from_file(
+        str(tmpdir.join('config.yaml')), cache_dir=cache_dir)
+    assert config.get_job('job-c')['title'] == 'Job C'
+
+    # Only jobs can be defined in included files
+    tmpdir.join('jobs.d', 'd.yaml').write('storage: "memory://"')
+    with pytest.raises(ValueError):
+        JobControlConfig.from_file(str(tmpdir.join('config.yaml')))
+
+
+def test_config_snapshot_cache(tmpdir):
+    config_file = tmpdir.join('config.yaml')
+    cache_dir = tmpdir.join('cache')
+
+    config_file.write(dedent("""\
+    jobs:
+        - id: job-1
+          function: mymodule:myfunction
+          kwargs:
+              foo: !retval job-0
+    """))
+
+    config = JobControlConfig.from_file(
+        str(config_file), cache_dir=str(cache_dir))
+    assert config.get_job('job-1')['kwargs'] == {'foo': Retval('job-0')}
+
+    snapshots = cache_dir.listdir()
+    assert len(snapshots) == 1
+
+    # The snapshot is used when loading again
+    assert JobControlConfig.from_file(
+        str(config_file), cache_dir=str(cache_dir)) == config
+
+    # Make sure the snapshot is actually read
+    snapshot = pickle.loads(snapshots[0].read('rb'))
+    snapshot[5]['jobs'][0]['title'] = u'From snapshot'
+    snapshots[0].write(pickle.dumps(snapshot), 'wb')
+    config = JobControlConfig.from_file(
+        str(config_file), cache_dir=str(cache_dir))
+    assert config.get_job('job-1')['title'] == u'From snapshot'
+
+    # ..and rebuilt as the file changes
+    config_file.write(dedent("""\
+    jobs:
+        - id: job-2
+          function: mymodule:myfunction
+    """))
+    config = JobControlConfig.from_file(
+        str(config_file), cache_dir=str(cache_dir))
+    assert [x['id'] for x in config.jobs] == ['job-2']
+    assert len(cache_dir.listdir()) == 1
+
+    # Invalid snapshots are ignored
+    snapshots[0].write('garbage')
+    assert JobControlConfig.from_file(
+        str(config_file), cache_dir=str(cache_dir)) == config
+
+    # Non-ASCII paths are supported
+    config = JobControlConfig._from_string_cached(
+        'jobs: []', str(cache_dir), u'/path/to/config-\xe8.yaml')
+    assert config.jobs == []
+
+
+def test_config_job_templates():
+    config = JobControlConfig.from_string("""
+    jobs:
+        - id: fetch-{region}
+          function: mymodule:fetch
+          kwargs: {region: !param region}
+          matrix:
+              region: [eu, us]
+
+        - id: report-{region}-{kind}
+          title: Report ({kind}) for {region}
+          function: mymodule:report
+          args: [!param kind]
+          kwargs:
+              data: !retval fetch-{region}
+              options: {verbose: true}
+          dependencies: ['fetch-{region}']
+          matrix:
+              region: [eu, us]
+              kind: [daily, weekly]
+
+        - id: summary
+          function: mymodule:summary
+          dependencies: ['report-eu-daily', 'report-us-daily']
+    """)
+
+    assert [x['id'] for x in config.jobs] == [
+        'fetch-eu', 'fetch-us',
+        'report-eu-daily', 'report-us-daily',  # Sorted by param name
+        'report-eu-weekly', 'report-us-weekly',
+        'summary']
+    assert config.get_job_deps('report-us-weekly') == ['fetch-us']
+    assert config.get_closure().get_ancestors('summary') == [
+        'fetch-eu', 'fetch-us', 'report-eu-daily', 'report-us-daily']
+
+    job = config.get_job('report-us-weekly')
+    assert not job.loaded
+    assert job['title'] == 'Report (weekly) for us'
+    assert job['args'] == ('weekly',)
+    assert job['kwargs'] == {'data': Retval('fetch-us'),
+                             'options': {'verbose': True}}
+    assert job['dependencies'] == ['fetch-us']
+    assert 'matrix' not in job
+    assert config.get_job('fetch-eu')['kwargs'] == {'region': 'eu'}
+
+    # Ids must be unique across expanded jobs
+    with pytest.raises(ValueError):
+        JobControlConfig({'jobs': [{
+            'id': 'job', 'function': 'mymodule:myfunction',
+            'matrix': {'region': ['eu', 'us']}}]})
+
+    with pytest.raises(TypeError):
+        JobControlConfig({'jobs': [{
+            'id': 'job-{region}', 'function': 'mymodule:myfunction',
+            'matrix': {'region': []}}]})
+
+
+def test_config_large_job_template():
+    config = JobControlConfig({'jobs': [{
+        'id': 'job-{a}-{b}',
+        'function': 'mymodule:myfunction',
+        'kwargs': {'a': Param('a'), 'b': Param('b')},
+        'matrix': {'a': range(100), 'b': range(100)},
+    }]})
+
+    assert len(config.jobs) == 10000
+    assert not any(x.loaded for x in config.jobs)
+    assert config.get_job('job-42-7')['kwargs'] == {'a': 42, 'b': 7}
+
+
+def test_config_large_job_template_shared_dependency():
+    def load(size):
+        start = time.time()
+        config = JobControlConfig({'jobs': [
+            {'id': 'base', 'function': 'mymodule:myfunction'},
+            {'id': 'job-{n}',
+             'function': 'mymodule:myfunction',
+             'dependencies': ['base', 'base'],
+             'matrix': {'n': range(size)}},
+        ]})
+        return time.time() - start, config
+
+    small = min(load(1000)[0] for _ in xrange(3))
+    duration, config = load(10000)
+
+    assert len(config.get_job_revdeps('base')) == 10000
+    assert config.get_job_deps('job-42') == ['base', 'base']
+    assert config.get_closure().get_descendants('base')[:2] == [
+        'job-0', 'job-1']
+
+    # Expanding and indexing take linear time (10x, with some margin)
+    assert duration < small * 20
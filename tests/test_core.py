@@ -420,6 +420,120 @@ def test_job_status_reporting(storage):
     assert job_3.get_status() == 'outdated'
 
 
+def test_jobs_status_computation(storage):
+    config = JobControlConfig.from_string("""
+    jobs:
+        - id: job-1
+          function: jobcontrol.utils.testing:testing_job
+        - id: job-2
+          function: jobcontrol.utils.testing:testing_job
+          dependencies: ['job-1']
+        - id: job-3
+          function: jobcontrol.utils.testing:testing_job
+          dependencies: ['job-2']
+        - id: job-4
+          function: jobcontrol.utils.testing:testing_job
+    """)
+    jc = JobControl(storage=storage, config=config)
+
+    statuses = jc.get_jobs_status()
+    assert sorted(statuses) == ['job-1', 'job-2', 'job-3', 'job-4']
+    assert all(x.status == 'not_built' for x in statuses.itervalues())
+    assert statuses['job-1'].buildable is True
+    assert statuses['job-2'].buildable is False
+
+    for job_id in ('job-1', 'job-2', 'job-3'):
+        jc.build_job(job_id)
+
+    statuses = jc.get_jobs_status()
+    assert statuses['job-3'].status == 'success'
+    assert statuses['job-3'].outdated is False
+    assert statuses['job-3'].buildable is True
+    assert statuses['job-3'].latest_successful_build['success'] is True
+    assert statuses['job-4'].latest_build is None
+
+    # Outdated status propagates to indirect dependencies
+    jc.build_job('job-1')
+
+    statuses = jc.get_jobs_status(['job-3'])
+    assert sorted(statuses) == ['job-1', 'job-2', 'job-3']
+    assert statuses['job-1'].status == 'success'
+    assert statuses['job-2'].status == 'outdated'
+    assert statuses['job-3'].status == 'outdated'
+
+    job_3 = jc.get_job('job-3')
+    assert job_3.is_outdated() is False  # Direct dependencies only
+    assert job_3.get_status() == 'outdated'
+
+    # Failed builds do not change the latest successful one
+    build_id = jc.storage.create_build('job-2')
+    jc.storage.start_build(build_id)
+    jc.storage.finish_build(build_id, success=False)
+
+    status = jc.get_jobs_status(['job-2'])['job-2']
+    assert status.latest_build.id == build_id
+    assert status.latest_successful_build.id != build_id
+    assert status.status == 'outdated'
+
+
+def test_job_dependency_closure(storage):
+    config = JobControlConfig.from_string("""
+    jobs:
+        - id: job-1
+          function: jobcontrol.utils.testing:testing_job
+        - id: job-2
+          function: jobcontrol.utils.testing:testing_job
+          dependencies: ['job-1']
+        - id: job-3
+          function: jobcontrol.utils.testing:testing_job
+          dependencies: ['job-2']
+        - id: job-4
+          function: jobcontrol.utils.testing:testing_job
+          dependencies: ['job-1']
+    """)
+    jc = JobControl(storage=storage, config=config)
+
+    closure = jc.get_depgraph_closure()
+    assert closure.is_ancestor('job-1', 'job-3')
+    assert not closure.is_ancestor('job-4', 'job-3')
+
+    assert jc.get_job_ancestors('job-3') == ['job-1', 'job-2']
+    assert sorted(jc.get_job_descendants('job-1')) == [
+        'job-2', 'job-3', 'job-4']
+    assert jc.get_affected_jobs(['job-2']) == ['job-2', 'job-3']
+
+    assert jc._create_job_depgraph('job-3') == {
+        'job-1': [], 'job-2': ['job-1'], 'job-3': ['job-2']}
+    assert jc._create_job_revdepgraph('job-2') == {
+        'job-2': ['job-3'], 'job-3': []}
+    assert jc._create_job_depgraph('job-3', complete=True) == {
+        'job-1': [], 'job-2': ['job-1'], 'job-3': ['job-2'],
+        'job-4': ['job-1']}
+
+    with pytest.raises(NotFound):
+        jc.get_job_ancestors('no-such-job')
+
+    with pytest.raises(NotFound):
+        jc.get_affected_jobs(['job-1', 'no-such-job'])
+
+
+def test_job_dependency_graph_deep_chain(storage):
+    # Would exceed the recursion limit, if walked recursively
+    config = JobControlConfig({'jobs': [
+        {'id': 'job-{0}'.format(i),
+         'function': 'jobcontrol.utils.testing:testing_job',
+         'dependencies': ['job-{0}'.format(i - 1)] if i else []}
+        for i in xrange(3000)]})
+    jc = JobControl(storage=storage, config=config)
+
+    depgraph = jc._create_job_depgraph('job-1500', complete=True)
+    assert len(depgraph) == 3000
+    assert depgraph['job-0'] == []
+    assert depgraph['job-2999'] == ['job-2998']
+
+    assert len(jc._create_job_depgraph('job-1500')) == 1501
+
+
 def test_simple_build_deletion(storage):
     config = JobControlConfig.from_string("""
     jobs:
@@ -476,3 +590,48 @@ def test_build_deletion_with_cleanup(storage):
 
     assert len(list(job.iter_builds())) == 0
     assert not os.path.isfile(build.retval)
+
+
+def test_function_cache_and_prewarm(storage, monkeypatch):
+    import jobcontrol.core
+
+    config = JobControlConfig.from_string("""
+    jobs:
+        - id: job-1
+          function: jobcontrol.utils.testing:testing_job
+          cleanup_function: jobcontrol.utils.testing:job_simple_echo
+
+        - id: job-2
+          function: jobcontrol.utils.testing:testing_job
+
+        - id: job-3
+          function: no_such_module:some_function
+    """)
+    jc = JobControl(storage=storage, config=config)
+
+    imported = []
+    _import_object = jobcontrol.core.import_object
+
+    def import_object(name):
+        imported.append(name)
+        return _import_object(name)
+
+    monkeypatch.setattr(jobcontrol.core, 'import_object', import_object)
+
+    errors = jc.prewarm()
+    assert list(errors) == ['no_such_module:some_function']
+    assert isinstance(errors['no_such_module:some_function'], ImportError)
+    assert sorted(imported) == [
+        'jobcontrol.utils.testing:job_simple_echo',
+        'jobcontrol.utils.testing:testing_job',
+        'no_such_module:some_function']
+
+    # Functions are now resolved from the cache
+    del imported[:]
+    jc.build_job('job-1')
+    jc.get_job('job-2').get_docs()
+    assert imported == []
+
+    jc.clear_function_cache()
+    jc.build_job('job-2')
+    assert imported == ['jobcontrol.utils.testing:testing_job']
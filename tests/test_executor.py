@@ -0,0 +1,219 @@
+"""
+Tests for the parallel dependency graph executor
+"""
+
+from textwrap import dedent
+
+import pytest
+
+from jobcontrol.core import JobControl
+from jobcontrol.config import JobControlConfig
+from jobcontrol.executor import DepGraphExecutor
+from jobcontrol.ext.memory import MemoryStorage
+
+
+DIAMOND_CONFIG = dedent("""\
+jobs:
+    - id: job-1
+      function: jobcontrol.utils.testing:testing_job
+      kwargs:
+          retval: "retval-1"
+
+    - id: job-2
+      function: jobcontrol.utils.testing:job_simple_echo
+      args:
+          - !retval 'job-1'
+      dependencies: ['job-1']
+
+    - id: job-3
+      function: jobcontrol.utils.testing:job_simple_echo
+      args:
+          - !retval 'job-1'
+      dependencies: ['job-1']
+
+    - id: job-4
+      function: jobcontrol.utils.testing:job_simple_echo
+      args:
+          - !retval 'job-2'
+          - !retval 'job-3'
+      dependencies: ['job-2', 'job-3']
+""")
+
+
+def test_executor_plan(storage):
+    config = JobControlConfig.from_string(DIAMOND_CONFIG)
+    jc = JobControl(storage=storage, config=config)
+    executor = DepGraphExecutor(jc)
+
+    plan = executor.plan('job-4')
+    assert list(plan)[0] == 'job-1'
+    assert list(plan)[-1] == 'job-4'
+    assert sorted(plan) == ['job-1', 'job-2', 'job-3', 'job-4']
+    assert plan['job-4'] == ['job-2', 'job-3']
+
+    plan = executor.plan('job-1', build_deps=False, build_revdeps=True)
+    assert list(plan)[0] == 'job-1'
+    assert list(plan)[-1] == 'job-4'
+    assert plan['job-1'] == []
+
+    plan = executor.plan('job-2', build_deps=False, build_revdeps=True)
+    assert list(plan) == ['job-2', 'job-4']
+    assert plan['job-4'] == ['job-2']
+
+    with pytest.raises(ValueError):
+        DepGraphExecutor(jc, pool='something')
+
+
+def test_build_job_graph(storage):
+    config = JobControlConfig.from_string(DIAMOND_CONFIG)
+    jc = JobControl(storage=storage, config=config)
+
+    builds = jc.build_job_graph('job-4', workers=2)
+
+    assert list(builds) == list(DepGraphExecutor(jc).plan('job-4'))
+    for build in builds.itervalues():
+        assert build['finished'] and build['success']
+
+    # Downstream builds are pinned to the upstream builds just run
+    assert builds['job-2'].config['pinned_builds'] == {
+        'job-1': builds['job-1'].id}
+    assert builds['job-4'].config['pinned_builds'] == {
+        'job-2': builds['job-2'].id,
+        'job-3': builds['job-3'].id}
+
+    assert builds['job-4'].retval == (
+        ((('retval-1',), {}), (('retval-1',), {})), {})
+
+
+def test_build_job_graph_with_failure(storage):
+    config = JobControlConfig.from_string(dedent("""\
+    jobs:
+        - id: job-1
+          function: jobcontrol.utils.testing:testing_job
+
+        - id: job-2
+          function: jobcontrol.utils.testing:testing_job
+          kwargs:
+              fail: True
+          dependencies: ['job-1']
+
+        - id: job-3
+          function: jobcontrol.utils.testing:testing_job
+          dependencies: ['job-2']
+    """))
+    jc = JobControl(storage=storage, config=config)
+
+    builds = jc.build_job_graph('job-1', build_deps=False,
+                                build_revdeps=True)
+
+    assert list(builds) == ['job-1', 'job-2', 'job-3']
+    assert builds['job-1']['success']
+    assert not builds['job-2']['success']
+    assert builds['job-3'] is None
+
+
+def test_build_job_graph_with_system_exit(storage):
+    config = JobControlConfig.from_string(dedent("""\
+    jobs:
+        - id: job-1
+          function: jobcontrol.utils.testing:job_exiting
+
+        - id: job-2
+          function: jobcontrol.utils.testing:testing_job
+          dependencies: ['job-1']
+    """))
+    jc = JobControl(storage=storage, config=config)
+
+    builds = jc.build_job_graph('job-2', workers=2)
+
+    assert not builds['job-1']['success']
+    assert builds['job-2'] is None
+
+
+def test_build_job_graph_with_worker_errors():
+    # The in-memory storage is not shared with worker processes, so
+    # builds cannot even be found there.
+    config = JobControlConfig.from_string(dedent("""\
+    jobs:
+        - id: job-1
+          function: jobcontrol.utils.testing:testing_job
+
+        - id: job-2
+          function: jobcontrol.utils.testing:testing_job
+          dependencies: ['job-1']
+    """))
+    jc = JobControl(storage=MemoryStorage(), config=config)
+
+    builds = jc.build_job_graph('job-2', workers=2, pool='process')
+
+    assert not builds['job-1']['finished']
+    assert builds['job-2'] is None
+
+
+def test_build_job_graph_process_pool_with_limits(storage):
+    from jobcontrol.exceptions import BuildLimitExceeded
+
+    if isinstance(storage, MemoryStorage):
+        pytest.skip('The process pool requires a shared storage')
+
+    config = JobControlConfig.from_string(dedent("""\
+    jobs:
+        - id: job-1
+          function: jobcontrol.utils.testing:job_sleeping
+          kwargs:
+              seconds: 0
+          timeout: 10
+          max_cpu_seconds: 10
+          max_memory: 1073741824
+
+        - id: job-2
+          function: jobcontrol.utils.testing:job_simple_echo
+          args:
+              - !retval 'job-1'
+          isolated: true
+          dependencies: ['job-1']
+
+        - id: job-3
+          function: jobcontrol.utils.testing:job_sleeping
+          kwargs:
+              seconds: 30
+          timeout: 0.5
+          dependencies: ['job-2']
+    """))
+    jc = JobControl(storage=storage, config=config)
+
+    builds = jc.build_job_graph('job-3', workers=2, pool='process')
+
+    assert builds['job-1']['success']
+    assert builds['job-2']['success']
+    assert builds['job-2'].retval == ((0,), {})
+    assert builds['job-3']['finished'] and not builds['job-3']['success']
+    assert isinstance(builds['job-3']['exception'], BuildLimitExceeded)
+
+
+def test_build_job_graph_gevent(storage):
+    pytest.importorskip('gevent')
+
+    config = JobControlConfig.from_string(dedent("""\
+    jobs:
+        - id: job-1
+          function: jobcontrol.utils.testing:job_switching_greenlets
+        - id: job-2
+          function: jobcontrol.utils.testing:job_switching_greenlets
+        - id: job-3
+          function: jobcontrol.utils.testing:job_switching_greenlets
+        - id: job-4
+          function: jobcontrol.utils.testing:job_simple_echo
+          dependencies: ['job-1', 'job-2', 'job-3']
+    """))
+    jc = JobControl(storage=storage, config=config)
+
+    builds = jc.build_job_graph('job-4', workers=3, pool='gevent')
+
+    assert sorted(builds) == ['job-1', 'job-2', 'job-3', 'job-4']
+    for job_id in ('job-1', 'job-2', 'job-3'):
+        build = builds[job_id]
+        assert build['finished'] and build['success']
+        # The execution context is kept across greenlet switches
+        assert build.retval == (build.id, build.id)
+    assert builds['job-4']['success']
@@ -0,0 +1,170 @@
+"""
+Tests for buffered storage of build log messages
+"""
+
+from textwrap import dedent
+import logging
+import threading
+import time
+
+from jobcontrol.core import JobControl
+from jobcontrol.config import JobControlConfig
+from jobcontrol.ext.memory import MemoryStorage
+from jobcontrol.logbuffer import BufferedLogWriter
+
+
+class RecordingStorage(MemoryStorage):
+    def __init__(self):
+        super(RecordingStorage, self).__init__()
+        self.batches = []
+        self.threads = set()
+
+    def log_messages(self, build_id, records):
+        self.batches.append(len(records))
+        self.threads.add(threading.current_thread().name)
+        super(RecordingStorage, self).log_messages(build_id, records)
+
+
+def _make_record(msg):
+    return logging.LogRecord('test', logging.INFO, __file__, 1, msg,
+                             (), None)
+
+
+def test_buffered_log_writer():
+    storage = RecordingStorage()
+    build_id = storage.create_build('job-1')
+
+    writer = BufferedLogWriter(storage, build_id, size=10, interval=60)
+    for i in xrange(25):
+        writer.write(_make_record('Message {0}'.format(i)))
+
+    # Records are written by the background thread, until less
+    # than a full batch is left
+    for _ in xrange(100):
+        if sum(storage.batches) > 15:
+            break
+        time.sleep(.01)
+    assert sum(storage.batches) > 15
+    assert storage.threads == set(['jobcontrol-log-writer-{0}'
+                                   .format(build_id)])
+
+    # Remaining records are written on close
+    writer.close()
+    messages = [x.message for x in storage.iter_log_messages(build_id)]
+    assert messages == ['Message {0}'.format(i) for i in xrange(25)]
+    assert len(storage.batches) < 25
+
+
+def test_buffered_log_writer_interval():
+    storage = RecordingStorage()
+    build_id = storage.create_build('job-1')
+
+    writer = BufferedLogWriter(storage, build_id, size=1000, interval=.05)
+    writer.write(_make_record('A message'))
+
+    for _ in xrange(100):
+        if storage.batches:
+            break
+        time.sleep(.01)
+    assert storage.batches == [1]
+
+    writer.close()
+    assert storage.batches == [1]
+
+
+class CopiedStorage(RecordingStorage):
+    def __init__(self):
+        super(CopiedStorage, self).__init__()
+        self.copies = []
+        self.closed = False
+
+    def __deepcopy__(self, memo):
+        # Shares the data, like copies of a database storage would
+        other = CopiedStorage.__new__(CopiedStorage)
+        other.__dict__.update(self.__dict__)
+        other.copies = []
+        other.closed = False
+        self.copies.append(other)
+        return other
+
+    def close(self):
+        self.closed = True
+
+
+def test_buffered_log_writer_closes_storage_copy():
+    storage = CopiedStorage()
+    build_id = storage.create_build('job-1')
+
+    writer = BufferedLogWriter(storage, build_id, size=10, interval=60)
+    writer.write(_make_record('Message 1'))
+    assert len(storage.copies) == 1
+    copied = storage.copies[0]
+    assert writer.storage is copied
+    assert not copied.closed
+
+    writer.close()
+    assert copied.closed
+    assert not storage.closed
+
+    # Late records use the original storage
+    writer.write(_make_record('Message 2'))
+    messages = [x.message for x in storage.iter_log_messages(build_id)]
+    assert messages == ['Message 1', 'Message 2']
+    assert storage.batches == [1, 1]
+
+
+def test_buffered_log_writer_shared_storage():
+    storage = CopiedStorage()
+    storage.__deepcopy__ = lambda memo: storage
+    build_id = storage.create_build('job-1')
+
+    writer = BufferedLogWriter(storage, build_id, size=10, interval=60)
+    writer.close()
+    assert not storage.closed
+
+
+def test_build_with_buffered_logs(storage):
+    config = JobControlConfig.from_string(dedent("""\
+    jobs:
+        - id: job-1
+          function: jobcontrol.utils.testing:testing_job
+          log_buffer_size: 100
+          log_flush_interval: 60
+          kwargs:
+              log_messages:
+                  - [20, 'Message 1']
+                  - [30, 'Message 2']
+                  - [40, 'Message 3']
+    """))
+    jc = JobControl(storage=storage, config=config)
+
+    build = jc.create_build('job-1')
+    build.run()
+    assert build['finished'] and build['success']
+
+    # All the messages were stored before the build finished
+    messages = [msg.message for msg in build.iter_log_messages()
+                if msg.name == 'jobcontrol.utils.testing_job']
+    assert messages == ['Message 1', 'Message 2', 'Message 3']
+
+
+def test_isolated_build_with_buffered_logs(storage):
+    config = JobControlConfig.from_string(dedent("""\
+    jobs:
+        - id: job-1
+          function: jobcontrol.utils.testing:testing_job
+          isolated: true
+          log_buffer_size: 100
+          kwargs:
+              log_messages:
+                  - [20, 'A message from the child']
+    """))
+    jc = JobControl(storage=storage, config=config)
+
+    build = jc.create_build('job-1')
+    build.run()
+    assert build['finished'] and build['success']
+
+    messages = [msg.message for msg in build.iter_log_messages()
+                if msg.name == 'jobcontrol.utils.testing_job']
+    assert messages == ['A message from the child']
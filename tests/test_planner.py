@@ -0,0 +1,134 @@
+"""
+Tests for the critical path planner
+"""
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from textwrap import dedent
+import json
+
+from jobcontrol.core import JobControl
+from jobcontrol.config import JobControlConfig
+from jobcontrol.planner import CriticalPathPlanner
+
+
+class FakeStorage(object):
+    def __init__(self, durations):
+        self.durations = durations
+
+    def get_job_builds(self, job_id, **kw):
+        start = datetime(2015, 1, 1)
+        for seconds in self.durations.get(job_id, [])[:kw['limit']]:
+            yield {'id': 0, 'job_id': job_id, 'start_time': start,
+                   'end_time': start + timedelta(seconds=seconds)}
+
+
+class FakeApp(object):
+    def __init__(self, durations):
+        self.storage = FakeStorage(durations)
+
+
+#     a (10)   b (1)
+#      |   \   /
+#      |    c (5)
+#      |    |
+#    d (1)  e (20)
+#       \  /
+#      f (2)
+PLAN = OrderedDict([
+    ('a', []),
+    ('b', []),
+    ('c', ['a', 'b']),
+    ('d', ['a']),
+    ('e', ['c']),
+    ('f', ['d', 'e']),
+])
+
+
+def test_planner_durations():
+    planner = CriticalPathPlanner(FakeApp({
+        'a': [10, 12, 8],
+        'b': [1, 2, 3, 4],
+        'c': [5, 1000],
+    }), history=3, default_duration=30)
+
+    assert planner.get_duration('a') == 10
+    assert planner.get_duration('b') == 2  # Only the latest 3 are used
+    assert planner.get_duration('c') == 502.5
+    assert planner.get_duration('d') == 30
+
+
+def test_planner_critical_path():
+    planner = CriticalPathPlanner(FakeApp({
+        'a': [10], 'b': [1], 'c': [5], 'd': [1], 'e': [20], 'f': [2]}))
+
+    assert planner.get_ranks(PLAN) == {
+        'a': 37, 'b': 28, 'c': 27, 'd': 3, 'e': 22, 'f': 2}
+    assert planner.get_critical_path(PLAN) == ['a', 'c', 'e', 'f']
+
+    assert planner.estimate(PLAN, workers=4) == 37
+    assert planner.estimate(PLAN, workers=1) == 39
+    assert planner.estimate(OrderedDict()) == 0
+    assert planner.get_critical_path(OrderedDict()) == []
+
+
+def test_executor_runs_critical_path_first(storage, monkeypatch):
+    config = JobControlConfig.from_string(dedent("""\
+    jobs:
+        - id: short
+          function: jobcontrol.utils.testing:testing_job
+        - id: long-1
+          function: jobcontrol.utils.testing:testing_job
+        - id: long-2
+          function: jobcontrol.utils.testing:testing_job
+          dependencies: ['long-1']
+        - id: final
+          function: jobcontrol.utils.testing:testing_job
+          dependencies: ['short', 'long-2']
+    """))
+    jc = JobControl(storage=storage, config=config)
+
+    durations = {'short': 5, 'long-1': 10, 'long-2': 10, 'final': 1}
+    monkeypatch.setattr(CriticalPathPlanner, 'get_duration',
+                        lambda self, job_id: durations[job_id])
+
+    estimate = jc.estimate_job_graph('final', workers=1)
+    assert estimate['duration'] == 26
+    assert estimate['critical_path'] == ['long-1', 'long-2', 'final']
+    assert estimate['estimated_end'] > datetime.now()
+
+    builds = jc.build_job_graph('final', workers=1)
+    assert all(x['success'] for x in builds.itervalues())
+
+    # Builds were created (and run) by descending rank
+    run_order = sorted(builds, key=lambda x: builds[x].id)
+    assert run_order == ['long-1', 'long-2', 'short', 'final']
+
+
+def test_job_estimate_api(storage):
+    from jobcontrol.web.app import app
+
+    config = JobControlConfig.from_string(dedent("""\
+    jobs:
+        - id: job-1
+          function: jobcontrol.utils.testing:testing_job
+        - id: loop-1
+          function: jobcontrol.utils.testing:testing_job
+          dependencies: ['loop-2']
+        - id: loop-2
+          function: jobcontrol.utils.testing:testing_job
+          dependencies: ['loop-1']
+    """))
+    app.config['JOBCONTROL'] = JobControl(storage=storage, config=config)
+    client = app.test_client()
+
+    resp = client.get('/api/1/job/job-1/estimate?workers=2')
+    assert resp.status_code == 200
+    assert json.loads(resp.data)['critical_path'] == ['job-1']
+
+    for workers in ('0', '-1', 'many'):
+        resp = client.get('/api/1/job/job-1/estimate?workers=' + workers)
+        assert resp.status_code == 400
+
+    resp = client.get('/api/1/job/loop-1/estimate')
+    assert resp.status_code == 409
@@ -0,0 +1,104 @@
+"""
+Tests for the live configuration reload
+"""
+
+import time
+from textwrap import dedent
+
+from jobcontrol.core import JobControl
+from jobcontrol.reload import ConfigReloader
+
+
+CONFIG = dedent("""\
+jobs:
+    - id: job-1
+      function: jobcontrol.utils.testing:testing_job
+    - id: job-2
+      function: jobcontrol.utils.testing:testing_job
+      dependencies: ['job-1']
+""")
+
+
+def _write(config_file, text):
+    config_file.write(text)
+    # Make sure the change is detected, even on coarse mtimes
+    config_file.setmtime(config_file.mtime() + 1)
+
+
+def test_config_reload(storage, tmpdir):
+    config_file = tmpdir.join('config.yaml')
+    config_file.write(CONFIG)
+
+    jc = JobControl.from_config_file(str(config_file))
+    jc.storage = storage
+    jc._get_runner_function('jobcontrol.utils.testing:testing_job')
+
+    reloader = ConfigReloader(jc, str(config_file), interval=None)
+    assert reloader.check() is None  # Not changed
+
+    _write(config_file, CONFIG.replace('job-1', 'job-0') + (
+        "    - id: job-3\n"
+        "      function: jobcontrol.utils.testing:testing_job\n"
+        "      dependencies: ['job-2']\n"))
+
+    assert reloader.check() == {
+        'added': ['job-0', 'job-3'],
+        'removed': ['job-1'],
+        'changed': ['job-2'],
+    }
+    assert jc.get_job('job-3').config['dependencies'] == ['job-2']
+    assert jc.get_job_ancestors('job-3') == ['job-0', 'job-2']
+    assert jc._function_cache == {}
+
+    assert reloader.check() is None
+
+    # Invalid configuration is not loaded
+    old_config = jc.config
+    _write(config_file, CONFIG + (
+        "    - id: job-1\n"
+        "      function: jobcontrol.utils.testing:testing_job\n"))
+    assert reloader.check() is None
+    assert jc.config is old_config
+
+
+def test_config_reload_thread(tmpdir):
+    config_file = tmpdir.join('config.yaml')
+    config_file.write(CONFIG)
+
+    jc = JobControl.from_config_file(str(config_file))
+    reloader = ConfigReloader(jc, str(config_file), interval=None)
+    reloader.start()
+
+    try:
+        old_config = jc.config
+        reloader.request_reload()
+
+        for _ in xrange(100):
+            if jc.config is not old_config:
+                break
+            time.sleep(.05)
+
+        assert jc.config is not old_config
+        assert jc.config == old_config
+
+    finally:
+        reloader.stop()
+
+
+def test_config_reload_included_files(tmpdir):
+    config_file = tmpdir.join('config.yaml')
+    config_file.write(CONFIG + "include: ['jobs.d/*.yaml']\n")
+    tmpdir.join('jobs.d').mkdir()
+
+    jc = JobControl.from_config_file(str(config_file))
+    reloader = ConfigReloader(jc, str(config_file), interval=None)
+    assert reloader.check() is None
+
+    tmpdir.join('jobs.d', 'more.yaml').write(dedent("""\
+    jobs:
+        - id: job-3
+          function: jobcontrol.utils.testing:testing_job
+    """))
+    assert reloader.check() == {
+        'added': ['job-3'], 'removed': [], 'changed': []}
+    assert reloader.check() is None
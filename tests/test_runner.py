@@ -0,0 +1,203 @@
+"""
+Tests for builds run in an isolated child process
+"""
+
+from textwrap import dedent
+import logging
+import signal
+import time
+
+from jobcontrol.core import JobControl
+from jobcontrol.config import JobControlConfig
+from jobcontrol.exceptions import (
+    BuildProcessError, BuildLimitExceeded, SerializationError)
+
+
+def test_isolated_build_run(storage):
+    config = JobControlConfig.from_string(dedent("""\
+    jobs:
+        - id: job-1
+          function: jobcontrol.utils.testing:testing_job
+          isolated: true
+          kwargs:
+              retval: "Foo Retval"
+              progress_steps: [[null, 5]]
+              log_messages:
+                  - [20, 'A message from the child']
+    """))
+    jc = JobControl(storage=storage, config=config)
+
+    build = jc.create_build('job-1')
+    build.run()
+
+    assert build['started']
+    assert build['finished']
+    assert build['success']
+    assert build['retval'] == 'Foo Retval'
+
+    progress = build.get_progress_info()
+    assert progress.current == 5
+    assert progress.total == 5
+
+    messages = [msg for msg in build.iter_log_messages()
+                if msg.name == 'jobcontrol.utils.testing_job']
+    assert len(messages) == 1
+    assert messages[0].level == logging.INFO
+    assert messages[0].message == 'A message from the child'
+
+
+def test_isolated_build_failures(storage):
+    config = JobControlConfig.from_string(dedent("""\
+    jobs:
+        - id: job-fail
+          function: jobcontrol.utils.testing:testing_job
+          kwargs:
+              fail: true
+
+        - id: job-nso
+          function: jobcontrol.utils.testing:job_returning_nonserializable
+
+        - id: job-crash
+          function: jobcontrol.utils.testing:job_crashing_hard
+          kwargs:
+              exitcode: 3
+    """))
+    jc = JobControl(storage=storage, config=config)
+
+    build = jc.create_build('job-fail')
+    jc.run_build(build, isolated=True)
+    build.refresh()
+    assert build['finished'] and not build['success']
+    assert isinstance(build['exception'], RuntimeError)
+
+    build = jc.create_build('job-nso')
+    jc.run_build(build, isolated=True)
+    build.refresh()
+    assert build['finished'] and not build['success']
+    assert isinstance(build['exception'], SerializationError)
+
+    build = jc.create_build('job-crash')
+    jc.run_build(build, isolated=True)
+    build.refresh()
+    assert build['started']
+    assert build['finished'] and not build['success']
+    assert isinstance(build['exception'], BuildProcessError)
+    assert build['exception'].exitcode == 3
+
+
+def test_isolated_build_returning_generator(storage):
+    config = JobControlConfig.from_string(dedent("""\
+    jobs:
+        - id: job-1
+          function: jobcontrol.utils.testing:job_yielding_items
+          isolated: true
+          retval_chunk_size: 2
+          kwargs:
+              count: 5
+
+        - id: job-2
+          function: jobcontrol.utils.testing:job_yielding_items
+          isolated: true
+          retval_chunk_size: 2
+          kwargs:
+              count: 10
+              fail_at: 5
+    """))
+    jc = JobControl(storage=storage, config=config)
+
+    build = jc.create_build('job-1')
+    build.run()
+    assert build['finished'] and build['success']
+    assert list(build.retval) == range(5)
+
+    # Chunks written before the failure are deleted by the parent
+    build = jc.create_build('job-2')
+    build.run()
+    assert build['finished'] and not build['success']
+    assert list(storage.iter_retval_chunks(build.id)) == []
+
+
+def test_build_resource_limits(storage, monkeypatch):
+    import jobcontrol.runner
+    monkeypatch.setattr(jobcontrol.runner, 'KILL_GRACE_PERIOD', 1)
+
+    config = JobControlConfig.from_string(dedent("""\
+    jobs:
+        - id: job-timeout
+          function: jobcontrol.utils.testing:job_sleeping
+          kwargs:
+              seconds: 30
+          timeout: 0.5
+
+        - id: job-cpu
+          function: jobcontrol.utils.testing:job_burning_cpu
+          kwargs:
+              seconds: 30
+          max_cpu_seconds: 1
+
+        - id: job-memory
+          function: jobcontrol.utils.testing:job_allocating_memory
+          kwargs:
+              size: 2147483648
+          max_memory: 1073741824
+
+        - id: job-within-limits
+          function: jobcontrol.utils.testing:job_sleeping
+          kwargs:
+              seconds: 0
+          timeout: 10
+          max_cpu_seconds: 10
+          max_memory: 1073741824
+    """))
+    jc = JobControl(storage=storage, config=config)
+
+    build = jc.create_build('job-timeout')
+    start = time.time()
+    build.run()
+    assert time.time() - start < 5
+    assert build['finished'] and not build['success']
+    assert isinstance(build['exception'], BuildLimitExceeded)
+    assert 'timed out' in str(build['exception'])
+    assert build['exception_tb'] is not None
+
+    build = jc.create_build('job-cpu')
+    build.run()
+    assert build['finished'] and not build['success']
+    assert isinstance(build['exception'], BuildLimitExceeded)
+    assert 'CPU time' in str(build['exception'])
+
+    build = jc.create_build('job-memory')
+    build.run()
+    assert build['finished'] and not build['success']
+    assert isinstance(build['exception'], MemoryError)
+
+    build = jc.create_build('job-within-limits')
+    build.run()
+    assert build['success']
+    assert build['retval'] == 0
+
+
+def test_build_killed_after_timeout(storage, monkeypatch):
+    import jobcontrol.runner
+    monkeypatch.setattr(jobcontrol.runner, 'KILL_GRACE_PERIOD', 0.5)
+
+    config = JobControlConfig.from_string(dedent("""\
+    jobs:
+        - id: job-1
+          function: jobcontrol.utils.testing:job_sleeping
+          kwargs:
+              seconds: 30
+          timeout: 0.5
+    """))
+    jc = JobControl(storage=storage, config=config)
+
+    # Simulate a process ignoring SIGTERM
+    monkeypatch.setattr(jobcontrol.runner, '_apply_limits',
+                        lambda limits: signal.signal(signal.SIGTERM,
+                                                     signal.SIG_IGN))
+
+    build = jc.create_build('job-1')
+    build.run()
+    assert build['finished'] and not build['success']
+    assert isinstance(build['exception'], BuildLimitExceeded)
+    assert build['exception'].exitcode == -signal.SIGKILL
@@ -221,6 +221,69 @@ def test_build_iteration(storage):
     assert _get_builds(order='desc', limit=2) == list(reversed(builds))[:2]
 
 
+def test_build_fields_projection(storage):
+    job_id = 'job-test-build-projection'
+
+    build_id = storage.create_build(job_id, {'function': 'mymod:myfunc'})
+    storage.start_build(build_id)
+    storage.finish_build(build_id, retval='A' * 1000)
+
+    build = storage.get_build(build_id, fields=['success', 'retval'])
+    assert build == {'id': build_id, 'job_id': job_id, 'success': True,
+                     'retval': 'A' * 1000}
+
+    builds = list(storage.get_job_builds(job_id, fields=['end_time']))
+    assert len(builds) == 1
+    assert sorted(builds[0]) == ['end_time', 'id', 'job_id']
+    assert isinstance(builds[0]['end_time'], datetime)
+
+    build = storage.get_latest_successful_build(job_id, fields=['config'])
+    assert build['config'] == {'function': 'mymod:myfunc'}
+    assert 'retval' not in build
+
+    # Without fields, everything is returned
+    assert storage.get_build(build_id)['retval'] == 'A' * 1000
+
+    with pytest.raises(ValueError):
+        storage.get_build(build_id, fields=['retval', 'no_such_field'])
+
+    with pytest.raises(ValueError):
+        list(storage.get_job_builds(job_id, fields=['id; DROP TABLE']))
+
+
+def test_get_latest_builds(storage):
+    job_ids = ['job-latest-1', 'job-latest-2', 'job-latest-3']
+
+    def _build(job_id, success):
+        build_id = storage.create_build(job_id)
+        storage.start_build(build_id)
+        storage.finish_build(build_id, success=success)
+        return build_id
+
+    build_1_1 = _build('job-latest-1', True)
+    build_1_2 = _build('job-latest-1', False)
+    build_2_1 = _build('job-latest-2', True)
+    storage.create_build('job-latest-2')  # Not started
+
+    builds = storage.get_latest_builds(job_ids)
+    assert sorted(builds) == ['job-latest-1', 'job-latest-2']
+    assert builds['job-latest-1']['id'] == build_1_2
+    assert builds['job-latest-2']['id'] > build_2_1
+
+    builds = storage.get_latest_builds(
+        job_ids, finished=True, success=True, fields=['end_time'])
+    assert builds == {
+        'job-latest-1': {'id': build_1_1, 'job_id': 'job-latest-1',
+                         'end_time': builds['job-latest-1']['end_time']},
+        'job-latest-2': {'id': build_2_1, 'job_id': 'job-latest-2',
+                         'end_time': builds['job-latest-2']['end_time']},
+    }
+    assert isinstance(builds['job-latest-1']['end_time'], datetime)
+
+    assert storage.get_latest_builds(['job-latest-3']) == {}
+    assert storage.get_latest_builds([]) == {}
+
+
 def test_logrecord_objects():
     import logging
 
@@ -327,3 +390,303 @@ def test_logging_with_context(storage):
     # ------------------------------------------------------------
 
     assert len(list(storage.iter_log_messages(build_id))) == 5
+
+
+def test_build_fingerprint(storage):
+    job_id = 'job-test-build-fingerprint'
+
+    build_ids = [
+        storage.create_build(job_id, {}, fingerprint='aaa'),
+        storage.create_build(job_id, {}, fingerprint='bbb'),
+        storage.create_build(job_id, {}),
+    ]
+    for build_id in build_ids:
+        storage.start_build(build_id)
+        storage.finish_build(build_id)
+
+    assert storage.get_build(build_ids[0])['fingerprint'] == 'aaa'
+    assert storage.get_build(build_ids[2])['fingerprint'] is None
+
+    assert [x['id'] for x in storage.get_job_builds(
+        job_id, fingerprint='bbb')] == [build_ids[1]]
+
+    build = storage.get_latest_successful_build(job_id, fingerprint='aaa')
+    assert build['id'] == build_ids[0]
+    assert storage.get_latest_successful_build(
+        job_id, fingerprint='ccc') is None
+
+
+def test_bulk_build_operations(storage):
+    job_id = 'job-test-bulk-operations'
+
+    assert storage.create_builds([]) == []
+
+    build_ids = storage.create_builds([
+        {'job_id': job_id, 'config': {'function': 'mymod:func1'}},
+        {'job_id': job_id, 'config': {'function': 'mymod:func2'},
+         'fingerprint': 'aaa'},
+        {'job_id': job_id},
+    ])
+    assert len(build_ids) == 3
+
+    builds = [storage.get_build(x) for x in build_ids]
+    assert [x['config'] for x in builds] == [
+        {'function': 'mymod:func1'}, {'function': 'mymod:func2'}, {}]
+    assert builds[1]['fingerprint'] == 'aaa'
+    assert not any(x['started'] for x in builds)
+
+
+def test_postgresql_connection_pool(monkeypatch):
+    from conftest import get_postgres_conf, POSTGRES_ENV_NAME
+    import copy
+    import threading
+
+    try:
+        conf = get_postgres_conf()
+    except RuntimeError:
+        pytest.skip('{0} not configured'.format(POSTGRES_ENV_NAME))
+
+    from jobcontrol.core import JobControl
+    from jobcontrol.ext.postgresql import PostgreSQLStorage
+
+    with pytest.raises(ValueError):
+        PostgreSQLStorage(conf, pool_min=5, pool_max=2)
+
+    storage = PostgreSQLStorage(conf, pool_min='1', pool_max='2')
+    assert copy.deepcopy(storage) is storage
+
+    with monkeypatch.context() as m:
+        m.setattr('os.getpid', lambda: -1)  # As in a forked child
+        storage_copy = copy.deepcopy(storage)
+    assert storage_copy is not storage
+    assert storage_copy._pool_max == 2
+
+    try:
+        storage.uninstall()
+    except Exception:
+        pass
+    storage.install()
+
+    try:
+        errors = []
+
+        def _worker(job_id):
+            try:
+                for _ in xrange(5):
+                    build_id = storage.create_build(job_id=job_id)
+                    storage.start_build(build_id)
+                    storage.finish_build(build_id, success=True)
+            except Exception as e:
+                errors.append(e)
+
+        # More threads than connections: they must wait for a
+        # connection to be available.
+        threads = [
+            threading.Thread(target=_worker, args=('job-{0}'.format(i),))
+            for i in xrange(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert errors == []
+        for i in xrange(6):
+            builds = list(storage.get_job_builds('job-{0}'.format(i)))
+            assert len(builds) == 5
+            assert all(x['success'] for x in builds)
+
+        # Child processes get their own connections
+        jc = JobControl(storage=storage, config={'jobs': [
+            {'id': 'job-isolated',
+             'function': 'jobcontrol.utils.testing:job_simple_echo',
+             'args': ['foo'], 'isolated': True}]})
+        for _ in xrange(3):
+            build = jc.create_build('job-isolated')
+            build.run()
+            assert build['success']
+            assert build.retval == (('foo',), {})
+        assert len(list(storage.get_job_builds('job-isolated'))) == 3
+
+    finally:
+        storage.uninstall()
+        storage.close()
+
+
+def test_postgresql_connection_pool_streaming():
+    from conftest import get_postgres_conf, POSTGRES_ENV_NAME
+    import threading
+    import time
+
+    try:
+        conf = get_postgres_conf()
+    except RuntimeError:
+        pytest.skip('{0} not configured'.format(POSTGRES_ENV_NAME))
+
+    import psycopg2.pool
+    from jobcontrol.ext.postgresql import PostgreSQLStorage
+
+    with pytest.raises(ValueError):
+        PostgreSQLStorage(conf, pool_max=1, pool_timeout=-1)
+
+    storage = PostgreSQLStorage(conf, pool_max=1, itersize=1,
+                                pool_timeout=.2)
+    try:
+        storage.uninstall()
+    except Exception:
+        pass
+    storage.install()
+
+    try:
+        build_ids = [storage.create_build('job-1') for _ in xrange(3)]
+
+        # The connection held while streaming is used meanwhile
+        for build in storage.get_job_builds('job-1', limit=None):
+            storage.report_build_progress(build['id'], 1, 2)
+            assert storage.get_build(build['id'])['id'] == build['id']
+            assert len(storage.get_build_progress_info(build['id'])) == 1
+
+        # ..also by nested iterations, ending in any order
+        outer = storage.get_job_builds('job-1', limit=None)
+        assert next(outer)['id'] == build_ids[0]
+        inner = storage.get_job_builds('job-1', limit=None)
+        assert next(inner)['id'] == build_ids[0]
+        outer.close()
+        storage.delete_build(build_ids[2])
+        # (held cursors see the rows as they were when declared)
+        assert [x['id'] for x in inner] == build_ids[1:]
+        with pytest.raises(NotFound):
+            storage.get_build(build_ids[2])
+
+        # Other threads wait for the connection, with a timeout
+        builds = storage.get_job_builds('job-1', limit=None)
+        next(builds)
+        errors = []
+
+        def _worker():
+            try:
+                storage.get_build(build_ids[0])
+            except psycopg2.pool.PoolError as e:
+                errors.append(e)
+
+        start = time.time()
+        thread = threading.Thread(target=_worker)
+        thread.start()
+        thread.join()
+        assert time.time() - start < 5
+        assert len(errors) == 1
+        assert 'No connection available' in str(errors[0])
+
+        builds.close()
+        thread = threading.Thread(target=_worker)
+        thread.start()
+        thread.join()
+        assert len(errors) == 1
+
+    finally:
+        storage.uninstall()
+        storage.close()
+
+
+def test_postgresql_schema_migrations():
+    from conftest import get_postgres_conf, POSTGRES_ENV_NAME
+
+    try:
+        conf = get_postgres_conf()
+    except RuntimeError:
+        pytest.skip('{0} not configured'.format(POSTGRES_ENV_NAME))
+
+    from jobcontrol.ext.postgresql import (
+        PostgreSQLStorage, MIGRATIONS, SCHEMA_VERSION)
+
+    storage = PostgreSQLStorage(conf, table_prefix='jobcontrol_mig_')
+    storage.uninstall()
+    assert storage.get_schema_version() == 0
+
+    try:
+        # Database created before migrations were introduced
+        storage._apply_migration(MIGRATIONS[0])
+        with storage._cursor() as cur:
+            cur.execute('DROP TABLE "jobcontrol_mig_schema_version";')
+            cur.execute('INSERT INTO "jobcontrol_mig_build" ("job_id") '
+                        "VALUES ('job-1') RETURNING id;")
+            build_id = cur.fetchone()[0]
+        assert storage.get_schema_version() == 1
+
+        applied = storage.upgrade()
+        assert [x.version for x in applied] == range(2, SCHEMA_VERSION + 1)
+        assert storage.get_schema_version() == SCHEMA_VERSION
+        assert storage.get_build(build_id)['job_id'] == 'job-1'
+
+        # Columns and tables added after the first version are there
+        build_id = storage.create_build('job-1', fingerprint='abc')
+        assert storage.get_build(build_id)['fingerprint'] == 'abc'
+        assert [x['id'] for x in storage.get_job_builds(
+            'job-1', fingerprint='abc')] == [build_id]
+        storage.store_retval_chunk(build_id, 0, [1, 2, 3])
+        assert list(storage.iter_retval_chunks(build_id)) == [[1, 2, 3]]
+        storage.delete_retval_chunks(build_id)
+        assert list(storage.iter_retval_chunks(build_id)) == []
+
+        with storage._cursor() as cur:
+            cur.execute("SELECT indexname FROM pg_indexes "
+                        "WHERE tablename = 'jobcontrol_mig_build';")
+            indexes = set(x[0] for x in cur.fetchall())
+        assert 'jobcontrol_mig_build_job_id_fingerprint_idx' in indexes
+        assert 'jobcontrol_mig_build_job_id_successful_idx' in indexes
+
+        assert storage.upgrade() == []
+        with pytest.raises(ValueError):
+            storage.upgrade(version=1)
+
+    finally:
+        storage.uninstall()
+
+
+def test_postgresql_streaming_cursors():
+    from conftest import get_postgres_conf, POSTGRES_ENV_NAME
+    import logging
+
+    try:
+        conf = get_postgres_conf()
+    except RuntimeError:
+        pytest.skip('{0} not configured'.format(POSTGRES_ENV_NAME))
+
+    from jobcontrol.ext.postgresql import PostgreSQLStorage
+
+    with pytest.raises(ValueError):
+        PostgreSQLStorage(conf, itersize=0)
+
+    storage = PostgreSQLStorage(conf, itersize='2')
+    try:
+        storage.uninstall()
+    except Exception:
+        pass
+    storage.install()
+
+    try:
+        build_ids = [storage.create_build('job-1') for _ in xrange(5)]
+        storage.log_messages(build_ids[0], [
+            logging.LogRecord('test', logging.INFO, __file__, 1,
+                              'Message {0}'.format(i), (), None)
+            for i in xrange(5)])
+
+        # Rows are fetched two at a time
+        messages = storage.iter_log_messages(build_id=build_ids[0])
+        assert [x.message for x in messages] == [
+            'Message {0}'.format(i) for i in xrange(5)]
+
+        builds = storage.get_job_builds('job-1', limit=None)
+        assert [x['id'] for x in builds] == build_ids
+
+        # Stop iterating early, while using the storage meanwhile
+        builds = storage.get_job_builds('job-1', order='desc', limit=None)
+        assert next(builds)['id'] == build_ids[-1]
+        storage.delete_build(build_ids[0])
+        assert next(builds)['id'] == build_ids[-2]
+        builds.close()
+
+        assert len(list(storage.get_job_builds('job-1'))) == 4
+
+    finally:
+        storage.uninstall()
+        storage.close()
@@ -0,0 +1,149 @@
+"""
+Tests for the dependency graph resolution functions
+"""
+
+import pytest
+
+from jobcontrol.utils.depgraph import (
+    resolve_deps, find_loops, topological_sort, DepLoop, TransitiveClosure)
+
+
+def test_resolve_deps_diamond():
+    graph = {
+        'a': ['b', 'c'],
+        'b': ['d'],
+        'c': ['d', 'e'],
+        'd': ['e'],
+        'e': [],
+        'f': ['a'],  # Not reachable from 'a'
+    }
+
+    assert resolve_deps(graph, 'a') == ['e', 'd', 'c', 'b', 'a']
+    assert resolve_deps(graph, 'a', with_weights=True) == [
+        (3, 'e'), (2, 'd'), (1, 'c'), (1, 'b'), (0, 'a')]
+    assert resolve_deps(graph, 'e') == ['e']
+
+
+def test_resolve_deps_large_graphs():
+    # Deep chain: would exceed the recursion limit
+    graph = dict((i, [i + 1]) for i in xrange(5000))
+    graph[5000] = []
+    assert resolve_deps(graph, 0) == range(5000, -1, -1)
+
+    # Stacked diamonds: exponential number of paths
+    graph = {}
+    for i in xrange(0, 200, 3):
+        graph[i] = [i + 1, i + 2]
+        graph[i + 1] = [i + 3]
+        graph[i + 2] = [i + 3]
+    graph[201] = []
+
+    weights = dict((v, w) for w, v in resolve_deps(graph, 0, True))
+    assert weights[201] == 134
+    assert weights[1] == weights[2] == 1
+
+
+def test_resolve_deps_reports_all_loops():
+    graph = {
+        'a': ['b', 'x'],
+        'b': ['c'],
+        'c': ['a', 'd'],
+        'd': ['d'],
+        'x': ['y'],
+        'y': ['z'],
+        'z': ['x'],
+    }
+
+    with pytest.raises(DepLoop) as excinfo:
+        resolve_deps(graph, 'a')
+
+    assert excinfo.value.loops == [
+        ['a', 'b', 'c', 'a'],
+        ['d', 'd'],
+        ['x', 'y', 'z', 'x'],
+    ]
+    assert "'x' -> 'y' -> 'z' -> 'x'" in str(excinfo.value)
+
+    # Only loops reachable from the start vertex are reported
+    with pytest.raises(DepLoop) as excinfo:
+        resolve_deps(graph, 'y')
+    assert excinfo.value.loops == [['x', 'y', 'z', 'x']]
+
+    assert find_loops({'a': ['b'], 'b': []}) == []
+
+
+def test_topological_sort():
+    graph = {
+        'a': ['b', 'c'],
+        'b': ['d'],
+        'c': ['d', 'e'],
+        'd': ['e'],
+        'e': [],
+        'f': ['a'],
+        'g': [],
+    }
+
+    assert topological_sort(graph) == ['e', 'g', 'd', 'b', 'c', 'a', 'f']
+    assert topological_sort(graph, ['b', 'g']) == ['e', 'g', 'd', 'b']
+    assert topological_sort({}) == []
+
+    graph['e'] = ['a']
+    with pytest.raises(DepLoop) as excinfo:
+        topological_sort(graph)
+    assert excinfo.value.loops == [['a', 'c', 'e', 'a']]
+
+
+def test_transitive_closure():
+    graph = {
+        'a': ['b', 'c'],
+        'b': ['d'],
+        'c': ['d', 'e'],
+        'd': ['e'],
+        'e': [],
+        'f': ['a'],
+        'g': [],
+    }
+    closure = TransitiveClosure(graph)
+
+    assert len(closure) == 7
+    assert 'a' in closure
+    assert 'x' not in closure
+
+    assert closure.is_ancestor('e', 'a')
+    assert closure.is_ancestor('e', 'f')
+    assert not closure.is_ancestor('a', 'e')
+    assert not closure.is_ancestor('a', 'a')
+    assert closure.is_descendant('f', 'd')
+    assert not closure.is_descendant('g', 'd')
+
+    assert sorted(closure.get_ancestors('a')) == ['b', 'c', 'd', 'e']
+    assert closure.get_ancestors('e') == []
+    assert sorted(closure.get_descendants('d')) == ['a', 'b', 'c', 'f']
+
+    impact = closure.get_impact(['c', 'g'])
+    assert sorted(impact) == ['a', 'c', 'f', 'g']
+    assert impact.index('c') < impact.index('a') < impact.index('f')
+
+    # Results are in topological order
+    order = closure.get_ancestors('f')
+    for vertex in order:
+        assert all(order.index(x) < order.index(vertex)
+                   for x in graph[vertex])
+
+    assert TransitiveClosure(graph) == closure
+    assert TransitiveClosure({}) != closure
+
+
+def test_transitive_closure_loops():
+    closure = TransitiveClosure({
+        'a': ['b'],
+        'b': ['c'],
+        'c': ['a'],
+        'd': ['a'],
+        'e': ['e'],
+    })
+
+    assert sorted(closure.get_ancestors('a')) == ['a', 'b', 'c']
+    assert sorted(closure.get_ancestors('d')) == ['a', 'b', 'c']
+    assert sorted(closure.get_descendants('b')) == ['a', 'b', 'c', 'd']
+    assert closure.is_ancestor('e', 'e')